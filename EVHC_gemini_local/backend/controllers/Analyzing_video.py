@@ -1,7 +1,4 @@
 import logging
-import vertexai
-from vertexai.generative_models import GenerativeModel, Part, SafetySetting
-import json
 import os
 from fastapi import HTTPException, File, UploadFile
 from google.cloud import storage, bigquery
@@ -9,17 +6,27 @@ from dotenv import load_dotenv
 import requests
 import tempfile
 import uuid
+from datetime import datetime, timezone
 from urllib.parse import urlparse
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import urllib3
+from controllers.record_cache import record_cache
+from controllers.results_table import (
+    RESULT_COLUMNS, COLUMN_TYPES, LEGACY_COLUMN_TYPES, to_table_row, storage_row, dealership_from_filename
+)
+from controllers.results_schema import ensure_results_table, typed_storage, invalidate_results_table
+from controllers.media_probe import validate_upload
+from controllers import parallel_upload
+from controllers.scoring import score_result, verdicts_from_row
+from controllers import near_duplicates, renditions
+from controllers import local_mirror, search_index, bigquery_spool, model_usage, video_model, segment_analysis
 
 load_dotenv()
 project_id = os.environ.get("PROJECT_ID")
 bucket_id = os.environ.get("BUCKET_ID")
 table_id = os.environ.get("BIGQUERY_TABLE_ID")
 bucket_folder = os.environ.get("BUCKET_FOLDER")
-car = os.environ.get("CAR")
 
 # Setup Ford proxy configuration
 def setup_ford_proxy():
@@ -200,12 +207,14 @@ def upload_downloaded_video_to_gcs(temp_file_path, file_extension):
         storage_client = get_storage_client()
         bucket = storage_client.get_bucket(bucket_id)
         blob_name = f"{bucket_folder}/{unique_filename}"
-        blob = bucket.blob(blob_name)
         
-        # Upload file
+        # Upload file (large files as parallel composite parts)
         with open(temp_file_path, 'rb') as file_data:
-            blob.upload_from_file(file_data, content_type=f'video/{file_extension[1:]}')
+            blob = parallel_upload.upload_file(bucket, blob_name, file_data, content_type=f'video/{file_extension[1:]}')
         
+        # Thumbnail and preview are made from a copy in the background
+        renditions.schedule_for_path(temp_file_path, unique_filename)
+
         # Clean up temp file
         os.unlink(temp_file_path)
         
@@ -246,340 +255,126 @@ def download_and_analyze_video(video_url, system_instructions):
         logger.error(f"Error in download_and_analyze_video: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def write_result_to_bigquery(data_to_insert, skip_existing=False):
+    """Insert one analysis result into BigQuery; raises when the write fails"""
+    # Use lazy-initialized client
+    bigquery_client = get_bigquery_client()
+    if bigquery_client is None:
+        raise RuntimeError("BigQuery client not available")
+    ensure_results_table(bigquery_client)
+
+    # Every column of the table, usage included; the parameters below are named after them
+    columns = f"({', '.join(RESULT_COLUMNS)})"
+    values = f"({', '.join('@' + column for column in RESULT_COLUMNS)})"
+    if skip_existing:
+        # A replayed insert may have landed already, e.g. when only the response to it was lost
+        query = f"""
+            MERGE `{project_id}.{table_id}` T
+            USING (SELECT @result_id AS result_id) S
+            ON T.result_id = S.result_id
+            WHEN NOT MATCHED THEN INSERT {columns} VALUES {values}
+        """
+    else:
+        query = f"INSERT INTO `{project_id}.{table_id}` {columns} VALUES {values}"
+
+    # Typed values once the table has been migrated (migrate_results_types.py), strings before
+    typed = typed_storage()
+    row = storage_row(data_to_insert, typed)
+    # Stamped per attempt, so a row replayed from the spool reaches change-feed clients past its cursor
+    row["inserted_at"] = datetime.now(timezone.utc)
+    column_types = COLUMN_TYPES if typed else LEGACY_COLUMN_TYPES
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter(column, column_types[column], row[column]) for column in RESULT_COLUMNS
+        ]
+    )
+
+    # Execute the query
+    try:
+        query_job = bigquery_client.query(query, job_config=job_config)
+        query_job.result()  # Wait for the job to complete
+    except Exception:
+        # The next attempt re-reads the table, whose column types may have changed under a migration
+        invalidate_results_table()
+        raise
+
 def insert_into_bigquery(data_to_insert):
     """Insert analysis results into BigQuery"""
     logger.info(f"Inserting data into BigQuery for filename: {data_to_insert.get('filename', 'unknown')}")
     logger.info(f"Final JSON response with video URL: {data_to_insert}")
+
+    # Identifies this result across insert retries and spool replays
+    data_to_insert["result_id"] = uuid.uuid4().hex
+    # Partition and clustering keys; set here so a replayed row keeps its original analysis time
+    data_to_insert["analyzed_at"] = datetime.now(timezone.utc).isoformat()
+    data_to_insert["dealership"] = dealership_from_filename(data_to_insert.get("filename", ""))
+    local_mirror.insert_record(to_table_row(data_to_insert))
+    # The full result still carries the transcript and comments, which the table only keeps inside
+    # raw_model_output (search_index.sync_from_bigquery extracts them from there)
+    search_index.index_result(data_to_insert)
+    if local_mirror.offline_mode:
+        record_cache.append(data_to_insert.get("filename", ""), to_table_row(data_to_insert))
+        logger.info("Offline mode - result stored in the local mirror only")
+        return
     
     try:
-        # Use lazy-initialized client
-        bigquery_client = get_bigquery_client()
-        if bigquery_client is None:
-            logger.warning("BigQuery client not available, skipping insertion")
-            return
-            
-        query = f"""
-            INSERT INTO `{project_id}.{table_id}` 
-            (filename, car_type, service_related_video, sound_and_image, show_license_plate,
-             car_on_ramp, service_advisor_or_technician_name, DealershipName,
-             special_tools_tyres, customer_name, special_tools_brake_pad,
-             Special_tools_disc, attached_offer_mentioned, correct_ending,
-             show_license_plate_eval, car_on_ramp_eval, service_advisor_or_technician_name_eval,
-             DealershipName_eval, customer_name_eval, special_tools_tyres_eval,
-             special_tools_brake_pad_eval, Special_tools_disc_eval,
-             attached_offer_mentioned_eval, approve_offer_mentioned_eval, correct_ending_eval,
-             total_points_eval, percentage, battery_checked_eval, wind_screen_checked_eval,
-             summary, video_url)
-            VALUES (@filename, @car_type, @service_related_video, @sound_and_image, @show_license_plate,
-                    @car_on_ramp, @service_advisor_or_technician_name, @DealershipName,
-                    @special_tools_tyres, @customer_name, @special_tools_brake_pad,
-                    @Special_tools_disc, @attached_offer_mentioned, @correct_ending,
-                    @show_license_plate_eval, @car_on_ramp_eval, @service_advisor_or_technician_name_eval,
-                    @DealershipName_eval, @customer_name_eval, @special_tools_tyres_eval,
-                    @special_tools_brake_pad_eval, @Special_tools_disc_eval,
-                    @attached_offer_mentioned_eval, @approve_offer_mentioned_eval, @correct_ending_eval,
-                    @total_points_eval, @percentage, @battery_checked_eval, @wind_screen_checked_eval,
-                    @summary, @video_url)
-        """
-
-        # Define the job configuration with parameters
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("filename", "STRING", data_to_insert.get("filename", "")),
-                bigquery.ScalarQueryParameter("car_type", "STRING", data_to_insert.get("car_type", "")),
-                bigquery.ScalarQueryParameter("service_related_video", "STRING", data_to_insert.get("service_related_video", "")),
-                bigquery.ScalarQueryParameter("sound_and_image", "STRING", data_to_insert.get("sound_and_image", "")),
-                bigquery.ScalarQueryParameter("show_license_plate", "STRING", data_to_insert.get("show_license_plate", "")),
-                bigquery.ScalarQueryParameter("car_on_ramp", "STRING", data_to_insert.get("car_on_ramp", "")),
-                bigquery.ScalarQueryParameter("service_advisor_or_technician_name", "STRING", data_to_insert.get("service_advisor_or_technician_name", "")),
-                bigquery.ScalarQueryParameter("DealershipName", "STRING", data_to_insert.get("DealershipName", "")),
-                bigquery.ScalarQueryParameter("special_tools_tyres", "STRING", data_to_insert.get("special_tools_tyres", "")),
-                bigquery.ScalarQueryParameter("customer_name", "STRING", data_to_insert.get("customer_name", "")),
-                bigquery.ScalarQueryParameter("special_tools_brake_pad", "STRING", data_to_insert.get("special_tools_brake_pad", "")),
-                bigquery.ScalarQueryParameter("Special_tools_disc", "STRING", data_to_insert.get("Special_tools_disc", "")),
-                bigquery.ScalarQueryParameter("attached_offer_mentioned", "STRING", data_to_insert.get("attached_offer_mentioned", "")),
-                bigquery.ScalarQueryParameter("correct_ending", "STRING", data_to_insert.get("correct_ending", "")),
-                bigquery.ScalarQueryParameter("show_license_plate_eval", "STRING", data_to_insert.get("show_license_plate_eval", "")),
-                bigquery.ScalarQueryParameter("car_on_ramp_eval", "STRING", data_to_insert.get("car_on_ramp_eval", "")),
-                bigquery.ScalarQueryParameter("service_advisor_or_technician_name_eval", "STRING", data_to_insert.get("service_advisor_or_technician_name_eval", "")),
-                bigquery.ScalarQueryParameter("DealershipName_eval", "STRING", data_to_insert.get("DealershipName_eval", "")),
-                bigquery.ScalarQueryParameter("customer_name_eval", "STRING", data_to_insert.get("customer_name_eval", "")),
-                bigquery.ScalarQueryParameter("special_tools_tyres_eval", "STRING", data_to_insert.get("special_tools_tyres_eval", "")),
-                bigquery.ScalarQueryParameter("special_tools_brake_pad_eval", "STRING", data_to_insert.get("special_tools_brake_pad_eval", "")),
-                bigquery.ScalarQueryParameter("Special_tools_disc_eval", "STRING", data_to_insert.get("Special_tools_disc_eval", "")),
-                bigquery.ScalarQueryParameter("attached_offer_mentioned_eval", "STRING", data_to_insert.get("attached_offer_mentioned_eval", "")),
-                bigquery.ScalarQueryParameter("approve_offer_mentioned_eval", "STRING", data_to_insert.get("approve_offer_mentioned_eval", "")),
-                bigquery.ScalarQueryParameter("correct_ending_eval", "STRING", data_to_insert.get("correct_ending_eval", "")),
-                bigquery.ScalarQueryParameter("total_points_eval", "STRING", data_to_insert.get("total_points_eval", "")),
-                bigquery.ScalarQueryParameter("percentage", "STRING", data_to_insert.get("percentage", "")),
-                bigquery.ScalarQueryParameter("battery_checked_eval", "STRING", data_to_insert.get("battery_checked_eval", "")),
-                bigquery.ScalarQueryParameter("wind_screen_checked_eval", "STRING", data_to_insert.get("wind_screen_checked_eval", "")),
-                bigquery.ScalarQueryParameter("summary", "STRING", data_to_insert.get("summary", "")),
-                bigquery.ScalarQueryParameter("video_url", "STRING", data_to_insert.get("video_url", "")),
-            ]
-        )
-        
-        # Execute the query
-        query_job = bigquery_client.query(query, job_config=job_config)
-        query_job.result()  # Wait for the job to complete
-        
-        logger.info(f"Data successfully inserted into BigQuery for filename: {data_to_insert.get('filename', 'unknown')}")
-        
+        write_result_to_bigquery(data_to_insert)
     except Exception as e:
         logger.error(f"Error inserting into BigQuery: {e}")
-        # Don't raise exception here to avoid breaking the main flow
-        # The analysis can still succeed even if BigQuery insertion fails
+        # Don't raise exception here to avoid breaking the main flow; the result is spooled
+        # and replayed once BigQuery accepts it, so the analysis never has to run again
+        bigquery_spool.append(data_to_insert)
+        return
 
-def clean_json_data(input_data):
-    """Clean JSON response data from AI model"""
-    logger.info("Cleaning the JSON response data")
-    cleaned_data = input_data.replace('```json', '').replace('```', '').replace('\n', ' ').strip()
-    return cleaned_data
+    logger.info(f"Data successfully inserted into BigQuery for filename: {data_to_insert.get('filename', 'unknown')}")
 
-def generate_content_from_url(url, system_instructions):
-    vertexai.init(project=project_id)
-    
-    model = GenerativeModel("gemini-2.5-pro", system_instruction=system_instructions )
-    
-    video_file = Part.from_uri(
-        uri=url,
-        mime_type="video/mp4",
-    )
-    file_name = url.split("/")[-1]
-    example_output = """[
-        {
-            "filename": "example_file.mp4",
-            "car_type": "Passenger Car",
-            "service_related_video": "Y",
-            "sound_and_image": "Y",
-            "show_license_plate": "Y",
-            "car_on_ramp": "Y",
-            "service_advisor_or_technician_name": "Y",
-            "DealershipName": "Y",
-            "special_tools_tyres": "Y",
-            "customer_name": "Y",
-            "special_tools_brake_pad": "Y",
-            "Special_tools_disc": "Y",
-            "attached_offer_mentioned": "Y",
-            "approve_offer_mentioned":"Y",
-            "correct_ending": "Y",
-            "show_license_plate_eval": " ",
-            "car_on_ramp_eval": " ",
-            "service_advisor_or_technician_name_eval": "10",
-            "DealershipName_eval": "10",
-            "customer_name_eval": "10",
-            "special_tools_tyres_eval": "20",
-            "special_tools_brake_pad_eval": "20",
-            "Special_tools_disc_eval": "20",
-            "attached_offer_mentioned_eval": "10",
-            "approve_offer_mentioned_eval": "10",
-            "correct_ending_eval": "5",
-            "total_points_eval": "100",
-            "percentage": "100%",
-            "battery_checked_eval": "100%",
-            "wind_screen_checked_eval": "100%",
-            "summary": "description of the video",
-            "diagnostic_or_not": "Evhc",
-            "transcript": "transcript of the video to english",
-            "comments":" "
-            
-        }
-    ]"""
-
-    prompt = f"""
-            You are an advanced EU Service Video Analysis model. Your task is to analyze the provided video based on specific conditions and provide a detailed analysis in JSON format. 
-            Follow the instructions below to ensure the analysis is accurate and adheres to the specified requirements.\n 
-
-            **Output format**: Provide only valid JSON as an output response and every value should be a string or an empty string (null)
-
-            **Example output format**:
-            {example_output}
-
-            In output you should not include any other format other than JSON.
-
-            Step 1. Conditions Verification:
-                    Before proceeding with the analysis, verify the following conditions:
-                    Condition 1: Is the video related to {car} cars? 
-                    Condition 2: Does the video contain audio? 
-                    Condition 3: Can the car in the video be identified? 
-                    Condition 4: Is the car confirmed as a {car} model? 
-                    Condition 5: Is the video clear enough for analysis? 
-
-            If any one condition fails (i.e., the vehicle is not a {car} car, the video does not contain sound, the car is not confirmed as a {car}, the video is unclear, or {car} is not visible in the video), respond with the following output format:
-
-            Step 2. If Any Condition Fails: Provide the following JSON format:\n [{{ 
-                "filename": "{file_name}", 
-                "car_type": "Non {car}", 
-                "service_related_video": "", 
-                "sound_and_image": "", 
-                "show_license_plate": "", 
-                "car_on_ramp": "", 
-                "service_advisor_or_technician_name": "", 
-                "DealershipName": "", 
-                "special_tools_tyres": "", 
-                "customer_name": "", 
-                "special_tools_brake_pad": "", 
-                "Special_tools_disc": "", 
-                "attached_offer_mentioned": "", 
-                "correct_ending": "", 
-                "show_license_plate_eval": "", 
-                "car_on_ramp_eval": "", 
-                "service_advisor_or_technician_name_eval": "", 
-                "DealershipName_eval": "", 
-                "customer_name_eval": "", 
-                "special_tools_tyres_eval": "", 
-                "special_tools_brake_pad_eval": "", 
-                "Special_tools_disc_eval": "", 
-                "attached_offer_mentioned_eval": "",
-                "approve_offer_mentioned_eval": "", 
-                "correct_ending_eval": "", 
-                "total_points_eval": "",
-                "percentage": "", 
-                "battery_checked_eval": "", 
-                "wind_screen_checked_eval": "", 
-                "summary": "",
-                "diagnostic_or_not": ""
-                "transcript": "",
-                "comments":""
-                }}]\n 
-
-            Step 3. If All Conditions Pass: If all conditions are met (i.e., the vehicle is confirmed as a {car}, the video has 
-            sound, the car is visible and identifiable as a {car}, and the video is clear), then populate the following fields in 
-            the JSON format:\n [{{ 
-
-                "filename": "{file_name}",
-                "car_type": "Passenger Car" or "Commercial Car",
-                "service_related_video": "Y" or "N",
-                "sound_and_image": "Y" or "N",
-                "show_license_plate": "Y" or "N",
-                "car_on_ramp": "Y" or "N" or "N/A",
-                "service_advisor_or_technician_name": "Y if name available or N",
-                "DealershipName":"Compare the dealership name mentioned in the video audio/transcript with the dealership name present in the filename '{file_name}'. If the dealership name from the video matches or is substantially similar to the dealership name in the filename, return 'Y'. If they do not match or if no dealership name is mentioned in the video, return 'N'. For matching, consider variations in spelling, abbreviations, and common business name formats (e.g., '{car} Dealership' vs '{car}', 'Auto Center' vs 'Auto Centre', etc.)",
-                "customer_name": "Y" or "N",
-                "attached_offer_mentioned": "Return 'Y' if the technician explicitly states that a written estimate, quote, or service proposal is attached, included, or provided along with the video. Look for specific phrases like 'I've attached...', 'attached to this video...', 'including with this video...', 'estimate is attached...', 'quote included...', 'proposal attached...', or similar attachment language. Return 'N' if only verbal pricing is mentioned  or nothing is said about it"
-                "approve_offer_mentioned":"approve_offer_mentioned": "Return 'Y' if the technician explicitly mentions that the attached offer/estimate/quote needs to be approved by the customer before proceeding with the work. Look for specific phrases like 'please approve this estimate...', 'approval needed for...', 'approve the attached quote...', 'need your approval to proceed...', 'once you approve this estimate...', 'pending your approval...', 'authorization required...', or similar approval request language. Return 'N' if no approval request is made, or if the technician only mentions prices/estimates without requesting approval.",
-                "correct_ending": "Y" or "N",
-                "show_license_plate_eval": "make this data as blank with no data or string",   
-                "service_advisor_or_technician_name_eval": "Out of 10 based on service_advisor_or_technician_name column,, award 0 if it is "N" award 10 if it is "Y"",  
-                "DealershipName_eval": "Out of 10  based on DealershipName column, award 0 if it is "N" award 10 if it is "Y"",  
-                "customer_name_eval": "Out of 10 based on customer_name column, award 0 if it is "N" award 10 if it is "Y"",  
-                "attached_offer_mentioned_eval": "Out of 10 based on attached_offer_mentioned column",
-                "approve_offer_mentioned_eval": "Out of 10 based on approve_offer_mentioned column",
-                "correct_ending_eval": "Out of 5 based on correct_ending column",  
-                "total_points_eval": "Out of 100",  
-                "percentage": "Percentage based on the points retrieved Out of 100%",  
-                "battery_checked_eval": "Out of 100%",  
-                "wind_screen_checked_eval": "Out of 100%",
-                "summary": "Generate a summary based on the given video",
-                "diagnostic_or_not": "Classify as either 'diagnostic' or 'Evhc' based on the following criteria:\n\n"
-                                      "**Evhc (Electronic Vehicle Health Check):**\n"
-                                      "- IF the transcript contains (case-insensitive) any of the following phrases: '{car} Video Check', 'digital Vehicle Health Check', 'complementary Vehicle Health Check', 'electronic Vehicle Health Check', 'Vehicle Health Check',\n"
-                                      "OR the video *primarily* demonstrates general vehicle inspection tasks such as tire tread checks, brake shoe checks, disc checks, windshield checks, and battery checks,\n"
-                                      "OR IF any minor tasks are performed, they are limited to filling fluids (washer fluid, brake fluid, etc.), adjusting tire pressure, or performing basic cleaning related to brakes, tires, and discs,\n"
-                                      "THEN classify as 'Evhc'.\n\n"
-                                      "**Diagnostic:**\n"
-                                      "- IF the transcript contains (case-insensitive) any of the following words: 'Diagnostic', 'Follow Up', or 'Additional Work Identified',\n"
-                                      "OR IF the video includes *any* component or part replacement, it is classified as Diagnostic, regardless of any other criteria that might suggest Evhc,\n"
-                                      "OR IF the video demonstrates work that goes *beyond* a general check-up (i.e., tasks that are not part of a standard Evhc process),\n"
-                                      "OR IF the video shows component replacements performed under warranty or as part of a recall process (e.g., door switches, airbag issues, or any car manufacturing defect), it is classified as Diagnostic, regardless of any other criteria that might suggest Evhc,\n"
-                                      "OR IF the video includes body work, battery repair (which includes any additional work, repair, or replacement of the battery beyond a simple voltage check and visual inspection), windshield repair, or addresses mechanical failures (defined as any failure in the car other than brakes, discs, or tire components),\n"
-                                      "THEN classify as 'diagnostic'.\n\n"
-                                      "**Conflict Resolution:**\n"
-                                      "- IF both the 'Evhc' and 'diagnostic' criteria are met, classify as 'diagnostic'.\n\n"
-                                      "**Default Behavior:**\n"
-                                      "- If *neither* of the above conditions is met, classify as 'Evhc'.",
-                "special_tools_tyres": "Confirm proper tyre inspection procedure by analyzing BOTH video content AND audio/transcript. 
-                                        Return 'Y' only if ALL conditions are met: 
-                                                    (1) The video visually shows a tyre depth gauge being used to measure minimum 1 tyre per axle, 
-                                                    (2) The tool is properly inserted into the tyre tread grooves for measurement, 
-                                                    (3) The audio/transcript mentions or describes the use of tyre depth gauge and explains the measurement limits ({car} recommendation 3mm or legal limit 1.6mm). 
-                                                    If the video is an EVHC video, this should be either Y or N (not N/A). 
-                                                    If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video specifically shows AND mentions proper tyre depth measurement using the gauge with limit explanations.
-                                                    If any condition is missing, set to 'N'."
-                "special_tools_brake_pad": "Confirm proper brake pad inspection procedure by analyzing BOTH video content AND audio/transcript. 
-                                           Return 'Y' only if ALL conditions are met: 
-                                                   (1) The video visually shows a brake pad thickness tool being used against one pad, 
-                                                   (2) The tool is correctly used and properly inserted at the brake pad location, 
-                                                   (3) The audio/transcript mentions or describes the brake pad measurement and explains the results (Green, Amber, or Red) with wornness explanation including color, percentage, or mileage, 
-                                                   (4) If pads are worn, shows measurement of one per axle (unless drums are fitted). 
-                                                   If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video specifically shows AND mentions proper brake pad thickness measurement with result explanations. 
-                                                   If any condition is missing, set to 'N'."
-                "Special_tools_disc": "Confirm proper brake disc/drum inspection procedure by analyzing BOTH video content AND audio/transcript. 
-                                           Return 'Y' only if ALL conditions are met: 
-                                                  (1) The video visually shows and explains the condition of one disc/drum per axle, 
-                                                  (2) If discs are worn, shows measurement of one per axle with the measurement tool visibly affixed to the disc, 
-                                                  (3) The audio/transcript mentions or describes the disc/drum condition assessment and measurement process when applicable. 
-                                                  If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video specifically shows AND mentions proper disc/drum condition assessment with measurement when worn. 
-                                                  If any condition is missing, set to 'N'.",
-                "car_on_ramp": "If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video *specifically* shows the car being raised on a ramp for inspection purposes. If the car is on a ramp for inspection, set to 'Y'. Otherwise, set to 'N'.",
-                "special_tools_tyres_eval": "If special_tools_tyres is 'Y', award 20 points. If special_tools_tyres is 'N', award 0 points. If special_tools_tyres is 'N/A', award 20 points.",
-                "special_tools_brake_pad_eval": "If special_tools_brake_pad is 'Y', award 20 points. If special_tools_brake_pad is 'N', award 0 points. If special_tools_brake_pad is 'N/A', award 20 points.",
-                "Special_tools_disc_eval": "If Special_tools_disc is 'Y', award 20 points. If Special_tools_disc is 'N', award 0 points. If Special_tools_disc is 'N/A', award 20 points.",
-                "car_on_ramp_eval": "If car_on_ramp is 'Y', award 5 points. If car_on_ramp is 'N', award 0 points. If car_on_ramp is 'N/A', award 5 points.",
-                "transcript": "Generate a transcript of the video to english",
-                "comments":"Reason for 'diagnostic_or_not' column prediction, explaining whether the 'Evhc' or 'diagnostic' criteria were met (or why neither was met, leading to the default 'diagnostic' classification). Be specific about the keywords found in the transcript and the types of tasks shown in the video. If both criteria were met, indicate that the 'diagnostic' classification takes precedence."
-
-            }}]\n\n
-
-            Important Note: Customer, Technician, and Dealer name fields contribute a maximum of 10 points to the total score. 
-            These three fields — service_advisor_or_technician_name_eval (10 points if present), 
-            DealershipName_eval (10 point if present), and customer_name_eval (10 point if present) — are considered mutually exclusive for scoring purposes. 
-            Scoring Logic for total_points_eval:
-            - If 0 or 1 field in (service_advisor_or_technician_name,DealershipName,customer_name) is YES: Add 0 points to total_points_eval (minimum threshold not met)
-            - If 2 or 3 fields in (service_advisor_or_technician_name,DealershipName,customer_name) are YES: Add 10 points to total_points_eval (threshold met, award maximum points)
-            When calculating total_points_eval and percentage, at least 2 out of these 3 fields must be present (10 points each) to contribute any points to the total score. If this threshold is not met, award 0 points for this category.
-
-            Step 4. Output Format: Ensure every value is either a valid string or an empty string (null). The response must always 
-            be in valid JSON format. Use the exact structure and syntax provided above.\n
-
-            Step 5. Multilingual Video Support:\n
-            Language Detection: Ensure that the system can detect and identify the language of the video's audio or captions. If 
-            the video has captions, analyze them as well, even if they are in different languages.
-
-            Text or Audio Translation: If the video is in a language that is not English, try to translate the audio or captions 
-            into English for accurate analysis. If translation is not possible, mention the language and provide the analysis 
-            based on available content.
-
-            Language in the Audio: If the audio is in a language other than English, ensure that the conditions about 
-            service-related content, special tools, or customer names are evaluated in the context of that language. Keep the 
-            analysis consistent across languages.
-
-            Video Sound and Image Clarification: If the language affects sound (e.g., technical terms in a non-English language), 
-            make sure to evaluate whether these terms are understandable based on the video content, even if the language is 
-            different.\n
-            Important Note:\n
-            If the video does not meet the conditions (e.g., if the {car} car is not visible, if the audio is missing, 
-            or if the video is unclear), return the output format specified in Step 2.
-            If all conditions pass, proceed with the 
-            JSON format specified in Step 3 and provide detailed evaluations based on the analysis."""
-    
-    
-    contents = [video_file, prompt]
-
-    response = model.generate_content(contents)
-    print(response.text)
-    cleaned_response = clean_json_data(response.text)
-    json_response = json.loads(cleaned_response)
-    if isinstance(json_response, dict) and "data" in json_response:
-        logger.error("Error in response data in uploaded file")
-        raise HTTPException(status_code=400, detail=str(json_response["data"]))
-    else:
-        return json_response
+    # Make the new row available to single-record lookups without a query
+    record_cache.append(data_to_insert.get("filename", ""), to_table_row(data_to_insert))
 
-def analyzing_videos(url, system_instructions, file_public_url):
+def replay_spooled_result(data_to_insert):
+    """Write a spooled result, skipping it if an earlier attempt already stored it"""
+    write_result_to_bigquery(data_to_insert, skip_existing=True)
+    record_cache.append(data_to_insert.get("filename", ""), to_table_row(data_to_insert))
+
+def analyzing_videos(url, system_instructions, file_public_url, media_metadata=None):
     """Main function to analyze videos using Vertex AI"""
     try:
         logger.info(f"Starting video analysis for URL: {url}")
+
+        # A re-encoded or trimmed resubmission of an analyzed video reuses that result
+        generated_result = None
+        near_duplicate = near_duplicates.check(url)
+        if near_duplicate and near_duplicate["action"] == "reuse":
+            reused = near_duplicates.reuse_result(near_duplicate)
+            if reused is not None:
+                reused.update(verdicts_from_row(reused))
+                reused["raw_model_output"] = ""
+                # No model call was made for this result
+                reused.update(model_usage.combine([]))
+                generated_result = [reused]
+            else:
+                near_duplicate["action"] = "review"
         
+        # Long videos are analyzed as concurrent segments when segment analysis is enabled
+        if generated_result is None and segment_analysis.segment_analysis_enabled:
+            generated_result = segment_analysis.analyze_in_segments(
+                url, system_instructions, get_storage_client(), media_metadata
+            )
+
         # Generate analysis using Vertex AI
-        generated_result = generate_content_from_url(url, system_instructions)
+        if generated_result is None:
+            generated_result = video_model.generate_content_from_url(url, system_instructions, media_metadata=media_metadata)
         
         # Add video URL to the result
         for item in generated_result:
             item["video_url"] = file_public_url
+            # Container, duration, codecs and resolution probed before upload (none for gs:// URLs)
+            item["media_metadata"] = media_metadata or ""
+            item["near_duplicate_of"] = near_duplicate or ""
         file_name = url.split("/")[-1]
         
-        generated_result[0]['show_license_plate_eval'] = 0
+        # Points come from the scoring engine's rule table, not from the model text
+        generated_result[0].update(score_result(generated_result[0]))
 
         if generated_result[0]['filename'] != file_name:
             generated_result[0]['filename'] = file_name
@@ -588,6 +383,7 @@ def analyzing_videos(url, system_instructions, file_public_url):
             insert_into_bigquery(generated_result[0])
         except Exception as bigquery_error:
             logger.warning(f"BigQuery insertion failed, but continuing: {bigquery_error}")
+        near_duplicates.mark_analyzed(url, file_name)
         
         # Extract summary
         summary = [generated_result[0].get('summary', '')]
@@ -597,6 +393,10 @@ def analyzing_videos(url, system_instructions, file_public_url):
             "summary": summary
         }
         
+    except HTTPException as e:
+        # Keeps its status: a 400 (e.g. the model rejected the video) must not be retried as a 500
+        logger.error(f"Error in analyzing_videos: {e.detail}")
+        raise
     except Exception as e:
         logger.error(f"Error in analyzing_videos: {e}")
         raise HTTPException(status_code=500, detail=f"Video analysis failed: {str(e)}")
@@ -612,10 +412,9 @@ def upload_to_gcs(file: UploadFile, bucket_name: str, folder_name: str):
 
         # Construct the full path for the file inside the folder
         blob_name = f"{folder_name}/{file.filename}"
-        blob = bucket.blob(blob_name)
 
-        # Upload the file to the specified folder in the bucket
-        blob.upload_from_file(file.file, content_type=file.content_type)
+        # Upload the file to the specified folder in the bucket (large files as parallel composite parts)
+        blob = parallel_upload.upload_file(bucket, blob_name, file.file, content_type=file.content_type)
 
         # Return the gs:// URL for the file
         gcs_url = f"gs://{bucket_name}/{blob.name}"
@@ -628,30 +427,45 @@ def upload_to_gcs(file: UploadFile, bucket_name: str, folder_name: str):
         logger.error(f"Error uploading to GCS: {e}")
         raise HTTPException(status_code=500, detail=f"GCS upload failed: {str(e)}")
 
+def upload_for_analysis(file):
+    """Validate a video file and upload it to the analysis folder in GCS"""
+    # Validate file type
+    if file.content_type not in ["video/mp4", "video/mkv", "video/avi"]:
+        raise HTTPException(
+            status_code=400, 
+            detail="Invalid file type. Only MP4, MKV, and AVI files are allowed."
+        )
+    
+    # Reject corrupt or unusable media before paying for the upload and the analysis
+    media_metadata = validate_upload(file)
+
+    bucket_name = bucket_id
+    
+    # Upload file to the specific folder in GCS
+    url_result = upload_to_gcs(file, bucket_name, bucket_folder)
+    url_result["media_metadata"] = media_metadata
+    # Fingerprinted from the local copy so the near-duplicate check need not download it again
+    near_duplicates.fingerprint_upload(file, url_result["gcs_url"])
+    renditions.schedule_for_upload(file, file.filename)
+    return url_result
+
 def upload_to_cloud_storage(file, system_instructions):
     """Main function to upload file to GCS and analyze"""
+    # Validation and upload errors keep their own status codes
+    url_result = upload_for_analysis(file)
     try:
-        # Validate file type
-        if file.content_type not in ["video/mp4", "video/mkv", "video/avi"]:
-            raise HTTPException(
-                status_code=400, 
-                detail="Invalid file type. Only MP4, MKV, and AVI files are allowed."
-            )
-        
-        bucket_name = bucket_id
-        
-        # Upload file to the specific folder in GCS
-        url_result = upload_to_gcs(file, bucket_name, bucket_folder)
-        
         # Analyze the uploaded video
         result = analyzing_videos(
             url_result["gcs_url"], 
             system_instructions, 
-            url_result["file_public_url"]
+            url_result["file_public_url"],
+            url_result["media_metadata"]
         )
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload_to_cloud_storage: {e}")
         raise HTTPException(status_code=500, detail=f"Upload and analysis failed: {str(e)}")
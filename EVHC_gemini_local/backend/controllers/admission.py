@@ -0,0 +1,151 @@
+import os
+import json
+import logging
+import threading
+from prometheus_client import Counter, Gauge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+admission_max_in_flight = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "4"))
+# Total request bytes (uploaded videos) accepted but not yet finished
+admission_max_queued_bytes = int(os.environ.get("ADMISSION_MAX_QUEUED_BYTES", str(1024 * 1024 * 1024)))
+admission_max_per_client = int(os.environ.get("ADMISSION_MAX_PER_CLIENT", "2"))
+# Largest single submission; bigger bodies are refused from the Content-Length header alone
+admission_max_body_bytes = int(os.environ.get("ADMISSION_MAX_BODY_BYTES", str(500 * 1024 * 1024)))
+admission_retry_after = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", "30"))
+# Proxies in front of the app that append to X-Forwarded-For (Cloud Run: 1); the entry that many from the
+# right is the one a trusted proxy wrote. 0 ignores the header and uses the connection's address.
+admission_trusted_proxy_hops = int(os.environ.get("ADMISSION_TRUSTED_PROXY_HOPS", "1"))
+
+IN_FLIGHT = Gauge("evhc_analysis_in_flight", "Analysis submissions currently being processed")
+QUEUED_BYTES = Gauge("evhc_analysis_queued_bytes", "Request bytes of admitted, unfinished analysis submissions")
+REJECTED = Counter("evhc_analysis_rejected_total", "Analysis submissions refused by admission control", ["reason"])
+
+
+class AdmissionController:
+    """Counts in-flight analyses, their bytes and per-client share, and refuses work beyond the limits"""
+
+    def __init__(self, max_in_flight, max_queued_bytes, max_per_client):
+        self.max_in_flight = max_in_flight
+        self.max_queued_bytes = max_queued_bytes
+        self.max_per_client = max_per_client
+        self.in_flight = 0
+        self.queued_bytes = 0
+        self.per_client = {}
+        self._lock = threading.Lock()
+
+    def try_admit(self, client, size):
+        """Reserve capacity for a submission; returns None when admitted, else the refusal reason"""
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return "in_flight"
+            if self.queued_bytes + size > self.max_queued_bytes:
+                return "queued_bytes"
+            if self.per_client.get(client, 0) >= self.max_per_client:
+                return "per_client"
+            self.in_flight += 1
+            self.queued_bytes += size
+            self.per_client[client] = self.per_client.get(client, 0) + 1
+            self._update_gauges()
+            return None
+
+    def release(self, client, size):
+        with self._lock:
+            self.in_flight -= 1
+            self.queued_bytes -= size
+            remaining = self.per_client.get(client, 1) - 1
+            if remaining > 0:
+                self.per_client[client] = remaining
+            else:
+                self.per_client.pop(client, None)
+            self._update_gauges()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued_bytes": self.queued_bytes,
+                "clients": len(self.per_client),
+                "max_in_flight": self.max_in_flight,
+                "max_queued_bytes": self.max_queued_bytes,
+                "max_per_client": self.max_per_client,
+            }
+
+    def _update_gauges(self):
+        IN_FLIGHT.set(self.in_flight)
+        QUEUED_BYTES.set(self.queued_bytes)
+
+
+admission_controller = AdmissionController(admission_max_in_flight, admission_max_queued_bytes, admission_max_per_client)
+
+
+def _client_id(scope):
+    # Leftmost entries are whatever the client sent; only the ones trusted proxies appended identify it
+    if admission_trusted_proxy_hops > 0:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                entries = [entry.strip() for entry in value.decode("latin-1").split(",") if entry.strip()]
+                if len(entries) >= admission_trusted_proxy_hops:
+                    return entries[-admission_trusted_proxy_hops]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits or refuses submissions before their body is read"""
+
+    def __init__(self, app, paths=("/api/analyze-video",), controller=admission_controller):
+        self.app = app
+        self.paths = set(paths)
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        content_length = headers.get(b"content-length")
+        if content_length is None:
+            await self._refuse(send, 411, "Content-Length is required for analysis submissions.", "no_length")
+            return
+        try:
+            size = int(content_length)
+        except ValueError:
+            await self._refuse(send, 400, "Invalid Content-Length header.", "bad_length")
+            return
+        if size > admission_max_body_bytes:
+            await self._refuse(
+                send, 413, f"Submission too large (limit {admission_max_body_bytes} bytes).", "too_large"
+            )
+            return
+
+        client = _client_id(scope)
+        reason = self.controller.try_admit(client, size)
+        if reason is not None:
+            logger.warning(f"Refusing analysis from {client} ({size} bytes): {reason} limit reached")
+            await self._refuse(
+                send, 429, "Server is busy with other analyses, please retry later.", reason,
+                headers=[(b"retry-after", str(admission_retry_after).encode())]
+            )
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(client, size)
+
+    async def _refuse(self, send, status, detail, reason, headers=None):
+        REJECTED.labels(reason=reason).inc()
+        body = json.dumps({"detail": detail, "reason": reason, **self.controller.snapshot()}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ] + (headers or []),
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import zlib
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Results whose BigQuery insert failed wait here until they can be replayed. Must be on a disk that
+# survives restarts; API and workers may share it (appends and compaction take a lock file).
+bigquery_spool_path = os.environ.get("BIGQUERY_SPOOL_PATH", "bigquery_spool.jsonl")
+bigquery_spool_interval = float(os.environ.get("BIGQUERY_SPOOL_REPLAY_SECONDS", "30"))
+# Replay backs off exponentially while BigQuery keeps failing, up to this delay
+bigquery_spool_max_backoff = float(os.environ.get("BIGQUERY_SPOOL_MAX_BACKOFF_SECONDS", "900"))
+
+SPOOL_DEPTH = Gauge("evhc_bigquery_spool_depth", "Results waiting in the spool for a BigQuery insert")
+SPOOL_OLDEST = Gauge("evhc_bigquery_spool_oldest_timestamp_seconds", "Spool time of the oldest waiting result")
+SPOOL_AGE = Gauge("evhc_bigquery_spool_oldest_age_seconds", "Age of the oldest result waiting in the spool")
+SPOOLED = Counter("evhc_bigquery_spooled_total", "Results spooled after a failed BigQuery insert")
+REPLAYED = Counter("evhc_bigquery_spool_replayed_total", "Spooled results written to BigQuery")
+CORRUPT = Counter("evhc_bigquery_spool_corrupt_lines_total", "Torn or corrupt spool lines dropped at compaction")
+
+_lock = threading.Lock()
+_oldest_spooled_at = None
+SPOOL_AGE.set_function(lambda: time.time() - _oldest_spooled_at if _oldest_spooled_at else 0)
+
+
+@contextmanager
+def _locked_spool(mode):
+    """Open the spool under the in-process lock and an exclusive lock shared with other processes"""
+    # The lock lives in its own file: compaction replaces the spool file, and a lock held on the
+    # replaced file would not exclude writers that open the new one
+    with _lock, open(f"{bigquery_spool_path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with open(bigquery_spool_path, mode) as spool:
+                yield spool
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _encode(entry):
+    # One entry per line: CRC32 of the JSON body, then the body
+    body = json.dumps(entry, default=str, separators=(",", ":"))
+    return f"{zlib.crc32(body.encode()):08x} {body}\n"
+
+
+def _decode(line):
+    """Entry of a spool line, or None when it is torn or corrupt"""
+    checksum, _, body = line.rstrip("\n").partition(" ")
+    try:
+        if int(checksum, 16) != zlib.crc32(body.encode()):
+            return None
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _append(spool, entries):
+    # A line torn by a crash must not swallow the first entry written after it
+    if spool.seek(0, os.SEEK_END):
+        spool.seek(spool.tell() - 1)
+        if spool.read(1) != "\n":
+            spool.write("\n")
+    spool.write("".join(_encode(entry) for entry in entries))
+    spool.flush()
+    os.fsync(spool.fileno())
+
+
+def _pending(lines, corrupt=None):
+    """Spooled rows that have no acknowledgement yet, oldest first, one per result id"""
+    rows = {}
+    acked = set()
+    for line in lines:
+        entry = _decode(line)
+        if entry is None:
+            if corrupt is not None and line.strip():
+                corrupt.append(line)
+            continue
+        if entry["type"] == "ack":
+            acked.add(entry["id"])
+        elif entry["id"] not in rows:
+            rows[entry["id"]] = entry
+    return [entry for result_id, entry in rows.items() if result_id not in acked]
+
+
+def _update_gauges(pending):
+    global _oldest_spooled_at
+    SPOOL_DEPTH.set(len(pending))
+    _oldest_spooled_at = min((entry["spooled_at"] for entry in pending), default=None)
+    SPOOL_OLDEST.set(_oldest_spooled_at or 0)
+
+
+def append(row):
+    """Durably keep a result row (carrying its result_id) that could not be written to BigQuery"""
+    entry = {"type": "row", "id": row["result_id"], "spooled_at": time.time(), "row": row}
+    with _locked_spool("a+") as spool:
+        _append(spool, [entry])
+        spool.seek(0)
+        _update_gauges(_pending(spool))
+    SPOOLED.inc()
+    logger.warning(f"Spooled result {row['result_id']} for {row.get('filename')} until BigQuery accepts it")
+
+
+def pending():
+    if not os.path.exists(bigquery_spool_path):
+        _update_gauges([])
+        return []
+    with _locked_spool("r") as spool:
+        entries = _pending(spool)
+    _update_gauges(entries)
+    return entries
+
+
+def _acknowledge_and_compact(result_ids):
+    """Record replayed results and rewrite the spool without them"""
+    with _locked_spool("a+") as spool:
+        _append(spool, [{"type": "ack", "id": result_id} for result_id in result_ids])
+        spool.seek(0)
+        corrupt = []
+        remaining = _pending(spool, corrupt)
+        for line in corrupt:
+            logger.error(f"Dropping corrupt spool line: {line[:200]!r}")
+        CORRUPT.inc(len(corrupt))
+        # Rows spooled by another process meanwhile are in `remaining` too, so nothing is lost
+        temp_path = f"{bigquery_spool_path}.tmp"
+        with open(temp_path, "w") as compacted:
+            _append(compacted, remaining)
+        os.replace(temp_path, bigquery_spool_path)
+        directory = os.open(os.path.dirname(os.path.abspath(bigquery_spool_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    _update_gauges(remaining)
+
+
+def replay_once(write_row):
+    """Write spooled rows with write_row(row) until one fails; returns (replayed, failed)"""
+    entries = pending()
+    replayed = []
+    error = None
+    for entry in entries:
+        try:
+            write_row(entry["row"])
+        except Exception as e:
+            error = e
+            break
+        replayed.append(entry["id"])
+    if replayed:
+        _acknowledge_and_compact(replayed)
+        REPLAYED.inc(len(replayed))
+        logger.info(f"Replayed {len(replayed)} spooled results into BigQuery")
+    if error is not None:
+        logger.warning(f"BigQuery replay stopped with {len(entries) - len(replayed)} results left: {error}")
+    return len(replayed), error is not None
+
+
+def run_replay(write_row, stop_event: threading.Event):
+    """Replay the spool periodically, backing off while BigQuery is failing"""
+    delay = bigquery_spool_interval
+    while not stop_event.wait(delay):
+        try:
+            _, failed = replay_once(write_row)
+        except Exception as e:
+            logger.error(f"Error replaying the BigQuery spool: {e}")
+            failed = True
+        delay = min(delay * 2, bigquery_spool_max_backoff) if failed else bigquery_spool_interval
@@ -0,0 +1,271 @@
+import os
+import io
+import csv
+import time
+import uuid
+import queue
+import logging
+import tempfile
+import threading
+from fastapi import HTTPException
+
+from controllers import near_duplicates
+from controllers.admission import admission_retry_after
+from controllers.media_probe import validate_path
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Workers per stage: downloads and uploads are network-bound, pre-checks run ffprobe/ffmpeg locally,
+# and analysis is bounded by the model quota
+bulk_download_workers = int(os.environ.get("BULK_DOWNLOAD_WORKERS", "4"))
+bulk_precheck_workers = int(os.environ.get("BULK_PRECHECK_WORKERS", "2"))
+bulk_upload_workers = int(os.environ.get("BULK_UPLOAD_WORKERS", "4"))
+bulk_analyze_workers = int(os.environ.get("BULK_ANALYZE_WORKERS", "2"))
+# Items waiting between two stages. Full queues block the stage before them, which caps the number
+# of downloaded videos sitting on local disk while analysis is the bottleneck.
+bulk_queue_size = int(os.environ.get("BULK_QUEUE_SIZE", "4"))
+bulk_max_items = int(os.environ.get("BULK_MAX_ITEMS", "500"))
+# Bulk jobs running at once; further submissions get a 429 until one finishes
+bulk_max_running_jobs = int(os.environ.get("BULK_MAX_RUNNING_JOBS", "2"))
+# Finished jobs kept for status polling
+bulk_job_retention = int(os.environ.get("BULK_JOB_RETENTION", "50"))
+
+URL_PREFIXES = ("http://", "https://", "gs://")
+
+_jobs_lock = threading.Lock()
+_jobs = {}
+_pipeline_lock = threading.Lock()
+_pipeline = None
+
+
+def parse_urls(text):
+    """Video URLs from a CSV export or a plain list; the first URL-looking cell of each row is used"""
+    urls = []
+    for row in csv.reader(io.StringIO(text)):
+        url = next((cell.strip() for cell in row if cell.strip().startswith(URL_PREFIXES)), None)
+        if url:
+            urls.append(url)
+    return list(dict.fromkeys(urls))
+
+
+def _is_youtube(url):
+    return "youtube.com" in url or "youtu.be" in url
+
+
+# Items are read by get_job while stage workers change them: every change goes through these two helpers
+
+def _update(item, **fields):
+    with _jobs_lock:
+        item.update(fields)
+
+
+def _pop(item, field):
+    with _jobs_lock:
+        return item.pop(field, None)
+
+
+def _discard_local_file(item):
+    local_path = _pop(item, "local_path")
+    if local_path and os.path.exists(local_path):
+        os.unlink(local_path)
+
+
+# Stage handlers: each receives the job and the item, and records what the next stage needs on the item
+
+def _download(job, item):
+    url = item["url"]
+    if url.startswith("gs://"):
+        # Already in the bucket: straight through to analysis
+        _update(item, gcs_url=url)
+        return
+    if _is_youtube(url):
+        from pytubefix import YouTube
+
+        stream = YouTube(url).streams.get_highest_resolution()
+        local_path = stream.download(output_path=tempfile.gettempdir(), filename=f"bulk_{uuid.uuid4()}.mp4")
+        _update(item, local_path=local_path, extension=".mp4")
+        return
+    from controllers.Analyzing_video import download_video_from_url
+
+    local_path, extension = download_video_from_url(url)
+    _update(item, local_path=local_path, extension=extension)
+
+
+def _precheck(job, item):
+    if "local_path" not in item:
+        return
+    media_metadata = validate_path(item["local_path"], item["url"])
+    # Fingerprinted while the file is local so the near-duplicate check need not download it again
+    _update(item, media_metadata=media_metadata, fingerprint=near_duplicates.fingerprint_path(item["local_path"]))
+
+
+def _upload(job, item):
+    if "local_path" not in item:
+        return
+    from controllers.Analyzing_video import upload_downloaded_video_to_gcs
+
+    # Removes the local file (also on failure) and schedules the renditions
+    result = upload_downloaded_video_to_gcs(_pop(item, "local_path"), item["extension"])
+    _update(item, gcs_url=result["gcs_url"], file_public_url=result["file_public_url"])
+    fingerprint = _pop(item, "fingerprint")
+    if fingerprint is not None:
+        near_duplicates.store_fingerprint(item["gcs_url"], fingerprint)
+
+
+def _analyze(job, item):
+    from controllers.Analyzing_video import analyzing_videos
+
+    result = analyzing_videos(
+        item["gcs_url"], job["system_instructions"], item.get("file_public_url"), item.get("media_metadata")
+    )
+    record = result["response"][0]
+    _update(
+        item,
+        filename=record.get("filename"),
+        total_points_eval=record.get("total_points_eval"),
+        percentage=record.get("percentage"),
+    )
+
+
+STAGES = [
+    ("download", _download, bulk_download_workers),
+    ("precheck", _precheck, bulk_precheck_workers),
+    ("upload", _upload, bulk_upload_workers),
+    ("analyze", _analyze, bulk_analyze_workers),
+]
+
+# Fields used between stages that are not reported
+PRIVATE_FIELDS = ("local_path", "extension", "fingerprint", "media_metadata", "file_public_url")
+
+
+def _finish_item(job, item, status, error=None):
+    with _jobs_lock:
+        item.update(status=status, error=error, finished_at=time.time())
+        job["remaining"] -= 1
+        if job["remaining"] == 0:
+            job["status"] = "completed"
+            job["finished_at"] = time.time()
+            logger.info(f"Bulk job {job['id']} completed in {job['finished_at'] - job['created_at']:.1f}s")
+
+
+def _run_stage(stage, handler, inbox, outbox, next_stage):
+    while True:
+        job, item = inbox.get()
+        _update(item, stage=stage, status="running")
+        started = time.monotonic()
+        try:
+            handler(job, item)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.warning(f"Bulk job {job['id']} item {item['index']} failed at {stage}: {error}")
+            _discard_local_file(item)
+            _finish_item(job, item, "failed", error)
+            continue
+        finally:
+            with _jobs_lock:
+                item["timings"][stage] = round(time.monotonic() - started, 3)
+        if outbox is None:
+            _finish_item(job, item, "succeeded")
+            continue
+        _update(item, stage=next_stage, status="queued")
+        # Blocks while the next stage is saturated (backpressure)
+        outbox.put((job, item))
+
+
+def _start_pipeline():
+    """Start the stage workers once; they serve every bulk job"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            return _pipeline
+        queues = [queue.Queue(maxsize=bulk_queue_size) for _ in STAGES]
+        for position, (stage, handler, workers) in enumerate(STAGES):
+            has_next = position + 1 < len(STAGES)
+            outbox = queues[position + 1] if has_next else None
+            next_stage = STAGES[position + 1][0] if has_next else None
+            for number in range(workers):
+                threading.Thread(
+                    target=_run_stage, args=(stage, handler, queues[position], outbox, next_stage),
+                    name=f"bulk-{stage}-{number}", daemon=True
+                ).start()
+        _pipeline = dict(zip((stage for stage, _, _ in STAGES), queues))
+        return _pipeline
+
+
+def _feed(job, inbox):
+    for item in job["items"]:
+        inbox.put((job, item))
+
+
+def _forget_old_jobs():
+    finished = sorted(
+        (job for job in _jobs.values() if job["status"] == "completed"), key=lambda job: job["finished_at"]
+    )
+    for job in finished[:max(len(finished) - bulk_job_retention, 0)]:
+        del _jobs[job["id"]]
+
+
+def submit(urls, system_instructions):
+    """Queue a list of video URLs for download, pre-check, upload and analysis; returns the job id"""
+    if not urls:
+        raise HTTPException(status_code=422, detail="No video URLs found.")
+    if len(urls) > bulk_max_items:
+        raise HTTPException(status_code=413, detail=f"At most {bulk_max_items} URLs per bulk job.")
+    unsupported = [url for url in urls if not url.startswith(URL_PREFIXES)]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported URLs: {unsupported[:5]}")
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    job = {
+        "id": job_id,
+        "status": "running",
+        "created_at": now,
+        "finished_at": None,
+        "remaining": len(urls),
+        "system_instructions": system_instructions,
+        "items": [
+            {"index": index, "url": url, "stage": STAGES[0][0], "status": "queued", "error": None, "timings": {}}
+            for index, url in enumerate(urls)
+        ],
+    }
+    pipeline = _start_pipeline()
+    with _jobs_lock:
+        running = sum(1 for existing in _jobs.values() if existing["status"] == "running")
+        if running >= bulk_max_running_jobs:
+            raise HTTPException(
+                status_code=429,
+                detail=f"{running} bulk jobs are already running, please retry later.",
+                headers={"Retry-After": str(admission_retry_after)},
+            )
+        _forget_old_jobs()
+        _jobs[job_id] = job
+    # Feeding blocks on the bounded first queue, so it runs beside the request
+    threading.Thread(target=_feed, args=(job, pipeline[STAGES[0][0]]), name=f"bulk-feed-{job_id}", daemon=True).start()
+    logger.info(f"Bulk job {job_id} queued with {len(urls)} URLs")
+    return job_id
+
+
+def get_job(job_id):
+    """Job status with per-item stage, status, timings and outcome"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Bulk job '{job_id}' not found")
+        items = [
+            {key: value for key, value in item.items() if key not in PRIVATE_FIELDS} | {"timings": dict(item["timings"])}
+            for item in job["items"]
+        ]
+        counts = {}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return {
+            "id": job["id"],
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "counts": counts,
+            "items": items,
+            "backlog": {stage: inbox.qsize() for stage, inbox in (_pipeline or {}).items()},
+        }
@@ -0,0 +1,142 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
+
+from controllers import local_mirror
+from controllers.results_schema import lookback_filter, ensure_results_table, read_row
+from controllers.results_table import LISTING_COLUMNS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+# A cursor lies this far before the read it was issued for: an insert or update stamped before the read
+# but committed after it is still sent on the next poll. Clients upsert rows by result_id (by filename for
+# rows stored before results had ids), so rows sent twice are harmless. Must exceed the longest insert
+# or re-scoring UPDATE job.
+change_feed_overlap = float(os.environ.get("CHANGE_FEED_OVERLAP_SECONDS", "120"))
+# Tombstones are kept this long; older cursors get a full reset instead of a delta
+change_feed_retention_days = float(os.environ.get("CHANGE_FEED_RETENTION_DAYS", "30"))
+
+DELETIONS_TABLE_ID = f"{table_id}_deletions"
+
+_deletions_lock = threading.Lock()
+_deletions_ready = False
+
+
+def ensure_deletions_table(bigquery_client):
+    """Create the tombstone table (one row per deleted filename), partitioned by deletion day (once per process)"""
+    global _deletions_ready
+    if _deletions_ready:
+        return
+    with _deletions_lock:
+        if _deletions_ready:
+            return
+        full_table_id = f"{project_id}.{DELETIONS_TABLE_ID}"
+        try:
+            bigquery_client.get_table(full_table_id)
+        except NotFound:
+            table = bigquery.Table(full_table_id, schema=[
+                bigquery.SchemaField("filename", "STRING"),
+                bigquery.SchemaField("deleted_at", "TIMESTAMP"),
+            ])
+            # Partitions past the retention window expire on their own
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY, field="deleted_at",
+                expiration_ms=int(change_feed_retention_days * 86400 * 1000),
+            )
+            bigquery_client.create_table(table, exists_ok=True)
+            logger.info(f"Created tombstone table {full_table_id}")
+        _deletions_ready = True
+
+
+def tombstone_statement():
+    """SQL statement recording the deletion of @filename, run in the same transaction as the DELETE"""
+    return f"INSERT INTO `{project_id}.{DELETIONS_TABLE_ID}` (filename, deleted_at) VALUES (@filename, CURRENT_TIMESTAMP())"
+
+
+def encode_cursor(moment):
+    # "Z" rather than "+00:00", which turns into a space in an unencoded query string
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
+
+
+def decode_cursor(cursor):
+    try:
+        moment = datetime.fromisoformat(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid change cursor")
+    if moment.tzinfo is None:
+        raise HTTPException(status_code=400, detail="Invalid change cursor")
+    return moment
+
+
+def snapshot_cursor():
+    """Cursor for a full listing read now: changes after it are not in the listing, or may not be"""
+    snapshot_at = datetime.now(timezone.utc)
+    if local_mirror.is_ready() and not local_mirror.offline_mode:
+        # Listings come from the mirror, which reflects BigQuery as of its last sync
+        snapshot_at = local_mirror.snapshot_time() or snapshot_at
+    return encode_cursor(snapshot_at - timedelta(seconds=change_feed_overlap))
+
+
+def _reset():
+    from controllers.data_from_bigquery import get_data_from_bigquery
+
+    cursor = snapshot_cursor()
+    return {"reset": True, "cursor": cursor, "rows": get_data_from_bigquery(), "deleted": []}
+
+
+def get_changes(cursor):
+    """Rows inserted or updated and filenames deleted since a cursor, with the cursor to ask from next.
+    Apply `deleted` (drop every row of the filename) before upserting `rows` by result_id."""
+    from controllers.data_from_bigquery import bigquery_client
+
+    since = decode_cursor(cursor)
+    now = datetime.now(timezone.utc)
+    # Offline, nothing records when rows were written; expired cursors may have lost tombstones
+    if local_mirror.offline_mode or since < now - timedelta(days=change_feed_retention_days):
+        return _reset()
+    next_cursor = encode_cursor(max(since, now - timedelta(seconds=change_feed_overlap)))
+
+    try:
+        ensure_results_table(bigquery_client)
+        ensure_deletions_table(bigquery_client)
+        # Neither table modified since the cursor: answer from metadata without running a query
+        modified = [
+            bigquery_client.get_table(f"{project_id}.{table}").modified
+            for table in (table_id, DELETIONS_TABLE_ID)
+        ]
+        if all(moment is not None and moment <= since for moment in modified):
+            return {"reset": False, "cursor": next_cursor, "rows": [], "deleted": []}
+
+        condition, parameters = lookback_filter()
+        since_parameter = bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)
+        rows_job = bigquery_client.query(
+            f"SELECT {', '.join(LISTING_COLUMNS)} FROM `{project_id}.{table_id}` "
+            f"WHERE (inserted_at > @since OR updated_at > @since) AND {condition}",
+            job_config=bigquery.QueryJobConfig(query_parameters=[since_parameter, *parameters]),
+        )
+        deleted_job = bigquery_client.query(
+            f"""
+            SELECT filename, MAX(deleted_at) AS deleted_at FROM `{project_id}.{DELETIONS_TABLE_ID}`
+            WHERE deleted_at > @since GROUP BY filename
+            """,
+            job_config=bigquery.QueryJobConfig(query_parameters=[since_parameter]),
+        )
+        rows = [read_row(row) for row in rows_job.result()]
+        deleted = [
+            {"filename": row["filename"], "deleted_at": encode_cursor(row["deleted_at"])} for row in deleted_job.result()
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reading changes from BigQuery: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"reset": False, "cursor": next_cursor, "rows": rows, "deleted": deleted}
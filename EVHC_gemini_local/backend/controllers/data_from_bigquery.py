@@ -2,6 +2,9 @@ import os
 from fastapi import HTTPException
 from google.cloud import storage, bigquery
 import logging
+from controllers import local_mirror
+from controllers.results_schema import lookback_filter, ensure_results_table, read_row
+from controllers.results_table import listing_row, LISTING_COLUMNS
 
 
 project_id = os.environ.get("PROJECT_ID")
@@ -9,8 +12,8 @@ bucket_id = os.environ.get("BUCKET_ID")
 table_id = os.environ.get("BIGQUERY_TABLE_ID")
 bucket_folder = os.environ.get("BUCKET_FOLDER")
 
-storage_client = storage.Client()
-bigquery_client = bigquery.Client()
+storage_client = storage.Client() if not local_mirror.offline_mode else None
+bigquery_client = bigquery.Client() if not local_mirror.offline_mode else None
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,17 +21,37 @@ logger = logging.getLogger(__name__)
 
 def get_data_from_bigquery():
 
-    # Execute a simple query to retrieve data
-    query = f"SELECT * FROM `{project_id}.{table_id}`"  # Modify this query as needed
+    # Only partitions inside the lookback window are scanned (all of them when it is unset)
+    condition, parameters = lookback_filter()
+    query = f"SELECT {', '.join(LISTING_COLUMNS)} FROM `{project_id}.{table_id}` WHERE {condition}"
 
     try:
-        query_job = bigquery_client.query(query)  # Make an API request
-        results = query_job.result()  # Wait for the job to complete
-
-        data = [dict(row) for row in results]  # Convert results to a list of dictionaries
+        if local_mirror.is_ready():
+            # Served from the local mirror, kept in sync with the table in the background
+            data = [listing_row(row) for row in local_mirror.get_all_records()]
+        else:
+            # Every listed column must exist (added on first use by a new deployment)
+            ensure_results_table(bigquery_client)
+            job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+            query_job = bigquery_client.query(query, job_config=job_config)  # Make an API request
+            results = query_job.result()  # Wait for the job to complete
+
+            data = [read_row(row) for row in results]  # Convert results to a list of dictionaries
 
         return data
 
     except Exception as e:
         logger.error(f"Error fetching data from BigQuery: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_table_version():
+    """Return a token that changes whenever the results table is modified (metadata call, no query)"""
+    try:
+        if local_mirror.is_ready():
+            return local_mirror.get_version()
+        table = bigquery_client.get_table(f"{project_id}.{table_id}")
+        return f"{table.modified.isoformat() if table.modified else ''}:{table.num_rows}"
+    except Exception as e:
+        logger.error(f"Error fetching table metadata from BigQuery: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,10 @@
 import os
 from fastapi import HTTPException, File, UploadFile
+from starlette.concurrency import run_in_threadpool
 from google.cloud import storage, bigquery
 import logging
+from controllers.record_cache import record_cache
+from controllers import local_mirror, search_index, near_duplicates, renditions, change_feed
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -10,14 +13,22 @@ bucket_id = os.environ.get("BUCKET_ID")
 table_id = os.environ.get("BIGQUERY_TABLE_ID")
 bucket_folder = os.environ.get("BUCKET_FOLDER")
 
-storage_client = storage.Client()
-bigquery_client = bigquery.Client()
+storage_client = storage.Client() if not local_mirror.offline_mode else None
+bigquery_client = bigquery.Client() if not local_mirror.offline_mode else None
 
 
 
 async def delete_from_gcs(filename: str):
+    # The storage calls block; they run in the threadpool so the event loop keeps serving requests
+    await run_in_threadpool(delete_video_objects, filename)
+
+
+def delete_video_objects(filename: str):
 
     logger.info(f"Attempting to delete file '{filename}' from GCS...")
+    if local_mirror.offline_mode:
+        logger.info("Offline mode - skipping GCS deletion")
+        return
     try:
         bucket = storage_client.bucket(bucket_id)
         blob = bucket.blob(f"{bucket_folder}/{filename}")
@@ -27,6 +38,7 @@ async def delete_from_gcs(filename: str):
             raise HTTPException(status_code=404, detail=f"File '{filename}' not found in GCS.")
 
         blob.delete()
+        renditions.delete_renditions(filename)
         logger.info(f"File '{filename}' successfully deleted from GCS.")
     except Exception as e:
         logger.error(f"GCS Deletion Error: {str(e)}")
@@ -34,12 +46,27 @@ async def delete_from_gcs(filename: str):
 
 
 async def delete_from_bigquery(filename: str):
+    await run_in_threadpool(delete_result_rows, filename)
+
+
+def delete_result_rows(filename: str):
 
     logger.info(f"Preparing to delete data for file '{filename}' from BigQuery...")
+    local_mirror.delete_records(filename)
+    search_index.remove_result(filename)
+    near_duplicates.remove(filename)
+    record_cache.invalidate(filename)
+    if local_mirror.offline_mode:
+        return
     try:
+        change_feed.ensure_deletions_table(bigquery_client)
+        # The tombstone tells change-feed clients to drop the rows; both commit or neither does
         delete_query = f"""
+        BEGIN TRANSACTION;
         DELETE FROM `{table_id}`
-        WHERE filename = @filename
+        WHERE filename = @filename;
+        {change_feed.tombstone_statement()};
+        COMMIT TRANSACTION;
         """
         delete_job_config = bigquery.QueryJobConfig(
             query_parameters=[
@@ -48,6 +75,7 @@ async def delete_from_bigquery(filename: str):
         )
         delete_query_job = bigquery_client.query(delete_query, job_config=delete_job_config)
         delete_query_job.result()  # Wait for job to complete
+        record_cache.invalidate(filename)
         logger.info(f"Data for file '{filename}' successfully deleted from BigQuery.")
     except Exception as e:
         logger.error(f"BigQuery Deletion Error: {str(e)}")
@@ -0,0 +1,192 @@
+import csv
+import io
+import os
+import tempfile
+import logging
+from fastapi import HTTPException
+from google.cloud import bigquery
+from controllers import local_mirror
+from controllers.results_schema import ensure_results_table, read_row, results_lookback_days
+from controllers.results_table import COLUMN_TYPES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+# Rows fetched from BigQuery per page; only one page is held in memory at a time
+export_page_size = int(os.environ.get("EXPORT_PAGE_SIZE", "1000"))
+
+bigquery_client = bigquery.Client() if not local_mirror.offline_mode else None
+
+# Same columns and headers as the dashboard's Excel export
+EXPORT_COLUMNS = [
+    ("filename", "Filename"),
+    ("car_type", "Car Type"),
+    ("service_related_video", "Service Related Video"),
+    ("sound_and_image", "Sound & Image"),
+    ("show_license_plate", "License Plate Visible"),
+    ("car_on_ramp", "Car on Ramp"),
+    ("service_advisor_or_technician_name", "Technician/Advisor Name"),
+    ("DealershipName", "Dealership Name"),
+    ("customer_name", "Customer Name"),
+    ("special_tools_tyres", "Special Tools - Tyres"),
+    ("special_tools_brake_pad", "Special Tools - Brake Pad"),
+    ("Special_tools_disc", "Special Tools - Disc"),
+    ("attached_offer_mentioned", "Offer Mentioned"),
+    ("correct_ending", "Correct Ending"),
+    ("show_license_plate_eval", "License Plate Score"),
+    ("car_on_ramp_eval", "Car on Ramp Score"),
+    ("service_advisor_or_technician_name_eval", "Technician Name Score"),
+    ("DealershipName_eval", "Dealership Score"),
+    ("customer_name_eval", "Customer Name Score"),
+    ("special_tools_tyres_eval", "Tyre Tools Score"),
+    ("special_tools_brake_pad_eval", "Brake Pad Tools Score"),
+    ("Special_tools_disc_eval", "Disc Tools Score"),
+    ("attached_offer_mentioned_eval", "Offer Mentioned Score"),
+    ("approve_offer_mentioned_eval", "Approve Offer Score"),
+    ("correct_ending_eval", "Correct Ending Score"),
+    ("total_points_eval", "Total Points"),
+    ("percentage", "Percentage"),
+    ("battery_checked_eval", "Battery Check"),
+    ("wind_screen_checked_eval", "Windscreen Check"),
+    ("summary", "Summary"),
+    ("video_url", "Video URL"),
+]
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_pages(search):
+    """Run the export query and yield result pages as lists of value tuples"""
+    # A synced mirror only holds the lookback window when one is set; offline it holds everything
+    if local_mirror.is_ready() and (local_mirror.offline_mode or not results_lookback_days):
+        total_rows = 0
+        for records in local_mirror.iter_record_pages(search, export_page_size):
+            total_rows += len(records)
+            yield [tuple(record.get(field) for field, _ in EXPORT_COLUMNS) for record in records]
+        logger.info(f"Export finished from local mirror: {total_rows} rows")
+        return
+
+    columns = ", ".join(field for field, _ in EXPORT_COLUMNS)
+    ensure_results_table(bigquery_client)
+    # Matches the dashboard's case-insensitive filename filter; always the full history, never the
+    # dashboard's lookback window
+    query = f"""
+        SELECT {columns} FROM `{project_id}.{table_id}`
+        WHERE (@search = '' OR STRPOS(LOWER(filename), LOWER(@search)) > 0)
+        ORDER BY filename
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("search", "STRING", search or ""),
+        ]
+    )
+
+    query_job = bigquery_client.query(query, job_config=job_config)
+    results = query_job.result(page_size=export_page_size)
+
+    total_rows = 0
+    for page in results.pages:
+        rows = [tuple(read_row(row).values()) for row in page]
+        total_rows += len(rows)
+        yield rows
+    logger.info(f"Export finished: {total_rows} rows")
+
+
+def _stream_file(path):
+    """Yield a file in chunks and remove it once fully sent"""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.unlink(path)
+
+
+def _export_csv(search):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    buffer.write("\ufeff")
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+
+    for rows in _iter_pages(search):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _export_xlsx(search):
+    from openpyxl import Workbook
+
+    # write_only mode spools rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Video Analysis Data")
+    worksheet.append([header for _, header in EXPORT_COLUMNS])
+
+    for rows in _iter_pages(search):
+        for row in rows:
+            worksheet.append(list(row))
+
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
+    temp_file.close()
+    workbook.save(temp_file.name)
+    yield from _stream_file(temp_file.name)
+
+
+def _export_parquet(search):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"BOOL": pa.bool_(), "INT64": pa.int64(), "FLOAT64": pa.float64()}
+    schema = pa.schema([(field, arrow_types.get(COLUMN_TYPES[field], pa.string())) for field, _ in EXPORT_COLUMNS])
+    buffer = io.BytesIO()
+    writer = pq.ParquetWriter(buffer, schema)
+
+    # One row group per BigQuery page, flushed to the client as soon as it is written
+    for rows in _iter_pages(search):
+        columns = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+        table = pa.Table.from_arrays(
+            [
+                pa.array([value if value is None or field.type != pa.string() else str(value) for value in column], field.type)
+                for field, column in zip(schema, columns)
+            ],
+            schema=schema,
+        )
+        writer.write_table(table)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    writer.close()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", _export_csv),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _export_xlsx),
+    "parquet": ("application/vnd.apache.parquet", _export_parquet),
+}
+
+
+def export_video_data(export_format, search=None):
+    """Return (media_type, chunk generator) streaming the filtered results table"""
+    export_format = (export_format or "csv").lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}."
+        )
+
+    logger.info(f"Starting {export_format} export with search='{search or ''}'")
+    media_type, exporter = EXPORT_FORMATS[export_format]
+    return media_type, exporter(search)
@@ -1,17 +1,29 @@
 from google.cloud import storage
 import os
 from fastapi import HTTPException
+from controllers import local_mirror, renditions
+from controllers.signed_urls import playback_urls
 # Initialize the GCS client
 project_id = os.environ.get("PROJECT_ID")
 bucket_id = os.environ.get("BUCKET_ID")
 table_id = os.environ.get("BIGQUERY_TABLE_ID")
 bucket_folder = os.environ.get("BUCKET_FOLDER")
 
-storage_client = storage.Client()
+storage_client = storage.Client() if not local_mirror.offline_mode else None
 
 
 
-def get_all_files():
+def get_all_files_with_generation():
+    """List the video files and a token that changes whenever the listing changes"""
+    if local_mirror.offline_mode:
+        # No bucket offline: list the videos recorded in the local mirror
+        file_urls = [
+            {"file_name": record.get("filename"), "public_url": record.get("video_url"),
+             "playback_url": record.get("video_url"), "thumbnail_url": None, "preview_url": None}
+            for record in local_mirror.get_all_records()
+        ]
+        return file_urls, local_mirror.get_version()
+
     try:
         # Access the specified GCS bucket
         bucket = storage_client.get_bucket(bucket_id)
@@ -19,7 +31,14 @@ def get_all_files():
         blobs = bucket.list_blobs()
         # Generate list of file names and public URLs for files in the specified folder
         file_urls = []
+        generations = []
+        available_renditions = set()
         for blob in blobs:
+            # Thumbnails and previews are listed in the same pass
+            if renditions.is_rendition(blob.name):
+                available_renditions.add(blob.name)
+                generations.append(f"{blob.name}#{blob.generation}")
+                continue
             # Check if the blob is in the specified folder and has the correct extensions
             if blob.name.startswith(f"{bucket_folder}/") and (
                     blob.name.endswith(".mp4") or blob.name.endswith(".webm")):
@@ -30,8 +49,24 @@ def get_all_files():
                     "file_name": os.path.basename(blob.name),  # Get only the file name
                     "public_url": public_url
                 })
+                generations.append(f"{blob.name}#{blob.generation}")
+
+        # Signed playback URLs for every video and rendition, minted in one batch
+        blob_names = []
+        for file_url in file_urls:
+            blob_names.append(f"{bucket_folder}/{file_url['file_name']}")
+            blob_names.extend(renditions.existing_names(file_url["file_name"], available_renditions))
+        urls = playback_urls(blob_names)
+        for file_url in file_urls:
+            file_url["playback_url"] = urls.get(f"{bucket_folder}/{file_url['file_name']}")
+            file_url.update(renditions.urls_for(file_url["file_name"], available_renditions, urls))
 
-        return file_urls
+        return file_urls, ",".join(generations)
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_all_files():
+    file_urls, _ = get_all_files_with_generation()
+    return file_urls
@@ -2,6 +2,11 @@ from google.cloud import storage, bigquery
 import os
 import logging
 from fastapi import HTTPException
+from controllers.record_cache import record_cache
+from controllers import local_mirror, renditions
+from controllers.signed_urls import playback_urls
+from controllers.results_schema import lookback_filter, ensure_results_table, read_row
+from controllers.results_table import DETAIL_COLUMNS
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,39 +16,146 @@ bucket_id = os.environ.get("BUCKET_ID")
 table_id = os.environ.get("BIGQUERY_TABLE_ID")
 bucket_folder = os.environ.get("BUCKET_FOLDER")
 
-bigquery_client = bigquery.Client()
+bigquery_client = bigquery.Client() if not local_mirror.offline_mode else None
 
 
 
-def get_video_file_data(filename):
+# Upper bound on filenames resolved by one multi-get query
+max_batch_filenames = int(os.environ.get("RECORD_BATCH_LIMIT", "500"))
+
+
+def _records_response(records):
+    """Split rows into the records/summary shape returned by the single-record API"""
+    records = [dict(record) for record in records]
+    available = renditions.available_renditions()
+    blob_names = []
+    for record in records:
+        blob_names.append(f"{bucket_folder}/{record.get('filename')}")
+        blob_names.extend(renditions.existing_names(record.get("filename"), available))
+    urls = playback_urls(blob_names) if not local_mirror.offline_mode else {}
+    for record in records:
+        # video_url stays the stored storage.cloud.google.com URL; playback_url is for the browser
+        record["playback_url"] = urls.get(f"{bucket_folder}/{record.get('filename')}", record.get("video_url"))
+        record.update(renditions.urls_for(record.get("filename"), available, urls))
+    summary_list = [record.pop('summary') for record in records if 'summary' in record]
+    return {"records": records, "summary": summary_list}
+
+
+def _lacks_details(records):
+    """True when mirrored rows came from a listing sync, which leaves out the detail columns"""
+    if local_mirror.offline_mode:
+        return False
+    return any(column not in record for record in records for column in DETAIL_COLUMNS)
 
-    try:
-        logging.info(f"Received filename: {filename}")
 
+def _query_records(filenames):
+    """Rows of the filenames by filename, from the lookback window's partitions first; filenames
+    analyzed before the window are then looked up across the full history"""
+    ensure_results_table(bigquery_client)
+    lookback = lookback_filter()
+    passes = [lookback] if lookback[0] == "TRUE" else [lookback, ("TRUE", [])]
+    fetched = {}
+    pending = list(filenames)
+    for condition, parameters in passes:
+        if not pending:
+            break
+        # Clustering on filename limits the scan to the blocks holding these files' rows
         query = f"""
         SELECT * FROM `{project_id}.{table_id}` 
-        WHERE filename = @filename
+        WHERE filename IN UNNEST(@filenames) AND {condition}
         """
-
         job_config = bigquery.QueryJobConfig(
             query_parameters=[
-                bigquery.ScalarQueryParameter("filename", "STRING", filename),
+                bigquery.ArrayQueryParameter("filenames", "STRING", pending),
+                *parameters,
             ]
         )
+        for row in bigquery_client.query(query, job_config=job_config).result():
+            record = read_row(row)
+            fetched.setdefault(record.get("filename"), []).append(record)
+        pending = [filename for filename in pending if filename not in fetched]
+    return fetched
+
+
+def get_video_file_data(filename):
+
+    try:
+        logging.info(f"Received filename: {filename}")
 
-        query_job = bigquery_client.query(query, job_config=job_config)
-        results = query_job.result()
+        cached = record_cache.get(filename)
+        if cached:
+            logging.info(f"Record cache hit for: {filename}")
+            return _records_response(cached)
 
-        records = [dict(row) for row in results]
+        if local_mirror.is_ready():
+            records = local_mirror.get_records([filename])
+            # Rows inserted by other instances since the last sync are still read from BigQuery
+            if records or local_mirror.offline_mode:
+                if not records:
+                    raise HTTPException(status_code=404, detail="No records found for the given filename")
+                if _lacks_details(records):
+                    records = _query_records([filename]).get(filename, records)
+                record_cache.put(filename, records)
+                return _records_response(records)
+
+        records = _query_records([filename]).get(filename, [])
         logging.info(f"Records fetched: {records}")
 
         if not records:
             raise HTTPException(status_code=404, detail="No records found for the given filename")
 
-        summary_list = [record.pop('summary') for record in records if 'summary' in record]
+        record_cache.put(filename, records)
+
+        return _records_response(records)
+
+    except Exception as e:
+        logging.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_video_files_data(filenames):
+    """Fetch records for many filenames, serving cache hits and querying all misses at once"""
+    filenames = list(dict.fromkeys(filenames))
+    if len(filenames) > max_batch_filenames:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {max_batch_filenames} filenames can be requested at once"
+        )
+
+    try:
+        found = {}
+        misses = []
+        for filename in filenames:
+            cached = record_cache.get(filename)
+            if cached:
+                found[filename] = cached
+            else:
+                misses.append(filename)
+
+        logging.info(f"Multi-get: {len(found)} cache hits, {len(misses)} misses")
+
+        if misses and local_mirror.is_ready():
+            mirrored = {}
+            for record in local_mirror.get_records(misses):
+                mirrored.setdefault(record.get("filename"), []).append(record)
+            # Rows synced without their detail columns are read in full from BigQuery with the misses
+            mirrored = {filename: records for filename, records in mirrored.items() if not _lacks_details(records)}
+            for filename, records in mirrored.items():
+                record_cache.put(filename, records)
+            found.update(mirrored)
+            misses = [] if local_mirror.offline_mode else [f for f in misses if f not in mirrored]
+
+        if misses:
+            fetched = _query_records(misses)
+            for filename, records in fetched.items():
+                record_cache.put(filename, records)
+            found.update(fetched)
 
-        return {"records": records, "summary": summary_list}
+        return {
+            "records": {filename: _records_response(found[filename]) for filename in filenames if filename in found},
+            "missing": [filename for filename in filenames if filename not in found]
+        }
 
     except Exception as e:
         logging.error(f"Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
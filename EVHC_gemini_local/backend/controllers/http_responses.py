@@ -0,0 +1,108 @@
+import re
+import gzip
+import hashlib
+import logging
+import orjson
+from fastapi import HTTPException, Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Small bodies are not worth the compression overhead
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+# Brotli's default quality (11) is meant for static files and is far too slow per request
+BROTLI_QUALITY = 5
+
+
+def make_etag(*parts):
+    """Build a weak ETag from the values that identify a version of the data"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str):
+    """Check the request's If-None-Match header against an ETag (weak comparison)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == wanted for candidate in if_none_match.split(","))
+
+
+def accepted_encodings(request: Request):
+    """Parse Accept-Encoding into the set of codings the client allows"""
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compress_body(request: Request, body: bytes):
+    """Compress a body with the best encoding the client accepts; returns (body, encoding)"""
+    if len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+
+    accepted = accepted_encodings(request)
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted or "*" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def json_response(request: Request, payload, etag=None, status_code=200):
+    """Serialize a payload with orjson, answering 304 when the client's copy is current"""
+    headers = {"Vary": "Accept-Encoding"}
+    if etag:
+        headers["ETag"] = etag
+        # Clients may reuse their copy but must revalidate it first
+        headers["Cache-Control"] = "no-cache"
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+    body = orjson.dumps(payload, default=str)
+    body, encoding = compress_body(request, body)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def parse_byte_range(range_header, size):
+    """Parse a single 'bytes=' range; returns (start, end) inclusive, None to ignore, or raises 416"""
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header or "")
+    if not match or (not match.group(1) and not match.group(2)):
+        # Malformed or multi-range requests are answered with the full body
+        return None
+    start, end = match.group(1), match.group(2)
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from fastapi import HTTPException
+from prometheus_client import Gauge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Must be on a disk that survives instance restarts for queued jobs to survive them too
+job_queue_path = os.environ.get("JOB_QUEUE_PATH", "job_queue.sqlite3")
+job_max_attempts = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# A running job whose lease is not renewed in time is handed to another worker
+job_lease_seconds = float(os.environ.get("JOB_LEASE_SECONDS", "900"))
+job_retry_backoff_seconds = float(os.environ.get("JOB_RETRY_BACKOFF_SECONDS", "30"))
+
+# queued -> running -> succeeded | queued (retry) | dead (attempts exhausted or permanent error)
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        available_at REAL NOT NULL,
+        lease_owner TEXT,
+        lease_expires_at REAL,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, available_at);
+"""
+
+QUEUE_DEPTH = Gauge("evhc_job_queue_depth", "Jobs in the durable analysis queue", ["status"])
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+@contextmanager
+def _connect():
+    global _schema_ready
+    # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+    connection = sqlite3.connect(job_queue_path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                _schema_ready = True
+        connection.execute("PRAGMA synchronous=FULL")
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextmanager
+def _transaction():
+    with _connect() as connection:
+        # Takes the write lock up front so concurrent workers cannot claim the same job
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+
+def _job_dict(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def enqueue(kind, payload, max_attempts=None):
+    """Persist a job and return its id"""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _transaction() as connection:
+        connection.execute(
+            """
+            INSERT INTO jobs (id, kind, payload, status, attempts, max_attempts, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', 0, ?, ?, ?, ?)
+            """,
+            (job_id, kind, json.dumps(payload), max_attempts or job_max_attempts, now, now, now)
+        )
+    logger.info(f"Enqueued {kind} job {job_id}")
+    return job_id
+
+
+def claim(worker_id, lease_seconds=None):
+    """Lease the oldest runnable job (queued, or running with an expired lease) to a worker"""
+    now = time.time()
+    with _transaction() as connection:
+        while True:
+            row = connection.execute(
+                """
+                SELECT * FROM jobs
+                WHERE (status = 'queued' AND available_at <= ?)
+                   OR (status = 'running' AND lease_expires_at < ?)
+                ORDER BY available_at
+                LIMIT 1
+                """,
+                (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "queued":
+                break
+            if row["attempts"] < row["max_attempts"]:
+                logger.warning(f"Lease of job {row['id']} held by {row['lease_owner']} expired; reclaiming")
+                break
+            # The job keeps killing its workers; stop handing it out
+            logger.error(f"Job {row['id']} dead-lettered: lease expired on its last attempt")
+            connection.execute(
+                "UPDATE jobs SET status = 'dead', error = 'Lease expired on final attempt', lease_owner = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (now, row["id"])
+            )
+        connection.execute(
+            """
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?,
+                            lease_expires_at = ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (worker_id, now + (lease_seconds or job_lease_seconds), now, row["id"])
+        )
+        job = connection.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+    return _job_dict(job)
+
+
+def extend_lease(job_id, worker_id, lease_seconds=None):
+    """Renew a running job's lease; False if the worker no longer owns it"""
+    now = time.time()
+    with _transaction() as connection:
+        updated = connection.execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (now + (lease_seconds or job_lease_seconds), now, job_id, worker_id)
+        ).rowcount
+    return updated == 1
+
+
+def complete(job_id, worker_id, result):
+    with _transaction() as connection:
+        connection.execute(
+            """
+            UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, lease_owner = NULL,
+                            lease_expires_at = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (json.dumps(result, default=str), time.time(), job_id, worker_id)
+        )
+
+
+def fail(job_id, worker_id, error, retryable=True):
+    """Record a failure: retry with exponential backoff, or dead-letter the job"""
+    now = time.time()
+    with _transaction() as connection:
+        row = connection.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        if retryable and row["attempts"] < row["max_attempts"]:
+            delay = job_retry_backoff_seconds * (2 ** (row["attempts"] - 1))
+            status, available_at = "queued", now + delay
+            logger.warning(f"Job {job_id} failed (attempt {row['attempts']}), retrying in {delay:.0f}s: {error}")
+        else:
+            status, available_at = "dead", now
+            logger.error(f"Job {job_id} dead-lettered after {row['attempts']} attempts: {error}")
+        connection.execute(
+            """
+            UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_owner = NULL,
+                            lease_expires_at = NULL, updated_at = ?
+            WHERE id = ? AND lease_owner = ?
+            """,
+            (status, str(error), available_at, now, job_id, worker_id)
+        )
+
+
+def requeue_dead(job_id):
+    """Give a dead-lettered job a fresh set of attempts"""
+    now = time.time()
+    with _transaction() as connection:
+        updated = connection.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'dead'",
+            (now, now, job_id)
+        ).rowcount
+    return updated == 1
+
+
+def get_job(job_id):
+    with _connect() as connection:
+        row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return _job_dict(row)
+
+
+def queue_depth():
+    """Number of jobs per status"""
+    with _connect() as connection:
+        rows = connection.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+    depth = {row["status"]: row["count"] for row in rows}
+    for status in ("queued", "running", "succeeded", "dead"):
+        QUEUE_DEPTH.labels(status=status).set(depth.get(status, 0))
+    return depth
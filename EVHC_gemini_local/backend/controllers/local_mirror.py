@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from controllers.results_table import dealership_from_filename, typed_row
+from controllers.scoring import verdicts_from_row
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+# SQLite file mirroring the BigQuery results table; unset disables the mirror
+mirror_path = os.environ.get("LOCAL_MIRROR_PATH", "")
+# Offline mode serves and stores everything locally and never calls BigQuery
+offline_mode = os.environ.get("LOCAL_MIRROR_OFFLINE", "false").lower() == "true"
+sync_interval_seconds = float(os.environ.get("LOCAL_MIRROR_SYNC_SECONDS", "300"))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        dealership TEXT,
+        analyzed_at TEXT,
+        record TEXT NOT NULL,
+        written_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_results_filename ON results (filename);
+    CREATE INDEX IF NOT EXISTS idx_results_dealership ON results (dealership);
+    CREATE INDEX IF NOT EXISTS idx_results_analyzed_at ON results (analyzed_at);
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS local_deletions (
+        filename TEXT PRIMARY KEY,
+        deleted_at TEXT NOT NULL
+    );
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def is_enabled():
+    return bool(mirror_path) or offline_mode
+
+
+@contextmanager
+def _connect():
+    """Open a short-lived connection; SQLite connections are not shared across threads"""
+    global _schema_ready
+    path = mirror_path or "local_mirror.sqlite3"
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                # Mirrors created before local writes were stamped
+                columns = {row["name"] for row in connection.execute("PRAGMA table_info(results)")}
+                if "written_at" not in columns:
+                    connection.execute("ALTER TABLE results ADD COLUMN written_at TEXT")
+                if connection.execute("SELECT 1 FROM sync_state WHERE key = 'typed_records'").fetchone() is None:
+                    _type_records(connection)
+                _schema_ready = True
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _type_records(connection):
+    """Convert mirrors written while records carried verdicts and scores as strings, once"""
+    updates = []
+    for row in connection.execute("SELECT id, record FROM results").fetchall():
+        record = json.loads(row["record"])
+        # The typed record keeps N/A verdicts only in the verdicts column
+        if not record.get("verdicts"):
+            record["verdicts"] = json.dumps(verdicts_from_row(record), sort_keys=True)
+        updates.append((json.dumps(typed_row(record), default=str), row["id"]))
+    with connection:
+        connection.executemany("UPDATE results SET record = ? WHERE id = ?", updates)
+        connection.execute("INSERT INTO sync_state (key, value) VALUES ('typed_records', '1')")
+    if updates:
+        logger.info(f"Local mirror converted {len(updates)} records to typed verdicts and scores")
+
+
+def _bump_version(connection):
+    connection.execute(
+        "INSERT INTO sync_state (key, value) VALUES ('version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+def _row_values(row, analyzed_at=None):
+    filename = row.get("filename") or ""
+    analyzed_at = row.get("analyzed_at") or analyzed_at
+    if isinstance(analyzed_at, datetime):
+        analyzed_at = analyzed_at.isoformat()
+    return (filename, dealership_from_filename(filename), analyzed_at, json.dumps(row, default=str))
+
+
+def is_ready():
+    """True once the mirror can answer reads (back-filled, or offline)"""
+    if offline_mode:
+        return True
+    if not mirror_path:
+        return False
+    with _connect() as connection:
+        row = connection.execute("SELECT value FROM sync_state WHERE key = 'last_sync'").fetchone()
+    return row is not None
+
+
+def get_version():
+    """Token that changes on every write to the mirror"""
+    with _connect() as connection:
+        version = connection.execute("SELECT value FROM sync_state WHERE key = 'version'").fetchone()
+        last_sync = connection.execute("SELECT value FROM sync_state WHERE key = 'last_sync'").fetchone()
+    return f"mirror:{version['value'] if version else 0}:{last_sync['value'] if last_sync else ''}"
+
+
+def insert_record(row):
+    """Mirror a row written to the results table"""
+    if not is_enabled():
+        return
+    try:
+        written_at = datetime.now(timezone.utc).isoformat()
+        with _connect() as connection:
+            # written_at lets a sync that started before this write keep it
+            connection.execute(
+                "INSERT INTO results (filename, dealership, analyzed_at, record, written_at) VALUES (?, ?, ?, ?, ?)",
+                _row_values(row, written_at) + (written_at,)
+            )
+            _bump_version(connection)
+    except Exception as e:
+        # The mirror is a read optimisation; BigQuery stays the source of truth
+        logger.error(f"Error writing to local mirror: {e}")
+
+
+def delete_records(filename):
+    if not is_enabled():
+        return
+    try:
+        with _connect() as connection:
+            connection.execute("DELETE FROM results WHERE filename = ?", (filename,))
+            # Remembered so a sync whose snapshot predates the delete does not bring the rows back
+            connection.execute(
+                "INSERT OR REPLACE INTO local_deletions (filename, deleted_at) VALUES (?, ?)",
+                (filename, datetime.now(timezone.utc).isoformat())
+            )
+            _bump_version(connection)
+    except Exception as e:
+        logger.error(f"Error deleting from local mirror: {e}")
+
+
+def snapshot_time():
+    """When the BigQuery read behind the last sync started, or None before the first sync"""
+    with _connect() as connection:
+        row = connection.execute("SELECT value FROM sync_state WHERE key = 'snapshot_at'").fetchone()
+    return datetime.fromisoformat(row["value"]) if row else None
+
+
+def replace_all(rows, snapshot_at=None):
+    """Replace the mirror's contents with a copy of the results table read at snapshot_at.
+    Local inserts and deletes made after snapshot_at (while the read ran) are applied on top."""
+    snapshot_at = snapshot_at or datetime.now(timezone.utc)
+    snapshot_key = snapshot_at.isoformat()
+    with _connect() as connection:
+        newer = connection.execute(
+            "SELECT filename, dealership, analyzed_at, record, written_at FROM results "
+            "WHERE written_at > ? ORDER BY id",
+            (snapshot_key,)
+        ).fetchall()
+        deleted = {
+            row["filename"] for row in connection.execute(
+                "SELECT filename FROM local_deletions WHERE deleted_at > ?", (snapshot_key,)
+            )
+        }
+        newer_ids = {json.loads(row["record"]).get("result_id") for row in newer} - {None}
+        connection.execute("DELETE FROM results")
+        connection.executemany(
+            "INSERT INTO results (filename, dealership, analyzed_at, record) VALUES (?, ?, ?, ?)",
+            [
+                _row_values(row) for row in rows
+                if row.get("filename") not in deleted and row.get("result_id") not in newer_ids
+            ]
+        )
+        # Re-inserted last so they keep their place after the rows they were written after
+        connection.executemany(
+            "INSERT INTO results (filename, dealership, analyzed_at, record, written_at) VALUES (?, ?, ?, ?, ?)",
+            [tuple(row) for row in newer]
+        )
+        connection.execute("DELETE FROM local_deletions WHERE deleted_at <= ?", (snapshot_key,))
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_sync', ?)",
+            (datetime.now(timezone.utc).isoformat(),)
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('snapshot_at', ?)",
+            (snapshot_key,)
+        )
+        _bump_version(connection)
+
+
+def get_all_records():
+    with _connect() as connection:
+        rows = connection.execute("SELECT record FROM results ORDER BY id").fetchall()
+    return [json.loads(row["record"]) for row in rows]
+
+
+def get_all_records_with_ids():
+    with _connect() as connection:
+        rows = connection.execute("SELECT id, record FROM results ORDER BY id").fetchall()
+    return [(row["id"], json.loads(row["record"])) for row in rows]
+
+
+def update_records(updates):
+    """Rewrite mirrored rows in place from (id, row) pairs"""
+    with _connect() as connection:
+        connection.executemany(
+            "UPDATE results SET record = ? WHERE id = ?",
+            [(json.dumps(row, default=str), row_id) for row_id, row in updates]
+        )
+        _bump_version(connection)
+
+
+def get_records(filenames):
+    """Return mirrored rows for the given filenames, in table order"""
+    if not filenames:
+        return []
+    placeholders = ", ".join("?" for _ in filenames)
+    with _connect() as connection:
+        rows = connection.execute(
+            f"SELECT record FROM results WHERE filename IN ({placeholders}) ORDER BY id",
+            list(filenames)
+        ).fetchall()
+    return [json.loads(row["record"]) for row in rows]
+
+
+def iter_record_pages(search=None, page_size=1000):
+    """Yield pages of mirrored rows ordered by filename, filtered like the dashboard"""
+    last_key = ("", 0)
+    while True:
+        with _connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT id, filename, record FROM results
+                WHERE (? = '' OR instr(lower(filename), lower(?)) > 0)
+                  AND (filename > ? OR (filename = ? AND id > ?))
+                ORDER BY filename, id
+                LIMIT ?
+                """,
+                (search or "", search or "", last_key[0], last_key[0], last_key[1], page_size)
+            ).fetchall()
+        if not rows:
+            return
+        last_key = (rows[-1]["filename"], rows[-1]["id"])
+        yield [json.loads(row["record"]) for row in rows]
+
+
+def sync_from_bigquery():
+    """Back-fill the mirror from a full read of the BigQuery results table"""
+    if offline_mode or not mirror_path:
+        return
+    from google.cloud import bigquery
+    from controllers.data_from_bigquery import bigquery_client
+    from controllers.results_schema import lookback_filter, ensure_results_table, read_row
+    from controllers.results_table import LISTING_COLUMNS
+
+    started = time.monotonic()
+    snapshot_at = datetime.now(timezone.utc)
+    # The mirror holds what the dashboard reads: the lookback window, or the full history
+    condition, parameters = lookback_filter()
+    ensure_results_table(bigquery_client)
+    query = f"SELECT {', '.join(LISTING_COLUMNS)} FROM `{project_id}.{table_id}` WHERE {condition}"
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    rows = [read_row(row) for row in bigquery_client.query(query, job_config=job_config).result()]
+    replace_all(rows, snapshot_at)
+    logger.info(f"Local mirror synced {len(rows)} rows in {time.monotonic() - started:.1f}s")
+
+
+def run_periodic_sync(stop_event: threading.Event):
+    """Sync on startup and then every LOCAL_MIRROR_SYNC_SECONDS until stopped"""
+    while not stop_event.is_set():
+        try:
+            sync_from_bigquery()
+        except Exception as e:
+            logger.error(f"Local mirror sync failed: {e}")
+        stop_event.wait(sync_interval_seconds)
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from prometheus_client import Counter, Histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The loop wakes a heartbeat every LOOP_MONITOR_INTERVAL_MS; a watchdog thread reports the loop as
+# stalled when the heartbeat is late by more than LOOP_STALL_THRESHOLD_MS
+loop_monitor_enabled = os.environ.get("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+loop_monitor_interval = float(os.environ.get("LOOP_MONITOR_INTERVAL_MS", "100")) / 1000
+loop_stall_threshold = float(os.environ.get("LOOP_STALL_THRESHOLD_MS", "500")) / 1000
+# Innermost frames of the blocking stack written to the log
+loop_stall_stack_depth = int(os.environ.get("LOOP_STALL_STACK_DEPTH", "15"))
+
+LOOP_LAG = Histogram(
+    "evhc_event_loop_lag_seconds", "How late the event-loop heartbeat woke up",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+STALLS = Counter("evhc_event_loop_stalls_total", "Event-loop stalls over the threshold, by blocking call site", ["call_site"])
+STALL_SECONDS = Counter(
+    "evhc_event_loop_stall_seconds_total", "Time the event loop spent stalled, by blocking call site", ["call_site"]
+)
+
+# Frames under the backend directory are application code; the innermost one names the call site
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The loop thread is inside the selector when its stall was waiting for the GIL, not blocking
+IDLE_SITE = "idle-loop"
+
+_heartbeat = None
+_loop_thread_id = None
+_task = None
+_sites_lock = threading.Lock()
+_sites = {}
+
+
+async def _beat(stop_event: threading.Event):
+    global _heartbeat
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        scheduled = loop.time()
+        _heartbeat = time.monotonic()
+        await asyncio.sleep(loop_monitor_interval)
+        LOOP_LAG.observe(max(loop.time() - scheduled - loop_monitor_interval, 0.0))
+
+
+def call_site(frame):
+    """`file:line in function` of the innermost application frame of a stack"""
+    innermost = frame
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_ROOT) and filename != __file__ and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, APP_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    if innermost is not None and innermost.f_code.co_filename.endswith("selectors.py"):
+        return IDLE_SITE
+    code = innermost.f_code if innermost is not None else None
+    return f"{os.path.basename(code.co_filename)}:{innermost.f_lineno} in {code.co_name}" if code else "unknown"
+
+
+def _record(site, seconds, stack=None):
+    with _sites_lock:
+        entry = _sites.setdefault(site, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "stack": None})
+        if stack is not None:
+            entry["count"] += 1
+            entry["stack"] = stack
+        entry["total_seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+
+def _watch(stop_event: threading.Event):
+    stalled_beat = None
+    site = None
+    poll = min(loop_monitor_interval, loop_stall_threshold) / 2
+    while not stop_event.wait(poll):
+        beat = _heartbeat
+        if beat is None:
+            continue
+        if stalled_beat is not None and beat != stalled_beat:
+            # The heartbeat ran again: the stall is over
+            duration = beat - stalled_beat - loop_monitor_interval
+            STALL_SECONDS.labels(call_site=site).inc(duration)
+            _record(site, duration)
+            logger.warning(f"Event loop unblocked after {duration:.2f}s (blocked at {site})")
+            stalled_beat = None
+        lag = time.monotonic() - beat - loop_monitor_interval
+        if stalled_beat is None and lag > loop_stall_threshold:
+            frame = sys._current_frames().get(_loop_thread_id)
+            if frame is None:
+                continue
+            stalled_beat = beat
+            site = call_site(frame)
+            stack = "".join(traceback.format_stack(frame)[-loop_stall_stack_depth:])
+            STALLS.labels(call_site=site).inc()
+            _record(site, 0.0, stack)
+            logger.warning(f"Event loop blocked for over {lag:.2f}s at {site}; loop thread stack:\n{stack}")
+
+
+def start(stop_event: threading.Event):
+    """Start the heartbeat on the running event loop and the watchdog thread watching it"""
+    global _loop_thread_id, _task
+    if not loop_monitor_enabled or _task is not None:
+        return
+    _loop_thread_id = threading.get_ident()
+    _task = asyncio.get_running_loop().create_task(_beat(stop_event))
+    threading.Thread(target=_watch, args=(stop_event,), name="loop-watchdog", daemon=True).start()
+    logger.info(
+        f"Event-loop monitor started (heartbeat {loop_monitor_interval * 1000:.0f}ms, "
+        f"stall threshold {loop_stall_threshold * 1000:.0f}ms)"
+    )
+
+
+def stall_report():
+    """Stalls seen by this process per call site, worst first"""
+    with _sites_lock:
+        sites = [{"call_site": site} | dict(entry) for site, entry in _sites.items()]
+    return sorted(sites, key=lambda entry: entry["total_seconds"], reverse=True)
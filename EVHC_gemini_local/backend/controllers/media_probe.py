@@ -0,0 +1,152 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import subprocess
+from fastapi import HTTPException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ffprobe_binary = os.environ.get("FFPROBE_BINARY", "ffprobe")
+# A probe that takes longer than this is treated as unreadable media
+media_probe_timeout = float(os.environ.get("MEDIA_PROBE_TIMEOUT_SECONDS", "15"))
+# Caps on how much of the file ffprobe reads before reporting streams
+media_probe_size = os.environ.get("MEDIA_PROBE_SIZE", "50M")
+media_probe_analyze_duration = os.environ.get("MEDIA_PROBE_ANALYZE_DURATION_US", "10000000")
+media_min_duration = float(os.environ.get("MEDIA_MIN_DURATION_SECONDS", "1"))
+media_max_duration = float(os.environ.get("MEDIA_MAX_DURATION_SECONDS", "3600"))
+media_require_audio = os.environ.get("MEDIA_REQUIRE_AUDIO", "false").lower() == "true"
+# Empty means any video codec ffprobe can identify
+media_allowed_video_codecs = {
+    codec.strip() for codec in os.environ.get(
+        "MEDIA_ALLOWED_VIDEO_CODECS", "h264,hevc,vp8,vp9,av1,mpeg4,mjpeg"
+    ).split(",") if codec.strip()
+}
+
+SNIFF_BYTES = 16
+# MP4/MOV files start with a box header: 4 size bytes followed by the box type
+MP4_BOX_TYPES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide"}
+CONTAINER_MIME_TYPES = {"mp4": "video/mp4", "matroska": "video/x-matroska", "avi": "video/x-msvideo"}
+
+
+def sniff_container(head):
+    """Identify the container from its magic number; None for anything unsupported"""
+    if len(head) >= 8 and head[4:8] in MP4_BOX_TYPES:
+        return "mp4"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "matroska"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    return None
+
+
+def _frame_rate(value):
+    try:
+        numerator, denominator = (value or "0/0").split("/")
+        return round(float(numerator) / float(denominator), 3) if float(denominator) else None
+    except ValueError:
+        return None
+
+
+def probe_media(path):
+    """Duration, codecs, resolution and audio presence of a media file (bounded ffprobe pass)"""
+    output = subprocess.run(
+        [
+            ffprobe_binary, "-v", "error", "-probesize", media_probe_size,
+            "-analyzeduration", media_probe_analyze_duration,
+            "-show_entries", "format=format_name,duration,bit_rate:"
+                             "stream=codec_type,codec_name,width,height,avg_frame_rate",
+            "-of", "json", path
+        ],
+        capture_output=True, text=True, timeout=media_probe_timeout, check=True
+    ).stdout
+    probe = json.loads(output or "{}")
+    streams = probe.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    media_format = probe.get("format", {})
+    duration = media_format.get("duration")
+    return {
+        "format_name": media_format.get("format_name"),
+        "duration_seconds": round(float(duration), 3) if duration not in (None, "N/A") else None,
+        "bit_rate": int(media_format["bit_rate"]) if str(media_format.get("bit_rate", "")).isdigit() else None,
+        "video_codec": video.get("codec_name") if video else None,
+        "width": video.get("width") if video else None,
+        "height": video.get("height") if video else None,
+        "frame_rate": _frame_rate(video.get("avg_frame_rate")) if video else None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "has_audio": audio is not None,
+    }
+
+
+def check_media(metadata):
+    """Raise a 400 for media that cannot be analyzed"""
+    if not metadata["video_codec"]:
+        raise HTTPException(status_code=400, detail="The file contains no video stream.")
+    if media_allowed_video_codecs and metadata["video_codec"] not in media_allowed_video_codecs:
+        raise HTTPException(status_code=400, detail=f"Unsupported video codec '{metadata['video_codec']}'.")
+    duration = metadata["duration_seconds"]
+    if duration is None or duration < media_min_duration:
+        raise HTTPException(status_code=400, detail="The video is empty or its duration cannot be read.")
+    if duration > media_max_duration:
+        raise HTTPException(
+            status_code=400,
+            detail=f"The video is {duration:.0f}s long; the limit is {media_max_duration:.0f}s."
+        )
+    if media_require_audio and not metadata["has_audio"]:
+        raise HTTPException(status_code=400, detail="The video has no audio track.")
+
+
+def _sniffed_metadata(head, name):
+    container = sniff_container(head)
+    if container is None:
+        logger.warning(f"Rejected {name}: not an MP4, MKV or AVI container")
+        raise HTTPException(status_code=400, detail="Invalid file: not an MP4, MKV or AVI video.")
+    return {"container": container, "mime_type": CONTAINER_MIME_TYPES[container], "probed": False}
+
+
+def _probe_and_check(path, name, metadata):
+    try:
+        metadata.update(probe_media(path))
+    except subprocess.TimeoutExpired:
+        raise HTTPException(status_code=400, detail="The video could not be read in time.")
+    except (subprocess.CalledProcessError, ValueError) as e:
+        logger.warning(f"Rejected {name}: ffprobe failed: {getattr(e, 'stderr', e)}")
+        raise HTTPException(status_code=400, detail="The video is corrupt or unreadable.")
+    metadata["probed"] = True
+
+    check_media(metadata)
+    logger.info(f"Media check passed for {name}: {metadata}")
+    return metadata
+
+
+def validate_upload(file):
+    """Sniff and probe an uploaded video before it is sent anywhere; returns its metadata"""
+    head = file.file.read(SNIFF_BYTES)
+    file.file.seek(0)
+    metadata = _sniffed_metadata(head, file.filename)
+    if shutil.which(ffprobe_binary) is None:
+        logger.warning("ffprobe not available - skipping media probe")
+        return metadata
+
+    # ffprobe needs a seekable file (MP4 indexes are often at the end)
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file.filename or "")[1]) as temp_file:
+        shutil.copyfileobj(file.file, temp_file, length=1024 * 1024)
+        temp_file.flush()
+        file.file.seek(0)
+        metadata["size_bytes"] = temp_file.tell()
+        return _probe_and_check(temp_file.name, file.filename, metadata)
+
+
+def validate_path(path, name=None):
+    """Sniff and probe a video already on local disk (downloads); returns its metadata"""
+    name = name or os.path.basename(path)
+    with open(path, "rb") as source:
+        metadata = _sniffed_metadata(source.read(SNIFF_BYTES), name)
+    if shutil.which(ffprobe_binary) is None:
+        logger.warning("ffprobe not available - skipping media probe")
+        return metadata
+    metadata["size_bytes"] = os.path.getsize(path)
+    return _probe_and_check(path, name, metadata)
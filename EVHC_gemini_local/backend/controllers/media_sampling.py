@@ -0,0 +1,127 @@
+import os
+import logging
+from vertexai.generative_models import Part, GenerationConfig
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+media_sampling_enabled = os.environ.get("MEDIA_SAMPLING_ENABLED", "true").lower() == "true"
+# Comma-separated `min_seconds:resolution:fps` tiers; a video uses the longest tier it reaches.
+# resolution is low, medium, high or empty (model default); empty fps keeps the model default (1 fps).
+# Videos shorter than the first tier are sent with the model defaults.
+media_sampling_policies = os.environ.get("MEDIA_SAMPLING_POLICIES", "300:medium:0.5,900:low:0.25")
+# Skip this much of the start of every whole video (lead-in before the walk-around starts)
+media_clip_start = float(os.environ.get("MEDIA_CLIP_START_SECONDS", "0"))
+# Analyze at most this much of a video after the start offset; 0 analyzes to the end
+media_clip_max = float(os.environ.get("MEDIA_CLIP_MAX_SECONDS", "0"))
+
+MEDIA_RESOLUTIONS = {
+    "low": "MEDIA_RESOLUTION_LOW",
+    "medium": "MEDIA_RESOLUTION_MEDIUM",
+    "high": "MEDIA_RESOLUTION_HIGH",
+}
+# Gemini accepts these video types; media_probe's sniffed container wins over the extension
+EXTENSION_MIME_TYPES = {
+    ".mp4": "video/mp4", ".m4v": "video/mp4", ".mov": "video/quicktime", ".webm": "video/webm",
+    ".mkv": "video/x-matroska", ".avi": "video/x-msvideo", ".mpeg": "video/mpeg", ".mpg": "video/mpeg",
+    ".3gp": "video/3gpp", ".wmv": "video/wmv", ".flv": "video/x-flv",
+}
+
+
+def _fps_supported():
+    """Whether the installed SDK's Part accepts a video frame rate (the vertexai SDK's VideoMetadata
+    has no fps field up to at least google-cloud-aiplatform 2.5.0)"""
+    try:
+        Part.from_dict({
+            "file_data": {"file_uri": "gs://probe/probe.mp4", "mime_type": "video/mp4"},
+            "video_metadata": {"fps": 1.0},
+        })
+    except Exception:
+        return False
+    return True
+
+
+FPS_SUPPORTED = _fps_supported()
+
+
+def parse_policies(value):
+    """[(min_seconds, resolution, fps)] sorted by min_seconds; raises ValueError on a malformed tier"""
+    policies = []
+    for tier in value.split(","):
+        if not tier.strip():
+            continue
+        min_seconds, resolution, fps = (part.strip() for part in tier.split(":"))
+        resolution = resolution.lower() or None
+        if resolution is not None and resolution not in MEDIA_RESOLUTIONS:
+            raise ValueError(f"Unknown media resolution '{resolution}' in MEDIA_SAMPLING_POLICIES")
+        fps = float(fps) if fps else None
+        if fps is not None and fps <= 0:
+            raise ValueError("MEDIA_SAMPLING_POLICIES frame rates must be positive")
+        policies.append((float(min_seconds), resolution, fps))
+    return sorted(policies)
+
+
+POLICIES = parse_policies(media_sampling_policies)
+
+if media_sampling_enabled and not FPS_SUPPORTED and any(fps for _, _, fps in POLICIES):
+    logger.warning(
+        "Frame-rate sampling is OFF: the installed Vertex AI SDK cannot set a video frame rate, so the fps of "
+        f"MEDIA_SAMPLING_POLICIES ({media_sampling_policies}) is ignored and videos are sampled at the model "
+        "default of 1 fps; media resolution tiers still apply"
+    )
+
+
+def policy_for(duration_seconds):
+    """(resolution, fps) for a video of this length; (None, None) keeps the model defaults"""
+    if not media_sampling_enabled or not duration_seconds:
+        return None, None
+    resolution, fps = None, None
+    for min_seconds, tier_resolution, tier_fps in POLICIES:
+        if duration_seconds >= min_seconds:
+            resolution, fps = tier_resolution, tier_fps
+    return resolution, fps
+
+
+def mime_type_for(url, media_metadata=None):
+    """MIME type of the video at url: the sniffed container, refined by the extension (WebM is Matroska)"""
+    extension = os.path.splitext(url.split("?")[0])[1].lower()
+    by_extension = EXTENSION_MIME_TYPES.get(extension)
+    sniffed = (media_metadata or {}).get("mime_type")
+    if sniffed == "video/x-matroska" and by_extension == "video/webm":
+        return by_extension
+    return sniffed or by_extension or "video/mp4"
+
+
+def _offset(seconds):
+    return f"{seconds:.3f}s"
+
+
+def video_request(url, media_metadata=None, duration_seconds=None, whole_video=True):
+    """(video Part, GenerationConfig or None) for a video: MIME type, frame rate, offsets and media resolution.
+    duration_seconds picks the policy (segments pass their own length); offsets only apply to
+    whole videos, never to segments already cut from one."""
+    media_metadata = media_metadata or {}
+    duration = duration_seconds or media_metadata.get("duration_seconds")
+    resolution, fps = policy_for(duration)
+
+    part = {"file_data": {"file_uri": url, "mime_type": mime_type_for(url, media_metadata)}}
+    video_metadata = {}
+    if fps and FPS_SUPPORTED:
+        video_metadata["fps"] = fps
+    if whole_video and duration and media_clip_start < duration:
+        if media_clip_start > 0:
+            video_metadata["start_offset"] = _offset(media_clip_start)
+        if media_clip_max > 0 and media_clip_start + media_clip_max < duration:
+            video_metadata["end_offset"] = _offset(media_clip_start + media_clip_max)
+    if video_metadata:
+        part["video_metadata"] = video_metadata
+
+    generation_config = None
+    if resolution is not None:
+        generation_config = GenerationConfig.from_dict({"media_resolution": MEDIA_RESOLUTIONS[resolution]})
+    if resolution or video_metadata:
+        logger.info(
+            f"Sampling {url.split('/')[-1]} ({duration or 0:.0f}s) at resolution {resolution or 'default'}, "
+            f"{video_metadata or 'default frame rate, whole video'}"
+        )
+    return Part.from_dict(part), generation_config
@@ -0,0 +1,193 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from prometheus_client import Counter, Histogram
+
+from controllers import local_mirror
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+# Prices in USD per million tokens for the cost estimate; 0 leaves the cost at 0
+model_price_input = float(os.environ.get("MODEL_PRICE_INPUT_PER_MILLION", "0"))
+model_price_cached_input = float(os.environ.get("MODEL_PRICE_CACHED_INPUT_PER_MILLION", "0"))
+model_price_output = float(os.environ.get("MODEL_PRICE_OUTPUT_PER_MILLION", "0"))
+usage_max_days = int(os.environ.get("USAGE_REPORT_MAX_DAYS", "366"))
+
+# Result columns holding the usage of the model calls behind a result (summed over segments)
+TOKEN_FIELDS = ["prompt_tokens", "video_tokens", "audio_tokens", "cached_tokens", "output_tokens"]
+USAGE_FIELDS = TOKEN_FIELDS + ["model_calls", "model_latency_seconds"]
+
+TOKENS = Counter("evhc_model_tokens_total", "Tokens billed by the model, by kind", ["kind", "model"])
+CALLS = Counter("evhc_model_calls_total", "Model calls by outcome", ["outcome", "model"])
+LATENCY = Histogram(
+    "evhc_model_latency_seconds", "Latency of one generate_content call", ["model"],
+    buckets=(1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600),
+)
+PROMPT_TOKENS = Histogram(
+    "evhc_model_prompt_tokens", "Prompt tokens of one model call",
+    buckets=(1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000),
+)
+
+
+def _modality_tokens(details, modality):
+    return sum(
+        detail.token_count or 0 for detail in details or []
+        if getattr(detail.modality, "name", str(detail.modality)).upper().endswith(modality)
+    )
+
+
+def from_response(response, model_name, latency_seconds):
+    """Usage fields of one generate_content response; records them as metrics"""
+    metadata = getattr(response, "usage_metadata", None)
+    details = getattr(metadata, "prompt_tokens_details", None)
+    usage = {
+        "prompt_tokens": getattr(metadata, "prompt_token_count", 0) or 0,
+        "video_tokens": _modality_tokens(details, "VIDEO"),
+        "audio_tokens": _modality_tokens(details, "AUDIO"),
+        "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0,
+        "output_tokens": getattr(metadata, "candidates_token_count", 0) or 0,
+        "model_calls": 1,
+        "model_latency_seconds": round(latency_seconds, 3),
+        "model_name": model_name,
+    }
+    for field in TOKEN_FIELDS:
+        TOKENS.labels(kind=field[:-len("_tokens")], model=model_name).inc(usage[field])
+    CALLS.labels(outcome="success", model=model_name).inc()
+    LATENCY.labels(model=model_name).observe(latency_seconds)
+    PROMPT_TOKENS.observe(usage["prompt_tokens"])
+    logger.info(
+        f"Model usage: {usage['prompt_tokens']} prompt ({usage['video_tokens']} video, {usage['cached_tokens']} cached), "
+        f"{usage['output_tokens']} output tokens in {latency_seconds:.1f}s"
+    )
+    return usage
+
+
+def record_failure(model_name, latency_seconds):
+    CALLS.labels(outcome="error", model=model_name).inc()
+    LATENCY.labels(model=model_name).observe(latency_seconds)
+
+
+def combine(results):
+    """Summed usage of several results (the segments of one video)"""
+    usage = {field: sum(result.get(field) or 0 for result in results) for field in USAGE_FIELDS}
+    usage["model_latency_seconds"] = round(usage["model_latency_seconds"], 3)
+    usage["model_name"] = next((result["model_name"] for result in results if result.get("model_name")), "")
+    return usage
+
+
+def estimated_cost(prompt_tokens, cached_tokens, output_tokens):
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return round(
+        (uncached * model_price_input + cached_tokens * model_price_cached_input + output_tokens * model_price_output)
+        / 1_000_000, 6
+    )
+
+
+def _duration(media_metadata):
+    try:
+        metadata = json.loads(media_metadata) if isinstance(media_metadata, str) else media_metadata
+        return float((metadata or {}).get("duration_seconds") or 0)
+    except (ValueError, TypeError, AttributeError):
+        return 0.0
+
+
+def _group_rows_locally(since):
+    """Offline mode: per-day, per-dealership sums over the local mirror"""
+    groups = {}
+    for record in local_mirror.get_all_records():
+        analyzed_at = record.get("analyzed_at")
+        if not analyzed_at or record.get("model_calls") is None:
+            continue
+        analyzed_at = datetime.fromisoformat(str(analyzed_at))
+        if analyzed_at < since:
+            continue
+        key = (analyzed_at.date().isoformat(), record.get("dealership") or "")
+        group = groups.setdefault(key, {"day": key[0], "dealership": key[1], "analyses": 0, "video_seconds": 0.0,
+                                        **{field: 0 for field in USAGE_FIELDS}})
+        group["analyses"] += 1
+        group["video_seconds"] += _duration(record.get("media_metadata"))
+        for field in USAGE_FIELDS:
+            group[field] += float(record.get(field) or 0)
+    return list(groups.values())
+
+
+def _group_rows_in_bigquery(since):
+    from google.cloud import bigquery
+    from controllers.data_from_bigquery import bigquery_client
+
+    sums = ", ".join(f"SUM({field}) AS {field}" for field in USAGE_FIELDS)
+    # Partition pruning on analyzed_at keeps the scan to the requested days
+    query = f"""
+        SELECT CAST(DATE(analyzed_at) AS STRING) AS day, IFNULL(dealership, '') AS dealership,
+               COUNT(*) AS analyses,
+               SUM(IFNULL(SAFE_CAST(JSON_VALUE(media_metadata, '$.duration_seconds') AS FLOAT64), 0)) AS video_seconds,
+               {sums}
+        FROM `{project_id}.{table_id}`
+        WHERE analyzed_at >= @since AND model_calls IS NOT NULL
+        GROUP BY day, dealership
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)])
+    return [dict(row) for row in bigquery_client.query(query, job_config=job_config).result()]
+
+
+def _summarize(key_fields, rows):
+    """Sum grouped rows under key_fields and derive averages, cost and video tokens per second"""
+    totals = {}
+    for row in rows:
+        key = tuple(row[field] for field in key_fields)
+        total = totals.setdefault(key, {**dict(zip(key_fields, key)), "analyses": 0, "video_seconds": 0.0,
+                                        **{field: 0 for field in USAGE_FIELDS}})
+        for field in ["analyses", "video_seconds"] + USAGE_FIELDS:
+            total[field] += row[field] or 0
+    summaries = []
+    for total in totals.values():
+        for field in ["analyses", "model_calls"] + TOKEN_FIELDS:
+            total[field] = int(total[field])
+        total["video_seconds"] = round(total["video_seconds"], 1)
+        total["model_latency_seconds"] = round(total["model_latency_seconds"], 1)
+        calls = total["model_calls"] or 1
+        total["avg_prompt_tokens_per_call"] = round(total["prompt_tokens"] / calls)
+        total["avg_output_tokens_per_call"] = round(total["output_tokens"] / calls)
+        total["avg_latency_seconds"] = round(total["model_latency_seconds"] / calls, 2)
+        # How video tokens scale with video length (resolution and sampling show up here)
+        total["video_tokens_per_second"] = (
+            round(total["video_tokens"] / total["video_seconds"], 1) if total["video_seconds"] else None
+        )
+        total["estimated_cost_usd"] = estimated_cost(
+            total["prompt_tokens"], total["cached_tokens"], total["output_tokens"]
+        )
+        summaries.append(total)
+    return sorted(summaries, key=lambda summary: tuple(summary[field] for field in key_fields))
+
+
+def usage_report(days=30):
+    """Token, latency and cost totals per day, per dealership and per day and dealership"""
+    if not 1 <= days <= usage_max_days:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {usage_max_days}")
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    try:
+        if local_mirror.offline_mode:
+            rows = _group_rows_locally(since)
+        else:
+            rows = _group_rows_in_bigquery(since)
+    except Exception as e:
+        logger.error(f"Error building the usage report: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    for row in rows:
+        row["all"] = ""
+    totals = _summarize(["all"], rows)
+    for total in totals:
+        del total["all"]
+    return {
+        "since": since.isoformat(),
+        "totals": totals[0] if totals else None,
+        "by_day": _summarize(["day"], rows),
+        "by_dealership": _summarize(["dealership"], rows),
+        "by_day_and_dealership": _summarize(["day", "dealership"], rows),
+    }
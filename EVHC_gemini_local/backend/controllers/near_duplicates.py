@@ -0,0 +1,291 @@
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+bucket_id = os.environ.get("BUCKET_ID")
+
+# "reuse" copies the matched result instead of calling the model, "flag" analyzes and marks it for review, "off" disables
+near_duplicate_action = os.environ.get("NEAR_DUPLICATE_ACTION", "reuse").lower()
+near_duplicate_index_path = os.environ.get("NEAR_DUPLICATE_INDEX_PATH", "near_duplicates.sqlite3")
+ffmpeg_binary = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+ffmpeg_timeout = float(os.environ.get("FFMPEG_TIMEOUT_SECONDS", "300"))
+# One sampled frame every 1 / FINGERPRINT_FPS seconds, up to FINGERPRINT_MAX_FRAMES frames
+fingerprint_fps = float(os.environ.get("FINGERPRINT_FPS", "0.5"))
+fingerprint_max_frames = int(os.environ.get("FINGERPRINT_MAX_FRAMES", "300"))
+fingerprint_min_frames = int(os.environ.get("FINGERPRINT_MIN_FRAMES", "5"))
+# Two frames match when their 64-bit hashes differ in at most this many bits (< BANDS, see below)
+frame_hamming_threshold = int(os.environ.get("FRAME_HAMMING_THRESHOLD", "6"))
+# Share of the shorter video's frames that must match: reuse above the first, review above the second
+duplicate_min_similarity = float(os.environ.get("NEAR_DUPLICATE_MIN_SIMILARITY", "0.85"))
+review_min_similarity = float(os.environ.get("NEAR_DUPLICATE_REVIEW_SIMILARITY", "0.6"))
+
+# Hashes are split into 8 one-byte bands. Two hashes within 7 bits of each other share at least
+# one band exactly (pigeonhole), so an indexed equality lookup on the bands finds every candidate.
+BANDS = 8
+HASH_WIDTH, HASH_HEIGHT = 9, 8
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        gcs_url TEXT NOT NULL UNIQUE,
+        filename TEXT,
+        analyzed INTEGER NOT NULL DEFAULT 0,
+        frame_count INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_videos_filename ON videos (filename);
+    CREATE TABLE IF NOT EXISTS frames (
+        video_id INTEGER NOT NULL REFERENCES videos (id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        hash INTEGER NOT NULL,
+        b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, b4 INTEGER, b5 INTEGER, b6 INTEGER, b7 INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_frames_video ON frames (video_id);
+""" + "".join(f"    CREATE INDEX IF NOT EXISTS idx_frames_b{band} ON frames (b{band});\n" for band in range(BANDS))
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def is_enabled():
+    return near_duplicate_action in ("reuse", "flag")
+
+
+@contextmanager
+def _connect():
+    global _schema_ready
+    connection = sqlite3.connect(near_duplicate_index_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        connection.execute("PRAGMA foreign_keys=ON")
+        if not _schema_ready:
+            with _schema_lock:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                _schema_ready = True
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def _bands(value):
+    return [(value >> (8 * band)) & 0xFF for band in range(BANDS)]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def dhash(pixels):
+    """64-bit difference hash of a 9x8 grayscale frame: one bit per horizontal brightness gradient"""
+    value = 0
+    for y in range(HASH_HEIGHT):
+        row = pixels[y * HASH_WIDTH:(y + 1) * HASH_WIDTH]
+        for x in range(HASH_WIDTH - 1):
+            value = (value << 1) | (row[x] > row[x + 1])
+    return value
+
+
+def compute_fingerprint(path):
+    """dHashes of frames sampled at FINGERPRINT_FPS; flat (blank) frames are skipped"""
+    # Only keyframes are decoded, which is many times faster than a full decode of the video
+    output = subprocess.run(
+        [
+            ffmpeg_binary, "-v", "error", "-skip_frame", "nokey", "-i", path,
+            "-vf", f"fps={fingerprint_fps},scale={HASH_WIDTH}:{HASH_HEIGHT}:flags=area,format=gray",
+            "-frames:v", str(fingerprint_max_frames), "-f", "rawvideo", "-"
+        ],
+        capture_output=True, timeout=ffmpeg_timeout, check=True
+    ).stdout
+    frame_size = HASH_WIDTH * HASH_HEIGHT
+    hashes = []
+    for offset in range(0, len(output) - frame_size + 1, frame_size):
+        value = dhash(output[offset:offset + frame_size])
+        if value:
+            hashes.append(value)
+    return hashes
+
+
+def store_fingerprint(gcs_url, hashes, filename=None, analyzed=False):
+    with _connect() as connection:
+        connection.execute("DELETE FROM videos WHERE gcs_url = ?", (gcs_url,))
+        video_id = connection.execute(
+            "INSERT INTO videos (gcs_url, filename, analyzed, frame_count, created_at) VALUES (?, ?, ?, ?, ?)",
+            (gcs_url, filename, int(analyzed), len(hashes), time.time())
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO frames (video_id, position, hash, b0, b1, b2, b3, b4, b5, b6, b7) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(video_id, position, _to_signed(value), *_bands(value)) for position, value in enumerate(hashes)]
+        )
+
+
+def _load_fingerprint(gcs_url):
+    with _connect() as connection:
+        video = connection.execute("SELECT id FROM videos WHERE gcs_url = ?", (gcs_url,)).fetchone()
+        if video is None:
+            return None
+        rows = connection.execute(
+            "SELECT hash FROM frames WHERE video_id = ? ORDER BY position", (video["id"],)
+        ).fetchall()
+    return [_to_unsigned(row["hash"]) for row in rows]
+
+
+def fingerprint_upload(file, gcs_url):
+    """Fingerprint an uploaded file while it is still local; never fails the upload"""
+    if not is_enabled() or shutil.which(ffmpeg_binary) is None:
+        return
+    try:
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file.filename or "")[1]) as temp_file:
+            # The GCS upload before this leaves the file at its end
+            file.file.seek(0)
+            shutil.copyfileobj(file.file, temp_file, length=1024 * 1024)
+            temp_file.flush()
+            file.file.seek(0)
+            store_fingerprint(gcs_url, compute_fingerprint(temp_file.name))
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {file.filename}: {e}")
+
+
+def fingerprint_path(path):
+    """Fingerprint of a local video to store once it has a gs:// URL; None when disabled or failed"""
+    if not is_enabled() or shutil.which(ffmpeg_binary) is None:
+        return None
+    try:
+        return compute_fingerprint(path)
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {path}: {e}")
+        return None
+
+
+def _fingerprint_for(gcs_url):
+    """Stored fingerprint of a gs:// video, computed from a download when missing"""
+    hashes = _load_fingerprint(gcs_url)
+    if hashes is not None:
+        return hashes
+    from controllers.Analyzing_video import get_storage_client
+
+    blob_name = gcs_url[len(f"gs://{bucket_id}/"):]
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(blob_name)[1]) as temp_file:
+        get_storage_client().bucket(bucket_id).blob(blob_name).download_to_filename(temp_file.name)
+        hashes = compute_fingerprint(temp_file.name)
+    store_fingerprint(gcs_url, hashes)
+    return hashes
+
+
+def similarity(hashes, other_hashes):
+    """Share of the shorter video's frames that have a near-identical frame in the other video"""
+    shorter, longer = (hashes, other_hashes) if len(hashes) <= len(other_hashes) else (other_hashes, hashes)
+    if not shorter:
+        return 0.0
+    matched = sum(1 for value in shorter if any(hamming(value, other) <= frame_hamming_threshold for other in longer))
+    return matched / len(shorter)
+
+
+def find_match(hashes, exclude_url=None):
+    """Best-matching analyzed video as (filename, similarity), or None below the review threshold"""
+    if len(hashes) < fingerprint_min_frames:
+        return None
+    band_filter = " OR ".join(f"f.b{band} = ?" for band in range(BANDS))
+    votes = {}
+    with _connect() as connection:
+        # Candidate videos: those sharing at least one band with a query frame
+        for value in hashes:
+            rows = connection.execute(
+                f"""
+                SELECT DISTINCT f.video_id FROM frames f JOIN videos v ON v.id = f.video_id
+                WHERE v.analyzed = 1 AND v.gcs_url != ? AND ({band_filter})
+                """,
+                (exclude_url or "", *_bands(value))
+            ).fetchall()
+            for row in rows:
+                votes[row["video_id"]] = votes.get(row["video_id"], 0) + 1
+
+        best = None
+        for video_id, count in votes.items():
+            video = connection.execute("SELECT filename, frame_count FROM videos WHERE id = ?", (video_id,)).fetchone()
+            # Cheap upper bound: a video cannot score higher than its share of voting frames
+            if count / max(min(len(hashes), video["frame_count"]), 1) < review_min_similarity:
+                continue
+            other = [_to_unsigned(row["hash"]) for row in connection.execute(
+                "SELECT hash FROM frames WHERE video_id = ? ORDER BY position", (video_id,)
+            )]
+            score = similarity(hashes, other)
+            if score >= review_min_similarity and (best is None or score > best[1]):
+                best = (video["filename"], score)
+    return best
+
+
+def check(gcs_url):
+    """Look a video up in the index; returns {filename, similarity, action} for a near duplicate"""
+    if not is_enabled() or not gcs_url.startswith("gs://") or shutil.which(ffmpeg_binary) is None:
+        return None
+    try:
+        started = time.monotonic()
+        match = find_match(_fingerprint_for(gcs_url), exclude_url=gcs_url)
+    except Exception as e:
+        logger.warning(f"Near-duplicate check failed for {gcs_url}: {e}")
+        return None
+    if match is None:
+        return None
+    filename, score = match
+    action = "reuse" if near_duplicate_action == "reuse" and score >= duplicate_min_similarity else "review"
+    logger.info(
+        f"{gcs_url} matches {filename} ({score:.0%} of frames, {time.monotonic() - started:.2f}s) - {action}"
+    )
+    return {"filename": filename, "similarity": round(score, 3), "action": action}
+
+
+def reuse_result(match):
+    """The stored result of the matched video, or None when it is no longer available"""
+    from controllers.get_video_file_data import get_video_files_data
+
+    records = get_video_files_data([match["filename"]])["records"].get(match["filename"])
+    if not records or not records["records"]:
+        return None
+    result = dict(records["records"][-1])
+    # Renditions and playback URLs belong to the matched video, not to the resubmission
+    result.pop("thumbnail_url", None)
+    result.pop("preview_url", None)
+    result.pop("playback_url", None)
+    if records["summary"]:
+        result["summary"] = records["summary"][-1]
+    return result
+
+
+def mark_analyzed(gcs_url, filename):
+    """Make an analyzed video's fingerprint available for matching"""
+    if not is_enabled():
+        return
+    try:
+        with _connect() as connection:
+            connection.execute("UPDATE videos SET analyzed = 1, filename = ? WHERE gcs_url = ?", (filename, gcs_url))
+    except Exception as e:
+        logger.error(f"Error updating near-duplicate index for {filename}: {e}")
+
+
+def remove(filename):
+    try:
+        with _connect() as connection:
+            connection.execute("DELETE FROM videos WHERE filename = ?", (filename,))
+    except Exception as e:
+        logger.error(f"Error removing {filename} from the near-duplicate index: {e}")
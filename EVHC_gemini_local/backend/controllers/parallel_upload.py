@@ -0,0 +1,129 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+bucket_folder = os.environ.get("BUCKET_FOLDER")
+
+parallel_upload_enabled = os.environ.get("PARALLEL_UPLOAD_ENABLED", "true").lower() == "true"
+# Files smaller than this are uploaded as a single stream
+parallel_upload_threshold = int(os.environ.get("PARALLEL_UPLOAD_THRESHOLD_BYTES", str(64 * 1024 * 1024)))
+parallel_upload_part_size = int(os.environ.get("PARALLEL_UPLOAD_PART_BYTES", str(16 * 1024 * 1024)))
+# Each worker holds one part in memory while it uploads
+parallel_upload_max_workers = int(os.environ.get("PARALLEL_UPLOAD_MAX_WORKERS", "8"))
+# Kept outside BUCKET_FOLDER so parts never show up in the file listing
+parallel_upload_parts_folder = os.environ.get("PARALLEL_UPLOAD_PARTS_FOLDER", f"{bucket_folder}_parts")
+
+# GCS compose accepts at most 32 source objects per request
+MAX_COMPOSE_SOURCES = 32
+
+
+def _file_size(file_obj):
+    position = file_obj.tell()
+    file_obj.seek(0, os.SEEK_END)
+    size = file_obj.tell()
+    file_obj.seek(position)
+    return size
+
+
+def _compose(bucket, sources, destination, content_type, parts_prefix, created):
+    """Compose any number of parts into destination, 32 at a time"""
+    level = 0
+    while len(sources) > MAX_COMPOSE_SOURCES:
+        next_sources = []
+        for index in range(0, len(sources), MAX_COMPOSE_SOURCES):
+            group = sources[index:index + MAX_COMPOSE_SOURCES]
+            if len(group) == 1:
+                next_sources.append(group[0])
+                continue
+            intermediate = bucket.blob(f"{parts_prefix}/compose-{level}-{index // MAX_COMPOSE_SOURCES:04d}")
+            intermediate.compose(group)
+            created.append(intermediate)
+            next_sources.append(intermediate)
+        sources = next_sources
+        level += 1
+    destination.content_type = content_type
+    destination.compose(sources)
+
+
+def parallel_upload(bucket, blob_name, file_obj, size, content_type=None):
+    """Upload parts of file_obj concurrently and compose them into bucket/blob_name"""
+    started = time.monotonic()
+    parts_prefix = f"{parallel_upload_parts_folder}/{uuid.uuid4().hex}"
+    offsets = list(range(0, size, parallel_upload_part_size))
+    read_lock = threading.Lock()
+    created = []
+    failed = True
+
+    def upload_part(index, offset):
+        # The source file is shared; reads are serialized, uploads run concurrently
+        with read_lock:
+            file_obj.seek(offset)
+            data = file_obj.read(parallel_upload_part_size)
+        part = bucket.blob(f"{parts_prefix}/part-{index:05d}")
+        # if_generation_match=0 makes the create idempotent, so the client retries it on transient errors
+        part.upload_from_string(data, content_type="application/octet-stream", if_generation_match=0)
+        return part
+
+    try:
+        with ThreadPoolExecutor(max_workers=parallel_upload_max_workers) as executor:
+            futures = [executor.submit(upload_part, index, offset) for index, offset in enumerate(offsets)]
+            # Every part is waited for and recorded before a failure is raised, so none escapes the cleanup
+            parts, errors = [], []
+            for future in futures:
+                try:
+                    part = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                parts.append(part)
+                created.append(part)
+        if errors:
+            raise errors[0]
+
+        blob = bucket.blob(blob_name)
+        _compose(bucket, parts, blob, content_type, parts_prefix, created)
+        blob.reload()
+        if blob.size != size:
+            raise IOError(f"Composed object is {blob.size} bytes, expected {size}")
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Uploaded {blob_name} ({size} bytes) as {len(parts)} parallel parts in {elapsed:.1f}s "
+            f"({size / max(elapsed, 1e-6) / 1024 / 1024:.1f} MB/s)"
+        )
+        failed = False
+        return blob
+
+    finally:
+        # Parts of failed uploads too; the final object is unaffected by deleting its sources
+        for part in created:
+            try:
+                part.delete()
+            except Exception as e:
+                logger.warning(f"Could not delete upload part {part.name}: {e}")
+        if failed:
+            # A part whose upload errored after the object was written is not in `created`
+            try:
+                for leftover in bucket.list_blobs(prefix=f"{parts_prefix}/"):
+                    leftover.delete()
+            except Exception as e:
+                logger.warning(f"Could not clean up upload parts under {parts_prefix}: {e}")
+        file_obj.seek(0)
+
+
+def upload_file(bucket, blob_name, file_obj, content_type=None):
+    """Upload a file-like object to GCS, in parallel parts when it is large"""
+    size = _file_size(file_obj)
+    if parallel_upload_enabled and size >= parallel_upload_threshold and size > parallel_upload_part_size:
+        return parallel_upload(bucket, blob_name, file_obj, size, content_type)
+    blob = bucket.blob(blob_name)
+    blob.upload_from_file(file_obj, content_type=content_type)
+    # Callers read the file again (fingerprinting, renditions), as after a parallel upload
+    file_obj.seek(0)
+    return blob
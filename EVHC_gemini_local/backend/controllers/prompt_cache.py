@@ -0,0 +1,193 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+from vertexai.generative_models import GenerativeModel
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "vertex" uses Vertex AI context caching, "local" runs the same lifecycle in-process without Vertex caching
+# (development; tests/test_prompt_cache.py exercises the lifecycle through it), "off" disables it
+prompt_cache_backend = os.environ.get("PROMPT_CACHE_BACKEND", "vertex").lower()
+prompt_cache_ttl = timedelta(seconds=int(os.environ.get("PROMPT_CACHE_TTL_SECONDS", "3600")))
+# Extend the cache this long before it would expire, so no request races the expiry
+prompt_cache_refresh_margin = timedelta(seconds=int(os.environ.get("PROMPT_CACHE_REFRESH_MARGIN_SECONDS", "300")))
+# After a failed create (quota, region, prompt below the minimum size) wait before trying again
+prompt_cache_retry_after = float(os.environ.get("PROMPT_CACHE_RETRY_AFTER_SECONDS", "600"))
+
+DISPLAY_NAME_PREFIX = "evhc-prompt-"
+
+
+def prompt_version(model_name, system_instructions, static_prompt):
+    """Identifies the cacheable prefix; any prompt or model change yields a new cache"""
+    digest = hashlib.sha256(f"{model_name}\0{system_instructions}\0{static_prompt}".encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+class _CacheEntry:
+    def __init__(self, version, handle, expire_time):
+        self.version = version
+        self.handle = handle
+        self.expire_time = expire_time
+
+
+class ContextCache(ABC):
+    """Lifecycle of the cached prompt prefix: create, refresh before TTL, recreate on version change"""
+
+    def __init__(self):
+        # Guards the entry only; create/refresh/list calls run outside it
+        self._lock = threading.Lock()
+        self._entry = None
+        self._maintaining = False
+        self._retry_at = 0.0
+        self.stats = {"created": 0, "refreshed": 0, "reused": 0, "deleted": 0, "failed": 0}
+
+    def get(self, model_name, system_instructions, static_prompt):
+        """Return a live cache handle for the prefix, or None to send the prompt uncached"""
+        version = prompt_version(model_name, system_instructions, static_prompt)
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                return None
+            entry = self._entry
+            current = entry is not None and entry.version == version
+            if current and entry.expire_time - now >= prompt_cache_refresh_margin:
+                return entry.handle
+            if self._maintaining:
+                # Another request is creating or refreshing the cache: use what is live rather than wait
+                return entry.handle if current and entry.expire_time > now else None
+            self._maintaining = True
+
+        try:
+            entry = self._maintain(entry, version, model_name, system_instructions, static_prompt)
+        except Exception as e:
+            entry = None
+            self.stats["failed"] += 1
+            logger.warning(f"Prompt cache unavailable, sending the full prompt: {e}")
+        with self._lock:
+            self._entry = entry
+            self._maintaining = False
+            if entry is None:
+                self._retry_at = time.monotonic() + prompt_cache_retry_after
+        return entry.handle if entry is not None else None
+
+    def _maintain(self, entry, version, model_name, system_instructions, static_prompt):
+        """Bring the entry to a live cache of this version (only one request at a time runs this)"""
+        if entry is not None and entry.version != version:
+            logger.info(f"Prompt version changed to {version}; replacing cached prefix")
+            self._delete(entry)
+            self.stats["deleted"] += 1
+            entry = None
+
+        now = datetime.now(timezone.utc)
+        if entry is not None and entry.expire_time - now < prompt_cache_refresh_margin:
+            if entry.expire_time <= now:
+                entry = None
+            else:
+                entry.expire_time = self._refresh(entry)
+                self.stats["refreshed"] += 1
+
+        if entry is None:
+            entry = self._find_existing(version)
+            if entry is not None:
+                self.stats["reused"] += 1
+            else:
+                entry = self._create(version, model_name, system_instructions, static_prompt)
+                self.stats["created"] += 1
+                logger.info(f"Created cached prompt prefix {version}")
+        return entry
+
+    @abstractmethod
+    def request_for(self, handle, model_name, system_instructions, video_contents):
+        """Return (model, contents) that use the cached prefix"""
+
+    @abstractmethod
+    def _create(self, version, model_name, system_instructions, static_prompt):
+        """Create the cache for a prefix version; returns its _CacheEntry"""
+
+    @abstractmethod
+    def _refresh(self, entry):
+        """Extend the cache's TTL; returns the new expiry"""
+
+    @abstractmethod
+    def _delete(self, entry):
+        """Delete a cache of an outdated version"""
+
+    def _find_existing(self, version):
+        return None
+
+
+class VertexContextCache(ContextCache):
+    """Prefix cached server-side with Vertex AI context caching"""
+
+    def request_for(self, handle, model_name, system_instructions, video_contents):
+        # System instruction and prefix live in the cache; only the per-video part is sent
+        return GenerativeModel.from_cached_content(cached_content=handle), video_contents
+
+    def _create(self, version, model_name, system_instructions, static_prompt):
+        from vertexai.preview import caching
+
+        cached = caching.CachedContent.create(
+            model_name=model_name,
+            system_instruction=system_instructions,
+            contents=[static_prompt],
+            ttl=prompt_cache_ttl,
+            display_name=f"{DISPLAY_NAME_PREFIX}{version}",
+        )
+        return _CacheEntry(version, cached, cached.expire_time)
+
+    def _refresh(self, entry):
+        entry.handle.update(ttl=prompt_cache_ttl)
+        entry.handle.refresh()
+        return entry.handle.expire_time
+
+    def _delete(self, entry):
+        try:
+            entry.handle.delete()
+        except Exception as e:
+            logger.warning(f"Could not delete cached prompt prefix: {e}")
+
+    def _find_existing(self, version):
+        # Other instances may already have cached the same prefix version
+        from vertexai.preview import caching
+
+        now = datetime.now(timezone.utc)
+        for cached in caching.CachedContent.list():
+            if cached.display_name == f"{DISPLAY_NAME_PREFIX}{version}" and \
+                    cached.expire_time - now > prompt_cache_refresh_margin:
+                return _CacheEntry(version, cached, cached.expire_time)
+        return None
+
+
+class LocalContextCache(ContextCache):
+    """In-process cache with the same lifecycle and no server-side caching; the prefix is sent with every request"""
+
+    def request_for(self, handle, model_name, system_instructions, video_contents):
+        return GenerativeModel(model_name, system_instruction=system_instructions), handle["contents"] + video_contents
+
+    def _create(self, version, model_name, system_instructions, static_prompt):
+        return _CacheEntry(version, {"version": version, "contents": [static_prompt]},
+                           datetime.now(timezone.utc) + prompt_cache_ttl)
+
+    def _refresh(self, entry):
+        return datetime.now(timezone.utc) + prompt_cache_ttl
+
+    def _delete(self, entry):
+        pass
+
+
+context_cache = {"vertex": VertexContextCache, "local": LocalContextCache}.get(prompt_cache_backend, lambda: None)()
+
+
+def prepare_request(model_name, system_instructions, static_prompt, video_contents):
+    """Return (model, contents) for a request, reusing the cached prefix when available"""
+    handle = context_cache.get(model_name, system_instructions, static_prompt) if context_cache else None
+    if handle is not None:
+        return context_cache.request_for(handle, model_name, system_instructions, video_contents)
+    # Same prefix-first layout as the cached path
+    return GenerativeModel(model_name, system_instruction=system_instructions), [static_prompt] + video_contents
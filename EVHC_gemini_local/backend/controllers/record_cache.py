@@ -0,0 +1,63 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Entries also expire so other instances' writes and deletes become visible eventually
+record_cache_size = int(os.environ.get("RECORD_CACHE_SIZE", "5000"))
+record_cache_ttl = float(os.environ.get("RECORD_CACHE_TTL_SECONDS", "300"))
+
+
+class RecordCache:
+    """Thread-safe LRU cache of full results-table rows (detail columns included) keyed by filename"""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, filename):
+        """Return a copy of the cached rows for a filename, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[filename]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(filename)
+            self.hits += 1
+            return [dict(row) for row in entry[1]]
+
+    def put(self, filename, rows):
+        """Replace the cached rows for a filename"""
+        with self._lock:
+            self._entries[filename] = (time.monotonic() + self.ttl_seconds, [dict(row) for row in rows])
+            self._entries.move_to_end(filename)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def append(self, filename, row):
+        """Add a newly inserted row, keeping rows already cached for the filename"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            rows = entry[1] if entry is not None and entry[0] >= time.monotonic() else []
+        self.put(filename, rows + [row])
+
+    def invalidate(self, filename):
+        with self._lock:
+            self._entries.pop(filename, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+record_cache = RecordCache(record_cache_size, record_cache_ttl)
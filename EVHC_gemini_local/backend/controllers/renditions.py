@@ -0,0 +1,192 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from controllers import local_mirror
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+bucket_id = os.environ.get("BUCKET_ID")
+bucket_folder = os.environ.get("BUCKET_FOLDER")
+
+renditions_enabled = os.environ.get("RENDITIONS_ENABLED", "true").lower() == "true" and not local_mirror.offline_mode
+# Kept outside BUCKET_FOLDER so renditions never show up as videos in the file listing
+preview_folder = os.environ.get("PREVIEW_FOLDER", f"{bucket_folder}_previews")
+ffmpeg_binary = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+ffmpeg_timeout = float(os.environ.get("FFMPEG_TIMEOUT_SECONDS", "300"))
+preview_height = int(os.environ.get("PREVIEW_HEIGHT", "360"))
+preview_video_bitrate = os.environ.get("PREVIEW_VIDEO_BITRATE", "400k")
+preview_max_fps = os.environ.get("PREVIEW_MAX_FPS", "24")
+thumbnail_width = int(os.environ.get("THUMBNAIL_WIDTH", "480"))
+thumbnail_at_seconds = float(os.environ.get("THUMBNAIL_AT_SECONDS", "2"))
+rendition_max_workers = int(os.environ.get("RENDITION_MAX_WORKERS", "2"))
+# How long the set of existing renditions is trusted before the preview folder is listed again
+rendition_listing_ttl = float(os.environ.get("RENDITION_LISTING_TTL_SECONDS", "60"))
+# Renditions are immutable per filename until the video is deleted
+rendition_cache_control = os.environ.get("RENDITION_CACHE_CONTROL", "private, max-age=86400")
+
+THUMBNAIL_SUFFIX = ".jpg"
+PREVIEW_SUFFIX = ".preview.mp4"
+
+# Transcoding runs off the request path
+_executor = ThreadPoolExecutor(max_workers=rendition_max_workers, thread_name_prefix="rendition")
+_available_lock = threading.Lock()
+_available = set()
+_available_listed_at = 0.0
+
+
+def thumbnail_name(filename):
+    return f"{preview_folder}/{filename}{THUMBNAIL_SUFFIX}"
+
+
+def preview_name(filename):
+    return f"{preview_folder}/{filename}{PREVIEW_SUFFIX}"
+
+
+def _ffmpeg(arguments):
+    subprocess.run([ffmpeg_binary, "-v", "error", "-y", *arguments],
+                   capture_output=True, timeout=ffmpeg_timeout, check=True)
+
+
+def make_thumbnail(source_path, output_path):
+    """A JPEG poster frame, taken a little into the video (first frame is often black)"""
+    scale = f"scale={thumbnail_width}:-2"
+    _ffmpeg(["-ss", f"{thumbnail_at_seconds}", "-i", source_path, "-frames:v", "1", "-vf", scale, "-q:v", "4", output_path])
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        # Shorter than THUMBNAIL_AT_SECONDS
+        _ffmpeg(["-i", source_path, "-frames:v", "1", "-vf", scale, "-q:v", "4", output_path])
+
+
+def make_preview(source_path, output_path):
+    """Small H.264/AAC rendition with the index at the front so playback starts immediately"""
+    _ffmpeg([
+        "-i", source_path,
+        "-vf", f"scale=-2:'min({preview_height},ih)'", "-fpsmax", preview_max_fps,
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+        "-b:v", preview_video_bitrate, "-maxrate", preview_video_bitrate, "-bufsize", "1M",
+        "-c:a", "aac", "-b:a", "64k", "-ac", "1",
+        "-movflags", "+faststart", output_path
+    ])
+
+
+def create_renditions(source_path, filename):
+    """Generate and upload the thumbnail and preview of a local video file"""
+    from controllers.Analyzing_video import get_storage_client
+
+    started = time.monotonic()
+    work_dir = tempfile.mkdtemp(prefix="renditions_")
+    try:
+        bucket = get_storage_client().bucket(bucket_id)
+        outputs = [
+            (make_thumbnail, os.path.join(work_dir, "thumbnail.jpg"), thumbnail_name(filename), "image/jpeg"),
+            (make_preview, os.path.join(work_dir, "preview.mp4"), preview_name(filename), "video/mp4"),
+        ]
+        for make, output_path, blob_name, content_type in outputs:
+            make(source_path, output_path)
+            blob = bucket.blob(blob_name)
+            blob.cache_control = rendition_cache_control
+            blob.upload_from_filename(output_path, content_type=content_type)
+            with _available_lock:
+                _available.add(blob_name)
+        logger.info(f"Renditions of {filename} ready in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        # The dashboard falls back to the original video
+        logger.warning(f"Could not create renditions for {filename}: {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _create_and_remove(source_path, filename):
+    try:
+        create_renditions(source_path, filename)
+    finally:
+        os.unlink(source_path)
+
+
+def schedule_for_upload(file, filename):
+    """Copy an uploaded file aside and create its renditions in the background"""
+    if not renditions_enabled or shutil.which(ffmpeg_binary) is None:
+        return
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
+            # Earlier readers (the GCS upload, fingerprinting) may have left the file anywhere
+            file.file.seek(0)
+            shutil.copyfileobj(file.file, temp_file, length=1024 * 1024)
+        file.file.seek(0)
+        _executor.submit(_create_and_remove, temp_file.name, filename)
+    except Exception as e:
+        logger.warning(f"Could not schedule renditions for {filename}: {e}")
+
+
+def schedule_for_path(source_path, filename):
+    """Create renditions from a local file the caller will delete; the file is copied first"""
+    if not renditions_enabled or shutil.which(ffmpeg_binary) is None:
+        return
+    try:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, temp_file, length=1024 * 1024)
+        _executor.submit(_create_and_remove, temp_file.name, filename)
+    except Exception as e:
+        logger.warning(f"Could not schedule renditions for {filename}: {e}")
+
+
+def is_rendition(blob_name):
+    return blob_name.startswith(f"{preview_folder}/")
+
+
+def existing_names(filename, available):
+    """Object names of the renditions of a video that exist"""
+    return [name for name in (thumbnail_name(filename), preview_name(filename)) if name in available]
+
+
+def urls_for(filename, available, playback_urls):
+    """thumbnail_url and preview_url of a video (None for renditions that do not exist)"""
+    thumbnail, preview = thumbnail_name(filename), preview_name(filename)
+    return {
+        "thumbnail_url": playback_urls.get(thumbnail) if thumbnail in available else None,
+        "preview_url": playback_urls.get(preview) if preview in available else None,
+    }
+
+
+def available_renditions():
+    """Names of existing rendition objects, from a preview-folder listing at most RENDITION_LISTING_TTL old.
+    The returned set is shared; callers only test membership."""
+    global _available, _available_listed_at
+    if not renditions_enabled:
+        return set()
+    with _available_lock:
+        if time.monotonic() - _available_listed_at < rendition_listing_ttl:
+            return _available
+    from controllers.Analyzing_video import get_storage_client
+
+    try:
+        names = {blob.name for blob in get_storage_client().bucket(bucket_id).list_blobs(prefix=f"{preview_folder}/")}
+    except Exception as e:
+        logger.warning(f"Could not list renditions: {e}")
+        return _available
+    with _available_lock:
+        _available = names
+        _available_listed_at = time.monotonic()
+        return names
+
+
+def delete_renditions(filename):
+    if not renditions_enabled:
+        return
+    from controllers.Analyzing_video import get_storage_client
+
+    bucket = get_storage_client().bucket(bucket_id)
+    for blob_name in (thumbnail_name(filename), preview_name(filename)):
+        try:
+            bucket.blob(blob_name).delete()
+        except Exception:
+            # Most older videos have no renditions
+            pass
+        with _available_lock:
+            _available.discard(blob_name)
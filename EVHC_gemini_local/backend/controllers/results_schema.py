@@ -0,0 +1,121 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
+
+from controllers.results_table import RESULT_COLUMNS, ADDED_COLUMNS, COLUMN_TYPES, TYPED_COLUMNS, typed_row
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+# Daily partitions on the analysis time; rows are looked up by filename and filtered by dealership
+PARTITION_COLUMN = "analyzed_at"
+CLUSTERING_COLUMNS = ["filename", "dealership"]
+# Opt-in: listings, the mirror and the change feed only scan partitions of the last RESULTS_LOOKBACK_DAYS
+# days, plus rows with no analysis time yet (filename lookups fall back to the full history); 0 reads the
+# full history
+results_lookback_days = float(os.environ.get("RESULTS_LOOKBACK_DAYS", "0"))
+
+_table_lock = threading.Lock()
+_table_ready = False
+_typed_storage = True
+
+
+def table_schema():
+    return [bigquery.SchemaField(column, COLUMN_TYPES[column]) for column in RESULT_COLUMNS]
+
+
+def apply_layout(table):
+    """Set the partitioning and clustering of the results table on a Table object"""
+    table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY, field=PARTITION_COLUMN
+    )
+    table.clustering_fields = CLUSTERING_COLUMNS
+    return table
+
+
+def has_layout(table):
+    partitioning = table.time_partitioning
+    return (
+        partitioning is not None and partitioning.field == PARTITION_COLUMN
+        and list(table.clustering_fields or []) == CLUSTERING_COLUMNS
+    )
+
+
+def has_typed_columns(table):
+    """Whether criterion, point and percentage columns are stored typed rather than as strings"""
+    types = {field.name: field.field_type for field in table.schema}
+    return all(types.get(column) != "STRING" for column in TYPED_COLUMNS)
+
+
+def typed_storage():
+    """Whether the results table (as of ensure_results_table) stores typed values"""
+    return _typed_storage
+
+
+def read_row(row):
+    """A row read from the results table as a dict with typed verdicts, points and percentages;
+    only a table not yet migrated (as of ensure_results_table) needs its values converted"""
+    return dict(row) if _typed_storage else typed_row(dict(row))
+
+
+def invalidate_results_table():
+    """Re-read the table on the next write, e.g. after a failed insert, as it may have been migrated"""
+    global _table_ready
+    _table_ready = False
+
+
+def ensure_results_table(bigquery_client):
+    """Create the partitioned, clustered results table, or add columns it is missing (once per process)"""
+    global _table_ready, _typed_storage
+    if _table_ready:
+        return
+    with _table_lock:
+        if _table_ready:
+            return
+        full_table_id = f"{project_id}.{table_id}"
+        try:
+            table = bigquery_client.get_table(full_table_id)
+        except NotFound:
+            bigquery_client.create_table(apply_layout(bigquery.Table(full_table_id, schema=table_schema())), exists_ok=True)
+            logger.info(f"Created results table {full_table_id} partitioned by {PARTITION_COLUMN}")
+            _typed_storage = True
+            _table_ready = True
+            return
+
+        existing = {field.name for field in table.schema}
+        for column, column_type in ADDED_COLUMNS.items():
+            if column not in existing:
+                bigquery_client.query(
+                    f"ALTER TABLE `{full_table_id}` ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                ).result()
+        if not has_layout(table):
+            # Partitioning cannot be changed in place; the table has to be copied (migrate_results_table.py)
+            logger.warning(
+                f"Results table {full_table_id} is not partitioned by {PARTITION_COLUMN} and clustered by "
+                f"{', '.join(CLUSTERING_COLUMNS)}; run migrate_results_table.py to stop full-table scans"
+            )
+        _typed_storage = has_typed_columns(table)
+        if not _typed_storage:
+            logger.warning(
+                f"Results table {full_table_id} stores scores and verdicts as strings; "
+                f"run migrate_results_types.py to convert them to typed columns"
+            )
+        _table_ready = True
+
+
+def lookback_filter(alias=""):
+    """SQL condition and query parameters restricting a read to the partitions in the lookback window;
+    rows written before analyzed_at existed (NULL until migrate_results_table.py) are always read"""
+    if not results_lookback_days:
+        return "TRUE", []
+    since = datetime.now(timezone.utc) - timedelta(days=results_lookback_days)
+    return (
+        f"({alias}{PARTITION_COLUMN} >= @analyzed_since OR {alias}{PARTITION_COLUMN} IS NULL)",
+        [bigquery.ScalarQueryParameter("analyzed_since", "TIMESTAMP", since)],
+    )
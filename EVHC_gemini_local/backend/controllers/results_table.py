@@ -0,0 +1,145 @@
+import os
+import re
+import json
+from datetime import datetime
+
+from controllers.scoring import normalize_verdict
+
+# Dealership names are not a column of their own; they are read from the video filename.
+# The first capture group of this pattern is used (default: text before the first underscore).
+dealership_filename_pattern = re.compile(os.environ.get("DEALERSHIP_FILENAME_PATTERN", r"^([^_]+)_"))
+
+# Columns of the BigQuery results table, in the order insert_into_bigquery writes them
+RESULT_COLUMNS = [
+    "filename", "car_type", "service_related_video", "sound_and_image", "show_license_plate",
+    "car_on_ramp", "service_advisor_or_technician_name", "DealershipName",
+    "special_tools_tyres", "customer_name", "special_tools_brake_pad",
+    "Special_tools_disc", "attached_offer_mentioned", "correct_ending",
+    "show_license_plate_eval", "car_on_ramp_eval", "service_advisor_or_technician_name_eval",
+    "DealershipName_eval", "customer_name_eval", "special_tools_tyres_eval",
+    "special_tools_brake_pad_eval", "Special_tools_disc_eval",
+    "attached_offer_mentioned_eval", "approve_offer_mentioned_eval", "correct_ending_eval",
+    "total_points_eval", "percentage", "battery_checked_eval", "wind_screen_checked_eval",
+    "summary", "video_url", "media_metadata", "raw_model_output", "verdicts", "scoring_version",
+    "near_duplicate_of", "result_id", "analyzed_at", "dealership", "inserted_at",
+    "prompt_tokens", "video_tokens", "audio_tokens", "cached_tokens", "output_tokens",
+    "model_calls", "model_latency_seconds", "model_name", "updated_at",
+]
+
+# Large columns left out of listings (dashboard, mirror sync, change feed) so they are neither scanned
+# nor sent; single-record reads and exports still return them, reading BigQuery for mirrored rows
+DETAIL_COLUMNS = ["raw_model_output"]
+LISTING_COLUMNS = [column for column in RESULT_COLUMNS if column not in DETAIL_COLUMNS]
+
+# Columns added after the table was created; insert_into_bigquery adds any that are missing
+ADDED_COLUMNS = {
+    "media_metadata": "STRING",
+    "raw_model_output": "STRING",
+    "verdicts": "STRING",
+    "scoring_version": "STRING",
+    "near_duplicate_of": "STRING",
+    "result_id": "STRING",
+    # Partitioning and clustering columns of the table layout (results_schema)
+    "analyzed_at": "TIMESTAMP",
+    "dealership": "STRING",
+    # When the row was written (a replayed row gets its replay time); drives the change feed
+    "inserted_at": "TIMESTAMP",
+    # Model usage behind the result, summed over segments (model_usage)
+    "prompt_tokens": "INT64",
+    "video_tokens": "INT64",
+    "audio_tokens": "INT64",
+    "cached_tokens": "INT64",
+    "output_tokens": "INT64",
+    "model_calls": "INT64",
+    "model_latency_seconds": "FLOAT64",
+    "model_name": "STRING",
+    # When a stored row was last changed in place (re-scoring, migrations); also drives the change feed
+    "updated_at": "TIMESTAMP",
+}
+# Added columns that were numeric from the start; rows carry them as numbers, not strings
+NUMERIC_COLUMNS = [column for column, column_type in ADDED_COLUMNS.items() if column_type in ("INT64", "FLOAT64")]
+
+# Typed storage (migrate_results_types.py): criterion verdicts as BOOL (NULL for N/A, or for every
+# criterion of an unscored video), points as INT64 and percentages as FLOAT64 (100.0 for "100%").
+# Exact verdicts, N/A included, are kept in the verdicts column for re-scoring.
+VERDICT_COLUMNS = [
+    "service_related_video", "sound_and_image", "show_license_plate", "car_on_ramp",
+    "service_advisor_or_technician_name", "DealershipName", "special_tools_tyres", "customer_name",
+    "special_tools_brake_pad", "Special_tools_disc", "attached_offer_mentioned", "correct_ending",
+]
+PERCENTAGE_COLUMNS = ["percentage", "battery_checked_eval", "wind_screen_checked_eval"]
+POINT_COLUMNS = [column for column in RESULT_COLUMNS if column.endswith("_eval") and column not in PERCENTAGE_COLUMNS]
+TYPED_COLUMNS = {
+    **{column: "BOOL" for column in VERDICT_COLUMNS},
+    **{column: "INT64" for column in POINT_COLUMNS},
+    **{column: "FLOAT64" for column in PERCENTAGE_COLUMNS},
+}
+
+# Column types of a table created before typed storage, and of a new (typed) table
+LEGACY_COLUMN_TYPES = {column: ADDED_COLUMNS.get(column, "STRING") for column in RESULT_COLUMNS}
+COLUMN_TYPES = {column: TYPED_COLUMNS.get(column, LEGACY_COLUMN_TYPES[column]) for column in RESULT_COLUMNS}
+
+
+def listing_row(row):
+    """A row without the detail-only columns"""
+    return {column: value for column, value in row.items() if column not in DETAIL_COLUMNS}
+
+
+def to_table_row(result, typed=True):
+    """Shape an analysis result like the row BigQuery stores for it: verdicts, points and percentages
+    typed (strings with typed=False, for a table not yet migrated), usage as numbers, the rest as strings"""
+    row = {}
+    for column in RESULT_COLUMNS:
+        value = result.get(column, "")
+        if column in NUMERIC_COLUMNS:
+            row[column] = value if isinstance(value, (int, float)) else None
+        elif isinstance(value, (dict, list)):
+            row[column] = json.dumps(value, sort_keys=True)
+        elif column in PERCENTAGE_COLUMNS and isinstance(value, (int, float)):
+            # A typed value carried over from a stored result (a reused near-duplicate)
+            row[column] = f"{value:g}%"
+        else:
+            row[column] = None if value is None else str(value)
+    if typed:
+        for column in TYPED_COLUMNS:
+            row[column] = storage_value(column, row[column])
+    return row
+
+
+def storage_value(column, value):
+    """Typed value of a result field for a typed column; other columns are returned unchanged"""
+    column_type = TYPED_COLUMNS.get(column)
+    if column_type is None:
+        return value
+    if column_type == "BOOL":
+        return {"Y": True, "N": False}.get(normalize_verdict(value))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value) if column_type == "INT64" else float(value)
+    text = str(value if value is not None else "").strip().rstrip("%").strip()
+    try:
+        return int(float(text)) if column_type == "INT64" else float(text)
+    except ValueError:
+        return None
+
+
+def storage_row(result, typed=True):
+    """Column values of the row BigQuery stores for an analysis result"""
+    row = to_table_row(result, typed)
+    for column in ("analyzed_at", "inserted_at", "updated_at"):
+        row[column] = datetime.fromisoformat(row[column]) if row.get(column) else None
+    return row
+
+
+def typed_row(row):
+    """A stored row with typed verdicts, points and percentages, also when read from a table (or mirror)
+    that still stores them as strings; exact verdicts, N/A included, are in the verdicts column"""
+    return {
+        column: storage_value(column, value) if column in TYPED_COLUMNS else value
+        for column, value in row.items()
+    }
+
+
+def dealership_from_filename(filename):
+    """Extract the dealership part of a video filename, or None if it has none"""
+    match = dealership_filename_pattern.search(filename or "")
+    return match.group(1) if match else None
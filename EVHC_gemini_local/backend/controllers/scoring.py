@@ -0,0 +1,111 @@
+import os
+import json
+
+# Rule table used for new results and for re-scoring; older versions stay so past scores can be reproduced
+scoring_version = os.environ.get("SCORING_VERSION", "v1")
+
+# Y/N/N/A verdicts the model returns; scores are derived from these only
+VERDICT_FIELDS = [
+    "service_related_video", "sound_and_image", "show_license_plate", "car_on_ramp",
+    "service_advisor_or_technician_name", "DealershipName", "customer_name",
+    "special_tools_tyres", "special_tools_brake_pad", "Special_tools_disc",
+    "attached_offer_mentioned", "approve_offer_mentioned", "correct_ending",
+]
+
+SCORING_RULES = {
+    # The rules the analysis prompt describes
+    "v1": {
+        "criteria": [
+            # verdict field, points for 'Y', points for 'N/A'
+            ("show_license_plate", 0, 0),
+            ("car_on_ramp", 5, 5),
+            ("special_tools_tyres", 20, 20),
+            ("special_tools_brake_pad", 20, 20),
+            ("Special_tools_disc", 20, 20),
+            ("attached_offer_mentioned", 10, 0),
+            ("approve_offer_mentioned", 10, 0),
+            ("correct_ending", 5, 0),
+        ],
+        # Names are worth 10 points each on their own line, but add 10 to the total only when 2 of 3 are present
+        "names": {
+            "fields": ["service_advisor_or_technician_name", "DealershipName", "customer_name"],
+            "points_each": 10,
+            "min_present": 2,
+            "group_points": 10,
+        },
+        "max_points": 100,
+    },
+}
+
+
+def normalize_verdict(value):
+    # Typed rows store Y and N as booleans
+    if isinstance(value, bool):
+        return "Y" if value else "N"
+    verdict = str(value or "").strip().upper()
+    if verdict in ("Y", "YES"):
+        return "Y"
+    if verdict in ("N", "NO"):
+        return "N"
+    if verdict in ("N/A", "NA"):
+        return "N/A"
+    return ""
+
+
+def extract_verdicts(result):
+    """The normalized criterion verdicts of an analysis result"""
+    return {field: normalize_verdict(result.get(field)) for field in VERDICT_FIELDS}
+
+
+def verdicts_from_row(row):
+    """Verdicts of a stored results row, including rows written before verdicts were persisted"""
+    stored = row.get("verdicts")
+    if stored:
+        return json.loads(stored) if isinstance(stored, str) else dict(stored)
+    verdicts = extract_verdicts(row)
+    # The table never had an approve_offer_mentioned column; its points tell the verdict
+    if not verdicts["approve_offer_mentioned"] and str(row.get("approve_offer_mentioned_eval") or "").strip():
+        verdicts["approve_offer_mentioned"] = "N" if str(row["approve_offer_mentioned_eval"]).strip() == "0" else "Y"
+    return verdicts
+
+
+def score_verdicts(verdicts, version=None):
+    """Point fields, total and percentage for a set of verdicts under a versioned rule table"""
+    version = version or scoring_version
+    rules = SCORING_RULES[version]
+    names = rules["names"]
+    scored_fields = [field for field, _, _ in rules["criteria"]] + names["fields"]
+
+    scores = {"scoring_version": version}
+    # A video that failed the prompt's preliminary conditions has no verdicts and is not scored
+    if not any(verdicts.get(field) for field in scored_fields):
+        for field in scored_fields:
+            scores[f"{field}_eval"] = ""
+        scores["total_points_eval"] = ""
+        scores["percentage"] = ""
+        return scores
+
+    total = 0
+    for field, points, na_points in rules["criteria"]:
+        verdict = verdicts.get(field, "")
+        value = points if verdict == "Y" else (na_points if verdict == "N/A" else 0)
+        scores[f"{field}_eval"] = str(value)
+        total += value
+
+    present = 0
+    for field in names["fields"]:
+        is_present = verdicts.get(field) == "Y"
+        present += is_present
+        scores[f"{field}_eval"] = str(names["points_each"] if is_present else 0)
+    if present >= names["min_present"]:
+        total += names["group_points"]
+
+    scores["total_points_eval"] = str(total)
+    scores["percentage"] = f"{round(total * 100 / rules['max_points'])}%"
+    return scores
+
+
+def score_result(result, version=None):
+    """Verdicts and scores for an analysis result, as fields to merge into it"""
+    verdicts = extract_verdicts(result)
+    return {"verdicts": verdicts, **score_verdicts(verdicts, version)}
@@ -0,0 +1,265 @@
+import os
+import re
+import html
+import json
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite FTS5 inverted index over the free-text fields of every analysis
+search_index_path = os.environ.get("SEARCH_INDEX_PATH", "search_index.sqlite3")
+max_page_size = int(os.environ.get("SEARCH_MAX_PAGE_SIZE", "100"))
+# Rows written by other instances and the job worker are picked up this often
+search_sync_interval_seconds = float(os.environ.get("SEARCH_INDEX_SYNC_SECONDS", "300"))
+sync_page_size = int(os.environ.get("SEARCH_INDEX_SYNC_PAGE_SIZE", "1000"))
+
+# Transcripts are produced in English (see the analysis prompt), so the Porter stemmer applies
+# to all indexed text; unicode61 folds case and diacritics for names and non-English words.
+SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+        filename UNINDEXED,
+        summary,
+        transcript,
+        comments,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    );
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+# bm25 column weights: filename (unindexed), summary, transcript, comments
+RANK_WEIGHTS = (0.0, 3.0, 1.0, 0.5)
+# Private-use characters delimit matches in snippets until the text around them is escaped
+MATCH_START, MATCH_END = "\ue000", "\ue001"
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+@contextmanager
+def _connect():
+    global _schema_ready
+    connection = sqlite3.connect(search_index_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        if not _schema_ready:
+            with _schema_lock:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                _schema_ready = True
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def index_result(result):
+    """Index (or re-index) the text fields of one analysis result"""
+    filename = result.get("filename")
+    if not filename:
+        return
+    try:
+        with _connect() as connection:
+            connection.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            connection.execute(
+                "INSERT INTO documents (filename, summary, transcript, comments) VALUES (?, ?, ?, ?)",
+                (filename, result.get("summary") or "", result.get("transcript") or "", result.get("comments") or "")
+            )
+    except Exception as e:
+        # Search is secondary; never fail an analysis because of the index
+        logger.error(f"Error indexing '{filename}' for search: {e}")
+
+
+def remove_result(filename):
+    try:
+        with _connect() as connection:
+            connection.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+    except Exception as e:
+        logger.error(f"Error removing '{filename}' from search index: {e}")
+
+
+def model_text(raw_model_output):
+    """(transcript, comments) of a stored raw model response, or of the JSON list of segment responses
+    stored for a segmented video; the results table keeps them only there"""
+    transcripts, comments = [], []
+
+    def collect(raw):
+        try:
+            # Same clean-up as video_model.clean_json_data, without its per-call logging
+            parsed = json.loads(raw.replace("```json", "").replace("```", "").replace("\n", " ").strip())
+        except (AttributeError, ValueError):
+            return
+        for item in parsed if isinstance(parsed, list) else [parsed]:
+            if isinstance(item, str):
+                collect(item)
+            elif isinstance(item, dict):
+                transcripts.append(str(item.get("transcript") or "").strip())
+                comments.append(str(item.get("comments") or "").strip())
+
+    collect(raw_model_output or "")
+    return "\n".join(text for text in transcripts if text), " ".join(dict.fromkeys(text for text in comments if text))
+
+
+def _document(record):
+    transcript, comments = record.get("transcript"), record.get("comments")
+    if transcript is None and comments is None:
+        transcript, comments = model_text(record.get("raw_model_output"))
+    return (record.get("filename"), record.get("summary") or "", transcript or "", comments or "")
+
+
+def backfill(records, replace=False):
+    """Index records not in the index yet, or (replace=True) re-index every record given; the last
+    record of a filename wins"""
+    documents = {}
+    for record in records:
+        if record.get("filename"):
+            documents[record["filename"]] = _document(record)
+    with _connect() as connection:
+        if replace:
+            connection.executemany("DELETE FROM documents WHERE filename = ?", [(filename,) for filename in documents])
+        else:
+            indexed = {row["filename"] for row in connection.execute("SELECT filename FROM documents")}
+            documents = {filename: document for filename, document in documents.items() if filename not in indexed}
+        connection.executemany(
+            "INSERT INTO documents (filename, summary, transcript, comments) VALUES (?, ?, ?, ?)",
+            list(documents.values())
+        )
+    return len(documents)
+
+
+def _get_state(key):
+    with _connect() as connection:
+        row = connection.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def _set_state(key, value):
+    with _connect() as connection:
+        connection.execute(
+            "INSERT INTO sync_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+
+def sync_from_bigquery():
+    """Index the full history on a fresh disk, then rows inserted or updated since the last sync (by any
+    instance or the job worker), and drop files deleted since then"""
+    from google.cloud import bigquery
+    from controllers.data_from_bigquery import bigquery_client
+    from controllers.results_schema import ensure_results_table
+    from controllers.change_feed import ensure_deletions_table, DELETIONS_TABLE_ID, change_feed_overlap
+
+    project_id, table_id = os.environ.get("PROJECT_ID"), os.environ.get("BIGQUERY_TABLE_ID")
+    ensure_results_table(bigquery_client)
+    ensure_deletions_table(bigquery_client)
+    last_sync = _get_state("last_sync")
+    # Writes stamped before this moment but committed after it are picked up by the next sync
+    next_sync = datetime.now(timezone.utc) - timedelta(seconds=change_feed_overlap)
+    parameters = []
+    condition = "TRUE"
+    if last_sync is not None:
+        since = datetime.fromisoformat(last_sync)
+        parameters = [bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)]
+        condition = "(inserted_at > @since OR updated_at > @since)"
+        deleted = bigquery_client.query(
+            f"SELECT DISTINCT filename FROM `{project_id}.{DELETIONS_TABLE_ID}` WHERE deleted_at > @since",
+            job_config=bigquery.QueryJobConfig(query_parameters=parameters),
+        ).result()
+        for row in deleted:
+            remove_result(row["filename"])
+
+    # Full history, not the dashboard's lookback window; the raw model response is only read where it is
+    # the sole source of the transcript and comments
+    query = f"""
+        SELECT filename, summary, raw_model_output FROM `{project_id}.{table_id}`
+        WHERE {condition}
+        ORDER BY COALESCE(updated_at, inserted_at, analyzed_at)
+    """
+    results = bigquery_client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=parameters)).result(
+        page_size=sync_page_size
+    )
+    indexed = sum(backfill([dict(row) for row in page], replace=True) for page in results.pages)
+    _set_state("last_sync", next_sync.isoformat())
+    logger.info(f"Search index synced {indexed} documents")
+
+
+def run_periodic_sync(stop_event: threading.Event):
+    """Sync on startup and then every SEARCH_INDEX_SYNC_SECONDS until stopped; offline, index the local
+    mirror once (every write goes through this instance)"""
+    from controllers import local_mirror
+
+    if local_mirror.offline_mode:
+        try:
+            logger.info(f"Search index back-filled with {backfill(local_mirror.get_all_records())} documents")
+        except Exception as e:
+            logger.error(f"Search index back-fill failed: {e}")
+        return
+    while not stop_event.is_set():
+        try:
+            sync_from_bigquery()
+        except Exception as e:
+            logger.error(f"Search index sync failed: {e}")
+        stop_event.wait(search_sync_interval_seconds)
+
+
+def _match_expression(query, match_all):
+    # Quote every term so user input can never be parsed as FTS5 syntax
+    terms = re.findall(r"\w+", query or "", flags=re.UNICODE)
+    if not terms:
+        return None
+    return (" AND " if match_all else " OR ").join(f'"{term}"' for term in terms)
+
+
+def _snippet_html(snippet):
+    """Escape indexed text (transcripts and comments are user content) and only then add the <mark> tags"""
+    return html.escape(snippet or "").replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+
+def search(query, page=1, page_size=20, match_all=True):
+    """Ranked, paginated full-text search over summaries, transcripts and comments"""
+    expression = _match_expression(query, match_all)
+    if expression is None:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), max_page_size)
+
+    try:
+        with _connect() as connection:
+            total = connection.execute(
+                "SELECT COUNT(*) FROM documents WHERE documents MATCH ?", (expression,)
+            ).fetchone()[0]
+            rows = connection.execute(
+                f"""
+                SELECT filename,
+                       bm25(documents, {", ".join(str(weight) for weight in RANK_WEIGHTS)}) AS score,
+                       snippet(documents, -1, ?, ?, '…', 16) AS snippet
+                FROM documents
+                WHERE documents MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+                """,
+                (MATCH_START, MATCH_END, expression, page_size, (page - 1) * page_size)
+            ).fetchall()
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "query": query,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        # bm25 scores are negative with the best match lowest; expose them as positive relevance
+        "results": [
+            {"filename": row["filename"], "score": round(-row["score"], 4), "snippet": _snippet_html(row["snippet"])}
+            for row in rows
+        ]
+    }
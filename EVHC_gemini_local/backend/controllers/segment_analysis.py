@@ -0,0 +1,228 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import tempfile
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from controllers.scoring import score_result
+from controllers import model_usage, signed_urls
+from controllers.video_model import generate_content_from_url
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+bucket_id = os.environ.get("BUCKET_ID")
+bucket_folder = os.environ.get("BUCKET_FOLDER")
+
+segment_analysis_enabled = os.environ.get("SEGMENT_ANALYSIS_ENABLED", "false").lower() == "true"
+# Only videos longer than this are split
+segment_min_duration = float(os.environ.get("SEGMENT_MIN_DURATION_SECONDS", "300"))
+segment_length = float(os.environ.get("SEGMENT_LENGTH_SECONDS", "120"))
+segment_overlap = float(os.environ.get("SEGMENT_OVERLAP_SECONDS", "10"))
+segment_max_workers = int(os.environ.get("SEGMENT_MAX_WORKERS", "4"))
+# Kept outside BUCKET_FOLDER so segments never show up in the file listing
+segment_folder = os.environ.get("SEGMENT_FOLDER", f"{bucket_folder}_segments")
+ffmpeg_binary = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+ffprobe_binary = os.environ.get("FFPROBE_BINARY", "ffprobe")
+ffmpeg_timeout = float(os.environ.get("FFMPEG_TIMEOUT_SECONDS", "300"))
+
+# Y/N criteria where any segment showing the behaviour is enough
+ANY_SEGMENT_CRITERIA = [
+    "service_related_video", "sound_and_image", "show_license_plate",
+    "service_advisor_or_technician_name", "DealershipName", "customer_name",
+    "attached_offer_mentioned", "approve_offer_mentioned",
+]
+# Criteria that are 'N/A' for diagnostic videos unless a segment explicitly shows them
+DIAGNOSTIC_NA_CRITERIA = ["special_tools_tyres", "special_tools_brake_pad", "Special_tools_disc", "car_on_ramp"]
+PERCENT_FIELDS = ["battery_checked_eval", "wind_screen_checked_eval"]
+
+
+def _run(command):
+    return subprocess.run(command, capture_output=True, text=True, timeout=ffmpeg_timeout, check=True).stdout
+
+
+def probe_duration(path):
+    output = _run([ffprobe_binary, "-v", "error", "-show_entries", "format=duration", "-of", "json", path])
+    return float(json.loads(output)["format"]["duration"])
+
+
+def remote_duration(blob_name):
+    """Duration probed through a signed URL (ffprobe reads only the headers); None if it cannot be signed or read"""
+    url = signed_urls.playback_url(blob_name)
+    if not url or "X-Goog-Signature" not in url:
+        return None
+    try:
+        return probe_duration(url)
+    except (subprocess.SubprocessError, OSError, ValueError, KeyError) as e:
+        logger.warning(f"Could not probe {blob_name} remotely: {e}")
+        return None
+
+
+def probe_keyframes(path):
+    """Timestamps of the video keyframes (only keyframes are decoded)"""
+    output = _run([
+        ffprobe_binary, "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time", "-of", "csv=p=0", path
+    ])
+    keyframes = []
+    for line in output.splitlines():
+        try:
+            keyframes.append(float(line.strip().strip(",")))
+        except ValueError:
+            continue
+    return sorted(keyframes) or [0.0]
+
+
+def plan_segments(duration, keyframes):
+    """Overlapping (start, end) windows whose starts are snapped back to keyframes"""
+    step = max(segment_length - segment_overlap, 1.0)
+    segments = []
+    nominal_start = 0.0
+    while nominal_start < duration:
+        start = max([k for k in keyframes if k <= nominal_start] or [0.0])
+        end = min(nominal_start + segment_length, duration)
+        if segments and start <= segments[-1][0]:
+            # Sparse keyframes: never emit the same window twice
+            start = segments[-1][0]
+            segments[-1] = (start, end)
+        else:
+            segments.append((start, end))
+        if end >= duration:
+            break
+        nominal_start += step
+    return segments
+
+
+def cut_segment(source_path, start, end, output_path):
+    # Stream copy: no re-encode, cuts land on the keyframes chosen in plan_segments
+    _run([
+        ffmpeg_binary, "-v", "error", "-y", "-ss", f"{start:.3f}", "-i", source_path,
+        "-t", f"{end - start:.3f}", "-c", "copy", "-avoid_negative_ts", "make_zero",
+        "-movflags", "+faststart", output_path
+    ])
+
+
+def _verdict(value):
+    return (value or "").strip().upper()
+
+
+def _percent(value):
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except ValueError:
+        return None
+
+
+def merge_segment_results(segment_results):
+    """Merge per-segment verdicts into one result, deterministically and in segment order"""
+    results = [result[0] if isinstance(result, list) else result for result in segment_results]
+    merged = dict(results[0])
+
+    # A Ford car found in any segment wins over 'Non <car>' from segments that missed it
+    car_types = [r.get("car_type", "") for r in results if r.get("car_type") and not r["car_type"].startswith("Non")]
+    if car_types:
+        counts = Counter(car_types)
+        merged["car_type"] = max(car_types, key=lambda t: (counts[t], -car_types.index(t)))
+
+    # The prompt gives 'diagnostic' precedence when both classifications apply
+    classifications = [(r.get("diagnostic_or_not") or "").strip().lower() for r in results]
+    merged["diagnostic_or_not"] = "diagnostic" if "diagnostic" in classifications else results[0].get("diagnostic_or_not", "")
+    is_diagnostic = merged["diagnostic_or_not"] == "diagnostic"
+
+    for field in ANY_SEGMENT_CRITERIA:
+        verdicts = [_verdict(r.get(field)) for r in results]
+        merged[field] = "Y" if "Y" in verdicts else ("N" if "N" in verdicts else results[0].get(field, ""))
+
+    for field in DIAGNOSTIC_NA_CRITERIA:
+        verdicts = [_verdict(r.get(field)) for r in results]
+        if "Y" in verdicts:
+            merged[field] = "Y"
+        elif is_diagnostic:
+            merged[field] = "N/A"
+        else:
+            merged[field] = "N" if "N" in verdicts else results[0].get(field, "")
+
+    # Only the final segment can show how the video ends
+    merged["correct_ending"] = results[-1].get("correct_ending", "")
+
+    for field in PERCENT_FIELDS:
+        values = [_percent(r.get(field)) for r in results]
+        values = [v for v in values if v is not None]
+        merged[field] = f"{max(values):g}%" if values else ""
+
+    merged["summary"] = " ".join(r.get("summary", "").strip() for r in results if r.get("summary", "").strip())
+    merged["transcript"] = "\n".join(r.get("transcript", "").strip() for r in results if r.get("transcript", "").strip())
+    merged["comments"] = " ".join(dict.fromkeys(r.get("comments", "").strip() for r in results if r.get("comments", "").strip()))
+    # Every segment's raw response is kept so the merge can be redone offline
+    merged["raw_model_output"] = json.dumps([r.get("raw_model_output", "") for r in results])
+    # The result's usage is what all segment calls consumed together
+    merged.update(model_usage.combine(results))
+
+    merged.update(score_result(merged))
+    return [merged]
+
+
+def analyze_in_segments(url, system_instructions, storage_client, media_metadata=None):
+    """Analyze a long gs:// video as concurrent overlapping segments; None if it should not be split"""
+    if not segment_analysis_enabled or not url.startswith("gs://"):
+        return None
+
+    blob_name = url[len(f"gs://{bucket_id}/"):]
+    file_name = url.split("/")[-1]
+    # Known from the upload probe, or read remotely; the video is only downloaded to be cut
+    duration = (media_metadata or {}).get("duration_seconds") or remote_duration(blob_name)
+    if duration is not None and duration <= segment_min_duration:
+        logger.info(f"Video is {duration:.0f}s long - analyzing in a single request")
+        return None
+
+    work_dir = tempfile.mkdtemp(prefix="segments_")
+    bucket = storage_client.bucket(bucket_id)
+    uploaded = []
+    try:
+        source_path = os.path.join(work_dir, file_name)
+        bucket.blob(blob_name).download_to_filename(source_path)
+
+        if duration is None:
+            duration = probe_duration(source_path)
+            if duration <= segment_min_duration:
+                logger.info(f"Video is {duration:.0f}s long - analyzing in a single request")
+                return None
+
+        segments = plan_segments(duration, probe_keyframes(source_path))
+        logger.info(f"Analyzing {file_name} ({duration:.0f}s) as {len(segments)} segments")
+
+        run_id = uuid.uuid4().hex
+        extension = os.path.splitext(file_name)[1] or ".mp4"
+        segment_urls = []
+        for index, (start, end) in enumerate(segments):
+            segment_path = os.path.join(work_dir, f"segment-{index:03d}{extension}")
+            cut_segment(source_path, start, end, segment_path)
+            segment_blob = bucket.blob(f"{segment_folder}/{run_id}/segment-{index:03d}{extension}")
+            segment_blob.upload_from_filename(segment_path)
+            uploaded.append(segment_blob)
+            segment_urls.append(f"gs://{bucket_id}/{segment_blob.name}")
+
+        with ThreadPoolExecutor(max_workers=segment_max_workers) as executor:
+            # Every segment is judged against the original filename (dealership matching uses it) and
+            # sampled by its own length, not the long video's low-detail tier
+            segment_results = list(executor.map(
+                lambda segment_url, start, end: generate_content_from_url(
+                    segment_url, system_instructions, file_name=file_name,
+                    media_metadata=media_metadata, duration_seconds=end - start, whole_video=False
+                ),
+                segment_urls, *zip(*segments)
+            ))
+
+        return merge_segment_results(segment_results)
+
+    finally:
+        for segment_blob in uploaded:
+            try:
+                segment_blob.delete()
+            except Exception as e:
+                logger.warning(f"Could not delete segment {segment_blob.name}: {e}")
+        shutil.rmtree(work_dir, ignore_errors=True)
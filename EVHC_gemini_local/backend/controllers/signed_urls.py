@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import google.auth.credentials
+import google.auth.transport.requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+bucket_id = os.environ.get("BUCKET_ID")
+
+# "signed": V4 signed URLs (streaming endpoint when signing is impossible), "stream": always the
+# streaming endpoint, "public": the storage.cloud.google.com URLs (cookie authentication)
+playback_url_mode = os.environ.get("PLAYBACK_URL_MODE", "signed").lower()
+# URLs are minted once per epoch and stay valid for the epoch plus the grace period, so a listing
+# whose ETag carries the epoch never hands out an expired URL from a client's cache.
+signed_url_epoch_seconds = int(os.environ.get("SIGNED_URL_EPOCH_SECONDS", "3600"))
+signed_url_grace_seconds = int(os.environ.get("SIGNED_URL_GRACE_SECONDS", "3600"))
+signed_url_cache_size = int(os.environ.get("SIGNED_URL_CACHE_SIZE", "20000"))
+# Signing through the IAM signBlob API is a network call per URL; misses are signed concurrently
+signed_url_max_workers = int(os.environ.get("SIGNED_URL_MAX_WORKERS", "16"))
+# After a signing failure, use the fallback for this long before trying again
+signed_url_retry_after = float(os.environ.get("SIGNED_URL_RETRY_AFTER_SECONDS", "300"))
+STREAM_PATH = "/api/stream/"
+
+
+def current_epoch():
+    """Changes whenever newly minted URLs would differ; include it in ETags of responses carrying URLs"""
+    return int(time.time() // signed_url_epoch_seconds)
+
+
+def public_url(blob_name):
+    return f"https://storage.cloud.google.com/{bucket_id}/{blob_name}"
+
+
+def stream_url(blob_name):
+    return STREAM_PATH + quote(blob_name)
+
+
+class SignedUrlCache:
+    """LRU of signed URLs keyed by (object, epoch)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._signing_disabled_until = 0.0
+        self.stats = {"hits": 0, "signed": 0, "failed": 0}
+
+    def get(self, key):
+        with self._lock:
+            url = self._entries.get(key)
+            if url is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+            return url
+
+    def put(self, key, url):
+        with self._lock:
+            self._entries[key] = url
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.stats["signed"] += 1
+
+    def signing_available(self):
+        return time.monotonic() >= self._signing_disabled_until
+
+    def signing_failed(self, error):
+        with self._lock:
+            self.stats["failed"] += 1
+            self._signing_disabled_until = time.monotonic() + signed_url_retry_after
+        logger.warning(f"Cannot sign URLs, serving the streaming endpoint instead: {error}")
+
+
+signed_url_cache = SignedUrlCache(signed_url_cache_size)
+
+
+def _signing_arguments(storage_client):
+    """Key-file credentials sign locally; others (Cloud Run, GCE) sign through the IAM signBlob API"""
+    credentials = storage_client._credentials
+    if isinstance(credentials, google.auth.credentials.Signing):
+        return {}
+    if not credentials.valid:
+        credentials.refresh(google.auth.transport.requests.Request())
+    return {"service_account_email": credentials.service_account_email, "access_token": credentials.token}
+
+
+def _sign(bucket, blob_name, epoch, signing_arguments):
+    expires_at = (epoch + 1) * signed_url_epoch_seconds + signed_url_grace_seconds
+    return bucket.blob(blob_name).generate_signed_url(
+        version="v4",
+        method="GET",
+        expiration=datetime.fromtimestamp(expires_at, tz=timezone.utc),
+        **signing_arguments
+    )
+
+
+def playback_urls(blob_names):
+    """Map object names to URLs the browser can play directly, minting missing signed URLs in bulk"""
+    blob_names = list(dict.fromkeys(name for name in blob_names if name))
+    if playback_url_mode == "public":
+        return {name: public_url(name) for name in blob_names}
+    if playback_url_mode == "stream" or not signed_url_cache.signing_available():
+        return {name: stream_url(name) for name in blob_names}
+
+    epoch = current_epoch()
+    urls = {}
+    misses = []
+    for name in blob_names:
+        url = signed_url_cache.get((name, epoch))
+        if url is None:
+            misses.append(name)
+        else:
+            urls[name] = url
+    if not misses:
+        return urls
+
+    from controllers.Analyzing_video import get_storage_client
+
+    try:
+        storage_client = get_storage_client()
+        bucket = storage_client.bucket(bucket_id)
+        signing_arguments = _signing_arguments(storage_client)
+        if signing_arguments:
+            # Remote signing: one request per URL, so overlap them
+            with ThreadPoolExecutor(max_workers=min(signed_url_max_workers, len(misses))) as executor:
+                signed = list(executor.map(lambda name: _sign(bucket, name, epoch, signing_arguments), misses))
+        else:
+            signed = [_sign(bucket, name, epoch, signing_arguments) for name in misses]
+    except Exception as e:
+        signed_url_cache.signing_failed(e)
+        urls.update({name: stream_url(name) for name in misses})
+        return urls
+
+    for name, url in zip(misses, signed):
+        signed_url_cache.put((name, epoch), url)
+        urls[name] = url
+    return urls
+
+
+def playback_url(blob_name):
+    return playback_urls([blob_name]).get(blob_name)
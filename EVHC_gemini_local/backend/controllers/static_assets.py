@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sys
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from controllers.http_responses import accepted_encodings, etag_matches, parse_byte_range
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip variants are always produced
+    brotli = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIST_DIR = os.environ.get("STATIC_DIST_DIR", "dist")
+
+# Vite emits names like index-DEOOwDZR.js; their content never changes under the same name
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+INDEX_CACHE = "no-cache"
+DEFAULT_CACHE = f"public, max-age={os.environ.get('STATIC_MAX_AGE', '3600')}"
+
+# Precompressed variants in order of preference
+VARIANTS = [("br", ".br"), ("gzip", ".gz")]
+# A variant is only kept when it saves at least this fraction of the original size
+MIN_SAVING = 0.05
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def precompress_assets(directory=DIST_DIR):
+    """Write .br and .gz files next to every static asset where they are meaningfully smaller"""
+    compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.insert(0, (".br", lambda data: brotli.compress(data, quality=11)))
+
+    written = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith((".br", ".gz")):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+
+            for suffix, compress in compressors:
+                variant_path = path + suffix
+                if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(path):
+                    continue
+                compressed = compress(data)
+                if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                    with open(variant_path, "wb") as f:
+                        f.write(compressed)
+                    written += 1
+                elif os.path.exists(variant_path):
+                    os.unlink(variant_path)
+    logger.info(f"Precompressed {written} static asset variants in {directory}")
+    return written
+
+
+def resolve_static_path(relative_path):
+    """Map a URL path to a file inside the dist directory, or None if there is no such file"""
+    root = os.path.realpath(DIST_DIR)
+    full_path = os.path.realpath(os.path.join(root, relative_path))
+    if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+        return None
+    return full_path
+
+
+def _cache_control(path):
+    name = os.path.basename(path)
+    if name == "index.html":
+        return INDEX_CACHE
+    if HASHED_NAME.search(name):
+        return IMMUTABLE_CACHE
+    return DEFAULT_CACHE
+
+
+def _not_modified_since(request: Request, mtime):
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since or request.headers.get("if-none-match"):
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _iter_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_static_file(request: Request, path):
+    """Serve a file from dist with precompressed variants, validators, caching and ranges"""
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    range_header = request.headers.get("range")
+
+    # Pick the best precompressed variant; ranges always address the identity encoding
+    served_path, encoding = path, None
+    if not range_header:
+        accepted = accepted_encodings(request)
+        for coding, suffix in VARIANTS:
+            if (coding in accepted or "*" in accepted) and os.path.isfile(path + suffix):
+                served_path, encoding = path + suffix, coding
+                break
+
+    stat = os.stat(served_path)
+    # Strong validator per variant, so caches never mix encodings up
+    etag = '"' + hashlib.sha1(f"{served_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:32] + '"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": _cache_control(path),
+        "Vary": "Accept-Encoding",
+        "Accept-Ranges": "bytes",
+    }
+
+    if etag_matches(request, etag) or _not_modified_since(request, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, stat.st_size - 1
+    status_code = 200
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag or if_range == headers["Last-Modified"]):
+        byte_range = parse_byte_range(range_header, stat.st_size)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    length = max(end - start + 1, 0)
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        _iter_file(served_path, start, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+if __name__ == "__main__":
+    # python -m controllers.static_assets [dist_dir]
+    precompress_assets(sys.argv[1] if len(sys.argv) > 1 else DIST_DIR)
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import logging
+import vertexai
+from fastapi import HTTPException
+
+from controllers import model_usage, media_sampling
+from controllers.prompt_cache import prepare_request
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+project_id = os.environ.get("PROJECT_ID")
+car = os.environ.get("CAR")
+model_name = os.environ.get("GEMINI_MODEL", "gemini-2.5-pro")
+
+
+def clean_json_data(input_data):
+    """Clean JSON response data from AI model"""
+    logger.info("Cleaning the JSON response data")
+    cleaned_data = input_data.replace('```json', '').replace('```', '').replace('\n', ' ').strip()
+    return cleaned_data
+
+def build_static_prompt():
+    """Fixed analysis instructions, identical for every video (the cacheable prompt prefix)"""
+    example_output = """[
+        {
+            "filename": "example_file.mp4",
+            "car_type": "Passenger Car",
+            "service_related_video": "Y",
+            "sound_and_image": "Y",
+            "show_license_plate": "Y",
+            "car_on_ramp": "Y",
+            "service_advisor_or_technician_name": "Y",
+            "DealershipName": "Y",
+            "special_tools_tyres": "Y",
+            "customer_name": "Y",
+            "special_tools_brake_pad": "Y",
+            "Special_tools_disc": "Y",
+            "attached_offer_mentioned": "Y",
+            "approve_offer_mentioned":"Y",
+            "correct_ending": "Y",
+            "show_license_plate_eval": " ",
+            "car_on_ramp_eval": " ",
+            "service_advisor_or_technician_name_eval": "10",
+            "DealershipName_eval": "10",
+            "customer_name_eval": "10",
+            "special_tools_tyres_eval": "20",
+            "special_tools_brake_pad_eval": "20",
+            "Special_tools_disc_eval": "20",
+            "attached_offer_mentioned_eval": "10",
+            "approve_offer_mentioned_eval": "10",
+            "correct_ending_eval": "5",
+            "total_points_eval": "100",
+            "percentage": "100%",
+            "battery_checked_eval": "100%",
+            "wind_screen_checked_eval": "100%",
+            "summary": "description of the video",
+            "diagnostic_or_not": "Evhc",
+            "transcript": "transcript of the video to english",
+            "comments":" "
+            
+        }
+    ]"""
+
+    return f"""
+            You are an advanced EU Service Video Analysis model. Your task is to analyze the provided video based on specific conditions and provide a detailed analysis in JSON format. 
+            Follow the instructions below to ensure the analysis is accurate and adheres to the specified requirements.\n 
+
+            **Output format**: Provide only valid JSON as an output response and every value should be a string or an empty string (null)
+
+            **Example output format**:
+            {example_output}
+
+            In output you should not include any other format other than JSON.
+
+            Step 1. Conditions Verification:
+                    Before proceeding with the analysis, verify the following conditions:
+                    Condition 1: Is the video related to {car} cars? 
+                    Condition 2: Does the video contain audio? 
+                    Condition 3: Can the car in the video be identified? 
+                    Condition 4: Is the car confirmed as a {car} model? 
+                    Condition 5: Is the video clear enough for analysis? 
+
+            If any one condition fails (i.e., the vehicle is not a {car} car, the video does not contain sound, the car is not confirmed as a {car}, the video is unclear, or {car} is not visible in the video), respond with the following output format:
+
+            Step 2. If Any Condition Fails: Provide the following JSON format:\n [{{ 
+                "filename": "<video file name>", 
+                "car_type": "Non {car}", 
+                "service_related_video": "", 
+                "sound_and_image": "", 
+                "show_license_plate": "", 
+                "car_on_ramp": "", 
+                "service_advisor_or_technician_name": "", 
+                "DealershipName": "", 
+                "special_tools_tyres": "", 
+                "customer_name": "", 
+                "special_tools_brake_pad": "", 
+                "Special_tools_disc": "", 
+                "attached_offer_mentioned": "", 
+                "correct_ending": "", 
+                "show_license_plate_eval": "", 
+                "car_on_ramp_eval": "", 
+                "service_advisor_or_technician_name_eval": "", 
+                "DealershipName_eval": "", 
+                "customer_name_eval": "", 
+                "special_tools_tyres_eval": "", 
+                "special_tools_brake_pad_eval": "", 
+                "Special_tools_disc_eval": "", 
+                "attached_offer_mentioned_eval": "",
+                "approve_offer_mentioned_eval": "", 
+                "correct_ending_eval": "", 
+                "total_points_eval": "",
+                "percentage": "", 
+                "battery_checked_eval": "", 
+                "wind_screen_checked_eval": "", 
+                "summary": "",
+                "diagnostic_or_not": ""
+                "transcript": "",
+                "comments":""
+                }}]\n 
+
+            Step 3. If All Conditions Pass: If all conditions are met (i.e., the vehicle is confirmed as a {car}, the video has 
+            sound, the car is visible and identifiable as a {car}, and the video is clear), then populate the following fields in 
+            the JSON format:\n [{{ 
+
+                "filename": "<video file name>",
+                "car_type": "Passenger Car" or "Commercial Car",
+                "service_related_video": "Y" or "N",
+                "sound_and_image": "Y" or "N",
+                "show_license_plate": "Y" or "N",
+                "car_on_ramp": "Y" or "N" or "N/A",
+                "service_advisor_or_technician_name": "Y if name available or N",
+                "DealershipName":"Compare the dealership name mentioned in the video audio/transcript with the dealership name present in the video file name. If the dealership name from the video matches or is substantially similar to the dealership name in the filename, return 'Y'. If they do not match or if no dealership name is mentioned in the video, return 'N'. For matching, consider variations in spelling, abbreviations, and common business name formats (e.g., '{car} Dealership' vs '{car}', 'Auto Center' vs 'Auto Centre', etc.)",
+                "customer_name": "Y" or "N",
+                "attached_offer_mentioned": "Return 'Y' if the technician explicitly states that a written estimate, quote, or service proposal is attached, included, or provided along with the video. Look for specific phrases like 'I've attached...', 'attached to this video...', 'including with this video...', 'estimate is attached...', 'quote included...', 'proposal attached...', or similar attachment language. Return 'N' if only verbal pricing is mentioned  or nothing is said about it"
+                "approve_offer_mentioned":"approve_offer_mentioned": "Return 'Y' if the technician explicitly mentions that the attached offer/estimate/quote needs to be approved by the customer before proceeding with the work. Look for specific phrases like 'please approve this estimate...', 'approval needed for...', 'approve the attached quote...', 'need your approval to proceed...', 'once you approve this estimate...', 'pending your approval...', 'authorization required...', or similar approval request language. Return 'N' if no approval request is made, or if the technician only mentions prices/estimates without requesting approval.",
+                "correct_ending": "Y" or "N",
+                "show_license_plate_eval": "make this data as blank with no data or string",   
+                "service_advisor_or_technician_name_eval": "Out of 10 based on service_advisor_or_technician_name column,, award 0 if it is "N" award 10 if it is "Y"",  
+                "DealershipName_eval": "Out of 10  based on DealershipName column, award 0 if it is "N" award 10 if it is "Y"",  
+                "customer_name_eval": "Out of 10 based on customer_name column, award 0 if it is "N" award 10 if it is "Y"",  
+                "attached_offer_mentioned_eval": "Out of 10 based on attached_offer_mentioned column",
+                "approve_offer_mentioned_eval": "Out of 10 based on approve_offer_mentioned column",
+                "correct_ending_eval": "Out of 5 based on correct_ending column",  
+                "total_points_eval": "Out of 100",  
+                "percentage": "Percentage based on the points retrieved Out of 100%",  
+                "battery_checked_eval": "Out of 100%",  
+                "wind_screen_checked_eval": "Out of 100%",
+                "summary": "Generate a summary based on the given video",
+                "diagnostic_or_not": "Classify as either 'diagnostic' or 'Evhc' based on the following criteria:\n\n"
+                                      "**Evhc (Electronic Vehicle Health Check):**\n"
+                                      "- IF the transcript contains (case-insensitive) any of the following phrases: '{car} Video Check', 'digital Vehicle Health Check', 'complementary Vehicle Health Check', 'electronic Vehicle Health Check', 'Vehicle Health Check',\n"
+                                      "OR the video *primarily* demonstrates general vehicle inspection tasks such as tire tread checks, brake shoe checks, disc checks, windshield checks, and battery checks,\n"
+                                      "OR IF any minor tasks are performed, they are limited to filling fluids (washer fluid, brake fluid, etc.), adjusting tire pressure, or performing basic cleaning related to brakes, tires, and discs,\n"
+                                      "THEN classify as 'Evhc'.\n\n"
+                                      "**Diagnostic:**\n"
+                                      "- IF the transcript contains (case-insensitive) any of the following words: 'Diagnostic', 'Follow Up', or 'Additional Work Identified',\n"
+                                      "OR IF the video includes *any* component or part replacement, it is classified as Diagnostic, regardless of any other criteria that might suggest Evhc,\n"
+                                      "OR IF the video demonstrates work that goes *beyond* a general check-up (i.e., tasks that are not part of a standard Evhc process),\n"
+                                      "OR IF the video shows component replacements performed under warranty or as part of a recall process (e.g., door switches, airbag issues, or any car manufacturing defect), it is classified as Diagnostic, regardless of any other criteria that might suggest Evhc,\n"
+                                      "OR IF the video includes body work, battery repair (which includes any additional work, repair, or replacement of the battery beyond a simple voltage check and visual inspection), windshield repair, or addresses mechanical failures (defined as any failure in the car other than brakes, discs, or tire components),\n"
+                                      "THEN classify as 'diagnostic'.\n\n"
+                                      "**Conflict Resolution:**\n"
+                                      "- IF both the 'Evhc' and 'diagnostic' criteria are met, classify as 'diagnostic'.\n\n"
+                                      "**Default Behavior:**\n"
+                                      "- If *neither* of the above conditions is met, classify as 'Evhc'.",
+                "special_tools_tyres": "Confirm proper tyre inspection procedure by analyzing BOTH video content AND audio/transcript. 
+                                        Return 'Y' only if ALL conditions are met: 
+                                                    (1) The video visually shows a tyre depth gauge being used to measure minimum 1 tyre per axle, 
+                                                    (2) The tool is properly inserted into the tyre tread grooves for measurement, 
+                                                    (3) The audio/transcript mentions or describes the use of tyre depth gauge and explains the measurement limits ({car} recommendation 3mm or legal limit 1.6mm). 
+                                                    If the video is an EVHC video, this should be either Y or N (not N/A). 
+                                                    If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video specifically shows AND mentions proper tyre depth measurement using the gauge with limit explanations.
+                                                    If any condition is missing, set to 'N'."
+                "special_tools_brake_pad": "Confirm proper brake pad inspection procedure by analyzing BOTH video content AND audio/transcript. 
+                                           Return 'Y' only if ALL conditions are met: 
+                                                   (1) The video visually shows a brake pad thickness tool being used against one pad, 
+                                                   (2) The tool is correctly used and properly inserted at the brake pad location, 
+                                                   (3) The audio/transcript mentions or describes the brake pad measurement and explains the results (Green, Amber, or Red) with wornness explanation including color, percentage, or mileage, 
+                                                   (4) If pads are worn, shows measurement of one per axle (unless drums are fitted). 
+                                                   If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video specifically shows AND mentions proper brake pad thickness measurement with result explanations. 
+                                                   If any condition is missing, set to 'N'."
+                "Special_tools_disc": "Confirm proper brake disc/drum inspection procedure by analyzing BOTH video content AND audio/transcript. 
+                                           Return 'Y' only if ALL conditions are met: 
+                                                  (1) The video visually shows and explains the condition of one disc/drum per axle, 
+                                                  (2) If discs are worn, shows measurement of one per axle with the measurement tool visibly affixed to the disc, 
+                                                  (3) The audio/transcript mentions or describes the disc/drum condition assessment and measurement process when applicable. 
+                                                  If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video specifically shows AND mentions proper disc/drum condition assessment with measurement when worn. 
+                                                  If any condition is missing, set to 'N'.",
+                "car_on_ramp": "If diagnostic_or_not is 'diagnostic', set to 'N/A' unless the video *specifically* shows the car being raised on a ramp for inspection purposes. If the car is on a ramp for inspection, set to 'Y'. Otherwise, set to 'N'.",
+                "special_tools_tyres_eval": "If special_tools_tyres is 'Y', award 20 points. If special_tools_tyres is 'N', award 0 points. If special_tools_tyres is 'N/A', award 20 points.",
+                "special_tools_brake_pad_eval": "If special_tools_brake_pad is 'Y', award 20 points. If special_tools_brake_pad is 'N', award 0 points. If special_tools_brake_pad is 'N/A', award 20 points.",
+                "Special_tools_disc_eval": "If Special_tools_disc is 'Y', award 20 points. If Special_tools_disc is 'N', award 0 points. If Special_tools_disc is 'N/A', award 20 points.",
+                "car_on_ramp_eval": "If car_on_ramp is 'Y', award 5 points. If car_on_ramp is 'N', award 0 points. If car_on_ramp is 'N/A', award 5 points.",
+                "transcript": "Generate a transcript of the video to english",
+                "comments":"Reason for 'diagnostic_or_not' column prediction, explaining whether the 'Evhc' or 'diagnostic' criteria were met (or why neither was met, leading to the default 'diagnostic' classification). Be specific about the keywords found in the transcript and the types of tasks shown in the video. If both criteria were met, indicate that the 'diagnostic' classification takes precedence."
+
+            }}]\n\n
+
+            Important Note: Customer, Technician, and Dealer name fields contribute a maximum of 10 points to the total score. 
+            These three fields — service_advisor_or_technician_name_eval (10 points if present), 
+            DealershipName_eval (10 point if present), and customer_name_eval (10 point if present) — are considered mutually exclusive for scoring purposes. 
+            Scoring Logic for total_points_eval:
+            - If 0 or 1 field in (service_advisor_or_technician_name,DealershipName,customer_name) is YES: Add 0 points to total_points_eval (minimum threshold not met)
+            - If 2 or 3 fields in (service_advisor_or_technician_name,DealershipName,customer_name) are YES: Add 10 points to total_points_eval (threshold met, award maximum points)
+            When calculating total_points_eval and percentage, at least 2 out of these 3 fields must be present (10 points each) to contribute any points to the total score. If this threshold is not met, award 0 points for this category.
+
+            Step 4. Output Format: Ensure every value is either a valid string or an empty string (null). The response must always 
+            be in valid JSON format. Use the exact structure and syntax provided above.\n
+
+            Step 5. Multilingual Video Support:\n
+            Language Detection: Ensure that the system can detect and identify the language of the video's audio or captions. If 
+            the video has captions, analyze them as well, even if they are in different languages.
+
+            Text or Audio Translation: If the video is in a language that is not English, try to translate the audio or captions 
+            into English for accurate analysis. If translation is not possible, mention the language and provide the analysis 
+            based on available content.
+
+            Language in the Audio: If the audio is in a language other than English, ensure that the conditions about 
+            service-related content, special tools, or customer names are evaluated in the context of that language. Keep the 
+            analysis consistent across languages.
+
+            Video Sound and Image Clarification: If the language affects sound (e.g., technical terms in a non-English language), 
+            make sure to evaluate whether these terms are understandable based on the video content, even if the language is 
+            different.\n
+            Important Note:\n
+            If the video does not meet the conditions (e.g., if the {car} car is not visible, if the audio is missing, 
+            or if the video is unclear), return the output format specified in Step 2.
+            If all conditions pass, proceed with the 
+            JSON format specified in Step 3 and provide detailed evaluations based on the analysis."""
+
+def build_video_prompt(file_name):
+    """Per-video part of the prompt, sent after the video"""
+    return f"""The video file name is '{file_name}'. Use it as the "filename" value wherever the output 
+            format says <video file name>, and compare the dealership name against it for DealershipName."""
+
+def generate_content_from_url(url, system_instructions, file_name=None, media_metadata=None,
+                              duration_seconds=None, whole_video=True):
+    vertexai.init(project=project_id)
+
+    # MIME type from the probed container; resolution, frame rate and offsets from the video length
+    video_file, generation_config = media_sampling.video_request(
+        url, media_metadata, duration_seconds, whole_video
+    )
+    # Segments of a long video are analyzed under the original video's filename
+    file_name = file_name or url.split("/")[-1]
+
+    # Static instructions first so they can be served from the context cache
+    model, contents = prepare_request(
+        model_name, system_instructions, build_static_prompt(), [video_file, build_video_prompt(file_name)]
+    )
+
+    started = time.monotonic()
+    try:
+        response = model.generate_content(contents, generation_config=generation_config)
+    except Exception:
+        model_usage.record_failure(model_name, time.monotonic() - started)
+        raise
+    # Tokens and latency are stored with the result and exported as metrics
+    usage = model_usage.from_response(response, model_name, time.monotonic() - started)
+    print(response.text)
+    cleaned_response = clean_json_data(response.text)
+    json_response = json.loads(cleaned_response)
+    if isinstance(json_response, dict) and "data" in json_response:
+        logger.error("Error in response data in uploaded file")
+        raise HTTPException(status_code=400, detail=str(json_response["data"]))
+    else:
+        # Kept with the result so verdicts can be re-derived without calling the model again
+        for item in json_response if isinstance(json_response, list) else []:
+            item["raw_model_output"] = response.text
+            item.update(usage)
+        return json_response
@@ -0,0 +1,104 @@
+import os
+import time
+import logging
+import threading
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from controllers.http_responses import etag_matches, parse_byte_range
+from controllers import renditions
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+bucket_id = os.environ.get("BUCKET_ID")
+bucket_folder = os.environ.get("BUCKET_FOLDER")
+
+# Bytes fetched from GCS per ranged read while streaming
+stream_chunk_size = int(os.environ.get("STREAM_CHUNK_BYTES", str(4 * 1024 * 1024)))
+# Object metadata is reused across the many range requests of one playback session
+stream_metadata_ttl = float(os.environ.get("STREAM_METADATA_TTL_SECONDS", "60"))
+stream_cache_control = os.environ.get("STREAM_CACHE_CONTROL", "private, max-age=3600")
+
+_metadata_lock = threading.Lock()
+_metadata = {}
+
+
+def _allowed(blob_name):
+    # Only videos and their renditions can be streamed, never arbitrary bucket objects
+    return blob_name.startswith(f"{bucket_folder}/") or renditions.is_rendition(blob_name)
+
+
+def _object_metadata(bucket, blob_name):
+    now = time.monotonic()
+    with _metadata_lock:
+        cached = _metadata.get(blob_name)
+        if cached and now - cached["fetched_at"] < stream_metadata_ttl:
+            return cached
+    blob = bucket.get_blob(blob_name)
+    if blob is None:
+        raise HTTPException(status_code=404, detail=f"'{blob_name}' not found")
+    metadata = {
+        "size": blob.size,
+        "generation": blob.generation,
+        "content_type": blob.content_type or "application/octet-stream",
+        "etag": f'"{blob.generation}"',
+        "updated": blob.updated,
+        "fetched_at": now,
+    }
+    with _metadata_lock:
+        _metadata[blob_name] = metadata
+    return metadata
+
+
+def _iter_object(bucket, blob_name, generation, start, end):
+    # Pinned to the generation so a concurrent re-upload cannot mix two versions in one response
+    blob = bucket.blob(blob_name, generation=generation)
+    position = start
+    while position <= end:
+        chunk_end = min(position + stream_chunk_size - 1, end)
+        yield blob.download_as_bytes(start=position, end=chunk_end)
+        position = chunk_end + 1
+
+
+def stream_object(request: Request, blob_name):
+    """Serve a GCS video through the backend with Range, If-Range and conditional request support"""
+    if not _allowed(blob_name):
+        raise HTTPException(status_code=404, detail=f"'{blob_name}' not found")
+    from controllers.Analyzing_video import get_storage_client
+
+    bucket = get_storage_client().bucket(bucket_id)
+    metadata = _object_metadata(bucket, blob_name)
+    size = metadata["size"]
+    headers = {
+        "ETag": metadata["etag"],
+        "Cache-Control": stream_cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if metadata["updated"]:
+        headers["Last-Modified"] = metadata["updated"].strftime("%a, %d %b %Y %H:%M:%S GMT")
+
+    if etag_matches(request, metadata["etag"]):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range in (metadata["etag"], headers.get("Last-Modified"))):
+        # Raises 416 for ranges past the end, every range of an empty object included (as static_assets)
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    if request.method == "HEAD" or size == 0:
+        return Response(status_code=status_code, headers=headers, media_type=metadata["content_type"])
+    return StreamingResponse(
+        _iter_object(bucket, blob_name, metadata["generation"], start, end),
+        status_code=status_code,
+        media_type=metadata["content_type"],
+        headers=headers
+    )
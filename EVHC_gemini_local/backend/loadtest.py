@@ -0,0 +1,495 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+# Logging configuration
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger("loadtest")
+
+# Load-test scenario: the FastAPI app runs in this process against in-memory fakes of GCS, BigQuery
+# and the Gemini model, and mixed dashboard/analysis traffic is sent to it through an ASGI transport.
+# Requests are served on the same event loop as a probe that measures how long the loop stalls, so a
+# handler that blocks the loop shows up as a stall. Exits non-zero when a threshold is exceeded.
+
+BUCKET_ID = "loadtest-bucket"
+BUCKET_FOLDER = "videos"
+TABLE_ID = "loadtest.results"
+
+
+class FakeLatency:
+    """Simulated service times of the cloud fakes, in seconds"""
+    storage = 0.05
+    bigquery = 0.15
+    model = 2.0
+
+
+# ---------------------------------------------------------------------------
+# Cloud Storage fake
+
+class FakeBlob:
+    def __init__(self, bucket, name, generation=None):
+        self.bucket = bucket
+        self.name = name
+        self.generation = generation
+        self.size = 0
+        self.content_type = None
+        self.cache_control = None
+        self.updated = self.time_created = None
+        self._data = b""
+
+    def _store(self, data, content_type):
+        time.sleep(FakeLatency.storage)
+        self._data = data
+        self.size = len(data)
+        self.content_type = content_type
+        self.updated = self.time_created = datetime.now(timezone.utc)
+        with self.bucket.lock:
+            self.generation = self.bucket.next_generation()
+            self.bucket.blobs[self.name] = self
+
+    def upload_from_file(self, file_obj, content_type=None, **kwargs):
+        self._store(file_obj.read(), content_type)
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, "rb") as source:
+            self._store(source.read(), content_type)
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None, **kwargs):
+        # if_generation_match=0: create only, as the retry-safe part uploads ask for
+        if if_generation_match == 0 and self.name in self.bucket.blobs:
+            from google.api_core.exceptions import PreconditionFailed
+
+            raise PreconditionFailed(f"{self.name} already exists")
+        self._store(data, content_type)
+
+    def compose(self, sources, **kwargs):
+        self._store(b"".join(self.bucket.blobs[source.name]._data for source in sources), self.content_type)
+
+    def reload(self, *args, **kwargs):
+        time.sleep(FakeLatency.storage)
+        stored = self.bucket.blobs.get(self.name)
+        if stored is None:
+            from google.api_core.exceptions import NotFound
+
+            raise NotFound(self.name)
+        self.size, self.generation = stored.size, stored.generation
+
+    def exists(self, *args, **kwargs):
+        time.sleep(FakeLatency.storage)
+        return self.name in self.bucket.blobs
+
+    def delete(self, *args, **kwargs):
+        time.sleep(FakeLatency.storage)
+        with self.bucket.lock:
+            self.bucket.blobs.pop(self.name, None)
+
+    def download_as_bytes(self, start=None, end=None, **kwargs):
+        time.sleep(FakeLatency.storage)
+        data = self.bucket.blobs[self.name]._data
+        return data[start or 0:(end + 1) if end is not None else None]
+
+
+class FakeBucket:
+    def __init__(self, name):
+        self.name = name
+        self.blobs = {}
+        self.lock = threading.Lock()
+        self._generation = 0
+
+    def next_generation(self):
+        self._generation += 1
+        return self._generation
+
+    def blob(self, name, generation=None, **kwargs):
+        return self.blobs.get(name) or FakeBlob(self, name, generation)
+
+    def get_blob(self, name, **kwargs):
+        time.sleep(FakeLatency.storage)
+        return self.blobs.get(name)
+
+    def list_blobs(self, prefix=None, **kwargs):
+        # Listing cost grows with the number of objects, as it does against GCS
+        with self.lock:
+            blobs = [blob for name, blob in sorted(self.blobs.items()) if not prefix or name.startswith(prefix)]
+        time.sleep(FakeLatency.storage * (1 + len(blobs) / 1000))
+        return iter(blobs)
+
+
+class FakeStorageClient:
+    buckets = {}
+
+    def __init__(self, *args, **kwargs):
+        self._credentials = None
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket(name))
+
+    def get_bucket(self, name):
+        return self.bucket(name)
+
+
+# ---------------------------------------------------------------------------
+# BigQuery fake: understands the statements the backend issues against the results table
+
+class FakeRows(list):
+    """Query results, iterable row by row or (like a RowIterator) page by page"""
+
+    @property
+    def pages(self):
+        return [list(self)] if self else []
+
+
+class FakeQueryJob:
+    def __init__(self, rows=None, affected=0):
+        self._rows = rows or []
+        self.num_dml_affected_rows = affected
+
+    def result(self, *args, **kwargs):
+        return FakeRows(self._rows)
+
+
+class FakeBigQueryClient:
+    rows = []
+    lock = threading.Lock()
+    modified = datetime.now(timezone.utc)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @staticmethod
+    def _parameters(job_config):
+        parameters = {}
+        for parameter in getattr(job_config, "query_parameters", None) or []:
+            parameters[parameter.name] = getattr(parameter, "value", getattr(parameter, "values", None))
+        return parameters
+
+    def query(self, query, job_config=None, **kwargs):
+        time.sleep(FakeLatency.bigquery)
+        from controllers.results_table import RESULT_COLUMNS
+
+        # Transactions (delete plus tombstone) are simulated by their first statement
+        statement = " ".join(query.split()).upper().removeprefix("BEGIN TRANSACTION; ")
+        parameters = self._parameters(job_config)
+        cls = FakeBigQueryClient
+        with cls.lock:
+            if statement.startswith(("INSERT", "MERGE")):
+                if statement.startswith("MERGE") and any(
+                        row.get("result_id") == parameters.get("result_id") for row in cls.rows):
+                    return FakeQueryJob()
+                cls.rows.append({column: parameters.get(column) for column in RESULT_COLUMNS})
+                cls.modified = datetime.now(timezone.utc)
+                return FakeQueryJob(affected=1)
+            if statement.startswith("DELETE"):
+                before = len(cls.rows)
+                cls.rows = [row for row in cls.rows if row.get("filename") != parameters.get("filename")]
+                cls.modified = datetime.now(timezone.utc)
+                return FakeQueryJob(affected=before - len(cls.rows))
+            if statement.startswith("SELECT"):
+                rows = cls.rows
+                if "FILENAME = @FILENAME" in statement:
+                    rows = [row for row in rows if row.get("filename") == parameters["filename"]]
+                elif "IN UNNEST(@FILENAMES)" in statement:
+                    wanted = set(parameters["filenames"])
+                    rows = [row for row in rows if row.get("filename") in wanted]
+                return FakeQueryJob([dict(row) for row in rows])
+        # ALTER TABLE, UPDATE: nothing to simulate
+        return FakeQueryJob()
+
+    def get_table(self, table_ref, **kwargs):
+        time.sleep(FakeLatency.bigquery / 3)
+        from google.cloud import bigquery
+        from controllers.results_table import COLUMN_TYPES
+        from controllers.results_schema import PARTITION_COLUMN, CLUSTERING_COLUMNS
+
+        return SimpleNamespace(
+            modified=FakeBigQueryClient.modified,
+            num_rows=len(FakeBigQueryClient.rows),
+            created=FakeBigQueryClient.modified,
+            schema=[bigquery.SchemaField(column, column_type) for column, column_type in COLUMN_TYPES.items()],
+            time_partitioning=bigquery.TimePartitioning(field=PARTITION_COLUMN),
+            clustering_fields=CLUSTERING_COLUMNS,
+        )
+
+    def create_table(self, table, **kwargs):
+        return table
+
+
+def fake_generate_content(url, system_instructions, file_name=None, **sampling):
+    """Stands in for the Gemini call: blocks for the model latency like the SDK does"""
+    from controllers.scoring import VERDICT_FIELDS
+
+    time.sleep(FakeLatency.model * random.uniform(0.5, 1.5))
+    result = {field: random.choice(["Y", "N"]) for field in VERDICT_FIELDS}
+    result.update(filename=file_name or url.split("/")[-1], car_type="Ford", summary="Load test analysis")
+    return [result]
+
+
+def install_fakes(work_dir):
+    """Point the backend at the fakes and at scratch files; must run before the app is imported"""
+    defaults = {
+        "ENVIRONMENT": "production",  # No corporate proxy
+        "PROJECT_ID": "loadtest",
+        "BUCKET_ID": BUCKET_ID,
+        "BUCKET_FOLDER": BUCKET_FOLDER,
+        "BIGQUERY_TABLE_ID": TABLE_ID,
+        "PLAYBACK_URL_MODE": "public",
+        "RENDITIONS_ENABLED": "false",
+        "NEAR_DUPLICATE_ACTION": "off",
+        "SEGMENT_ANALYSIS_ENABLED": "false",
+        "FFPROBE_BINARY": "ffprobe-disabled-for-loadtest",
+        # Every simulated user shares one client address
+        "ADMISSION_MAX_PER_CLIENT": "1000",
+        "JOB_QUEUE_PATH": os.path.join(work_dir, "job_queue.sqlite3"),
+        "SEARCH_INDEX_PATH": os.path.join(work_dir, "search_index.sqlite3"),
+        "NEAR_DUPLICATE_INDEX_PATH": os.path.join(work_dir, "near_duplicates.sqlite3"),
+        "BIGQUERY_SPOOL_PATH": os.path.join(work_dir, "bigquery_spool.jsonl"),
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    os.environ["LOCAL_MIRROR_OFFLINE"] = "false"
+    os.environ["LOCAL_MIRROR_PATH"] = ""
+
+    from google.cloud import bigquery, storage
+
+    bigquery.Client = FakeBigQueryClient
+    storage.Client = FakeStorageClient
+
+
+def seed(video_count):
+    """Videos in the fake bucket with one stored result each"""
+    from controllers.results_table import RESULT_COLUMNS
+
+    bucket = FakeStorageClient().bucket(BUCKET_ID)
+    filenames = []
+    for index in range(video_count):
+        filename = f"Dealer{index % 25:02d}_seed_{index:05d}.mp4"
+        blob = bucket.blob(f"{BUCKET_FOLDER}/{filename}")
+        blob.size, blob.content_type = 1024, "video/mp4"
+        blob.updated = blob.time_created = datetime.now(timezone.utc)
+        blob.generation = bucket.next_generation()
+        bucket.blobs[blob.name] = blob
+        row = {column: "Y" for column in RESULT_COLUMNS}
+        row.update(filename=filename, summary=f"Seeded result {index}", result_id=uuid.uuid4().hex)
+        FakeBigQueryClient.rows.append(row)
+        filenames.append(filename)
+    return filenames
+
+
+# ---------------------------------------------------------------------------
+# Scenario
+
+def fake_video_bytes(size=64 * 1024):
+    # An MP4 'ftyp' box header so the upload passes container sniffing
+    return b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom" + os.urandom(size)
+
+
+class Scenario:
+    def __init__(self, client, filenames):
+        self.client = client
+        self.filenames = filenames
+        self.deletable = []
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, endpoint, seconds, status):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    async def analyze(self):
+        filename = f"Dealer{random.randrange(25):02d}_load_{uuid.uuid4().hex[:12]}.mp4"
+        response = await self.client.post(
+            "/api/analyze-video", files={"file": (filename, fake_video_bytes(), "video/mp4")}
+        )
+        if response.status_code == 200:
+            self.deletable.append(filename)
+        return response
+
+    async def list_files(self):
+        return await self.client.get("/api/get-file-urls")
+
+    async def dashboard(self):
+        return await self.client.get("/api/get-video-data")
+
+    async def single_record(self):
+        return await self.client.post("/api/single-record", json={"filename": random.choice(self.filenames)})
+
+    async def delete(self):
+        if not self.deletable:
+            return None
+        return await self.client.post("/api/delete-data", json={"filename": self.deletable.pop(0)})
+
+    async def timed(self, endpoint, call):
+        started = time.perf_counter()
+        try:
+            response = await call()
+        except Exception as e:
+            logger.error(f"{endpoint} raised {e!r}")
+            self.record(endpoint, time.perf_counter() - started, "exception")
+            return
+        if response is not None:
+            self.record(endpoint, time.perf_counter() - started, response.status_code)
+
+    async def drive(self, endpoint, call, rate, duration):
+        """Open-loop arrivals: requests start on a Poisson schedule whether or not earlier ones finished"""
+        if rate <= 0:
+            return
+        tasks = []
+        deadline = time.perf_counter() + duration
+        while True:
+            await asyncio.sleep(random.expovariate(rate))
+            if time.perf_counter() >= deadline:
+                break
+            tasks.append(asyncio.create_task(self.timed(endpoint, call)))
+        await asyncio.gather(*tasks)
+
+
+async def measure_loop_stalls(stop: asyncio.Event, interval, stalls):
+    """Record how late each short sleep wakes up; lateness is time the loop could not run anything"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        stalls.append(max(loop.time() - started - interval, 0.0))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+async def run_scenario(args):
+    import httpx
+    import main
+    from controllers import video_model, loop_monitor
+
+    video_model.generate_content_from_url = fake_generate_content
+    filenames = seed(args.seed_videos)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        scenario = Scenario(client, filenames)
+        stop = asyncio.Event()
+        stalls = []
+        probe = asyncio.create_task(measure_loop_stalls(stop, args.probe_interval_ms / 1000, stalls))
+        # The app's own watchdog names the call sites behind the stalls that fail the run
+        loop_monitor.loop_stall_threshold = args.max_stall_ms / 1000
+        loop_monitor.start(main.background_stop)
+        started = time.perf_counter()
+        await asyncio.gather(
+            scenario.drive("analyze", scenario.analyze, args.analyze_rate, args.duration),
+            scenario.drive("list", scenario.list_files, args.list_rate, args.duration),
+            scenario.drive("dashboard", scenario.dashboard, args.dashboard_rate, args.duration),
+            scenario.drive("single-record", scenario.single_record, args.record_rate, args.duration),
+            scenario.drive("delete", scenario.delete, args.delete_rate, args.duration),
+        )
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+    return scenario, stalls, elapsed
+
+
+def report(scenario, stalls, elapsed):
+    from controllers import loop_monitor
+
+    endpoints = {}
+    for endpoint, latencies in scenario.latencies.items():
+        statuses = scenario.statuses[endpoint]
+        failed = sum(count for status, count in statuses.items() if status == "exception" or int(status) >= 500)
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            "max_ms": round(max(latencies) * 1000, 1),
+            "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            "error_rate": round(failed / len(latencies), 4),
+        }
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "max_loop_stall_ms": round(max(stalls, default=0.0) * 1000, 1),
+        "p99_loop_stall_ms": round(percentile(stalls, 0.99) * 1000, 1),
+        "endpoints": endpoints,
+        "stall_call_sites": [
+            {key: entry[key] for key in ("call_site", "count", "total_seconds", "max_seconds")}
+            for entry in loop_monitor.stall_report()
+        ],
+    }
+
+
+def check_thresholds(results, args):
+    """Threshold violations as messages; an empty list means the run passed"""
+    failures = []
+    if results["max_loop_stall_ms"] > args.max_stall_ms:
+        failures.append(f"event loop stalled for {results['max_loop_stall_ms']}ms (limit {args.max_stall_ms}ms)")
+    for endpoint, stats in results["endpoints"].items():
+        if stats["error_rate"] > args.max_error_rate:
+            failures.append(f"{endpoint}: error rate {stats['error_rate']:.2%} (limit {args.max_error_rate:.2%})")
+        if args.max_read_p99_ms and endpoint in ("list", "dashboard", "single-record") \
+                and stats["p99_ms"] > args.max_read_p99_ms:
+            failures.append(f"{endpoint}: p99 {stats['p99_ms']}ms (limit {args.max_read_p99_ms}ms)")
+    return failures
+
+
+def print_report(results):
+    print(f"\n{'endpoint':<15}{'requests':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+    for endpoint, stats in results["endpoints"].items():
+        print(
+            f"{endpoint:<15}{stats['requests']:>9}{stats['p50_ms']:>10}{stats['p90_ms']:>10}"
+            f"{stats['p99_ms']:>10}{stats['max_ms']:>10}  {stats['statuses']}"
+        )
+    print(f"\nmax event-loop stall: {results['max_loop_stall_ms']}ms (p99 {results['p99_loop_stall_ms']}ms) "
+          f"over {results['elapsed_seconds']}s")
+    for entry in results["stall_call_sites"]:
+        print(f"  {entry['count']}x {entry['call_site']} ({entry['total_seconds']:.2f}s, max {entry['max_seconds']:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mixed-traffic load test of the API against local fakes of the cloud services")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of traffic")
+    parser.add_argument("--analyze-rate", type=float, default=0.5, help="Video uploads for analysis per second")
+    parser.add_argument("--list-rate", type=float, default=2, help="File listing requests per second")
+    parser.add_argument("--dashboard-rate", type=float, default=2, help="Dashboard data requests per second")
+    parser.add_argument("--record-rate", type=float, default=5, help="Single-record requests per second")
+    parser.add_argument("--delete-rate", type=float, default=0.2, help="Deletions of analyzed videos per second")
+    parser.add_argument("--seed-videos", type=int, default=500, help="Videos and results present before the run")
+    parser.add_argument("--model-seconds", type=float, default=FakeLatency.model, help="Mean simulated model latency")
+    parser.add_argument("--bigquery-ms", type=float, default=FakeLatency.bigquery * 1000, help="Simulated query latency")
+    parser.add_argument("--storage-ms", type=float, default=FakeLatency.storage * 1000, help="Simulated GCS call latency")
+    parser.add_argument("--probe-interval-ms", type=float, default=10, help="Event-loop probe interval")
+    # Threadpool handlers serialising large responses hold the GIL and delay the loop by a few hundred
+    # ms; a handler blocking the loop on I/O stalls it for the whole call (seconds with the defaults)
+    parser.add_argument("--max-stall-ms", type=float, default=500, help="Fail when the event loop stalls longer")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="Fail when an endpoint's 5xx share exceeds this")
+    parser.add_argument("--max-read-p99-ms", type=float, default=0, help="Fail when a read endpoint's p99 exceeds this (0: off)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible traffic pattern")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    FakeLatency.model = args.model_seconds
+    FakeLatency.bigquery = args.bigquery_ms / 1000
+    FakeLatency.storage = args.storage_ms / 1000
+
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as work_dir:
+        install_fakes(work_dir)
+        scenario, stalls, elapsed = asyncio.run(run_scenario(args))
+    results = report(scenario, stalls, elapsed)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+    failures = check_thresholds(results, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -1,11 +1,12 @@
 import asyncio
+import threading
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
 import uvicorn
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 import logging
 from pydantic import BaseModel
@@ -51,11 +52,19 @@ PROXY_SETTINGS = setup_ford_proxy()
 
 load_dotenv()
 
-from controllers.Analyzing_video import analyzing_videos, upload_to_cloud_storage
-from controllers.data_from_bigquery import get_data_from_bigquery
+from controllers.Analyzing_video import analyzing_videos, upload_to_cloud_storage, upload_for_analysis, replay_spooled_result
+from controllers.data_from_bigquery import get_data_from_bigquery, get_table_version
 from controllers.delete_file import delete_from_gcs, delete_from_bigquery
-from controllers.get_files_from_bucket import get_all_files
-from controllers.get_video_file_data import get_video_file_data
+from controllers.get_files_from_bucket import get_all_files_with_generation
+from controllers.get_video_file_data import get_video_file_data, get_video_files_data
+from controllers.export_data import export_video_data
+from controllers.http_responses import json_response, make_etag, etag_matches
+from controllers.static_assets import serve_static_file, resolve_static_path
+from controllers import local_mirror, search_index, job_queue, bigquery_spool
+from controllers.admission import AdmissionMiddleware, admission_controller
+from controllers.signed_urls import current_epoch
+from controllers.video_stream import stream_object
+from controllers import bulk_ingest, loop_monitor, change_feed, model_usage
 
 # Custom UploadFile class with content_type support
 class CustomUploadFile(StarletteUploadFile):
@@ -74,6 +83,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Refuse analysis submissions beyond capacity before their body is read. Added before CORS so CORS is
+# the outer layer and the browser can read the 411/413/429 refusals and their Retry-After.
+app.add_middleware(AdmissionMiddleware, paths=("/api/analyze-video", "/api/bulk-ingest"))
+
 # CORS configuration
 origins = ["*"]
 
@@ -83,15 +96,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
-# Serve static files from "assets" folder
-app.mount("/assets", StaticFiles(directory="dist/assets"), name="assets")
+# Serve static files from "assets" folder (hashed names, cached as immutable)
+@app.api_route("/assets/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_asset(request: Request, path: str):
+    file_path = resolve_static_path(f"assets/{path}")
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return serve_static_file(request, file_path)
 
 # Pydantic model for input validation
 class FilenameRequest(BaseModel):
     filename: str
 
+class FilenamesRequest(BaseModel):
+    filenames: List[str]
+
 def get_proxy_session():
     """Create a requests session with Ford proxy configuration"""
     session = requests.Session()
@@ -133,6 +155,30 @@ def youtube_fetch_video_as_file(url: str) -> CustomUploadFile:
     buffer.seek(0)
     return CustomUploadFile(filename=ys.default_filename, file=buffer, content_type="video/mp4")
 
+# Background sync of the local results mirror and replay of spooled BigQuery writes
+background_stop = threading.Event()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Reports and attributes blocking calls made on the event loop
+    loop_monitor.start(background_stop)
+    if local_mirror.mirror_path and not local_mirror.offline_mode:
+        threading.Thread(
+            target=local_mirror.run_periodic_sync, args=(background_stop,), name="mirror-sync", daemon=True
+        ).start()
+    if not local_mirror.offline_mode:
+        threading.Thread(
+            target=bigquery_spool.run_replay, args=(replay_spooled_result, background_stop),
+            name="bigquery-spool", daemon=True
+        ).start()
+    threading.Thread(
+        target=search_index.run_periodic_sync, args=(background_stop,), name="search-sync", daemon=True
+    ).start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    background_stop.set()
+
 # Health check endpoint for Cloud Run
 @app.get("/health")
 async def health_check():
@@ -143,10 +189,13 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Handlers that call blocking clients (Vertex AI, GCS, BigQuery, SQLite) are plain functions:
+# FastAPI runs them in its threadpool, so one running analysis cannot stall every other request
 @app.post("/api/analyze-video")
-async def analyze_video(
+def analyze_video(
         url: Optional[str] = Form(None),  # Accepts GCS or YouTube URL
         file: Optional[UploadFile] = File(None),
+        async_job: bool = Form(False),  # Queue the analysis for a worker instead of waiting for it
 ):
     logger.info(f"API called: analyze_video with url={url}, file={file.filename if file else None}")
 
@@ -154,6 +203,24 @@ async def analyze_video(
         logger.error("Invalid number of inputs; raising exception.")
         raise HTTPException(status_code=422, detail="Provide only one of 'url' or 'file'.")
 
+    if async_job:
+        # Upload now; a worker process (worker.py) runs the analysis from the durable queue
+        if url and url.startswith("gs://"):
+            url_result = {"gcs_url": url, "file_public_url": None, "media_metadata": None}
+        elif url and ("youtube.com" in url or "youtu.be" in url):
+            url_result = upload_for_analysis(youtube_fetch_video_as_file(url))
+        elif url:
+            raise HTTPException(status_code=400, detail="URL must be a GCS or YouTube link.")
+        else:
+            url_result = upload_for_analysis(file)
+        job_id = job_queue.enqueue("analyze", {
+            "gcs_url": url_result["gcs_url"],
+            "file_public_url": url_result["file_public_url"],
+            "media_metadata": url_result["media_metadata"],
+            "system_instructions": system_instructions,
+        })
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
     if url:
         if url.startswith("gs://"):
             result = analyzing_videos(url, system_instructions, file_public_url=None)
@@ -169,9 +236,53 @@ async def analyze_video(
         result = upload_to_cloud_storage(file, system_instructions)
         return result
 
+@app.post("/api/bulk-ingest")
+async def bulk_ingest_videos(
+        urls: Optional[str] = Form(None),  # One URL per line (CitNow, YouTube or gs://)
+        file: Optional[UploadFile] = File(None),  # CSV export with a URL column
+):
+    """Download, pre-check, upload and analyze many videos through a staged pipeline"""
+    if sum(bool(x) for x in [urls, file]) != 1:
+        raise HTTPException(status_code=422, detail="Provide only one of 'urls' or 'file'.")
+    text = urls if urls else (await file.read()).decode("utf-8-sig", errors="replace")
+    job_id = bulk_ingest.submit(bulk_ingest.parse_urls(text), system_instructions)
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "running"})
+
+@app.get("/api/bulk-ingest/{job_id}")
+async def get_bulk_ingest_status(job_id: str):
+    """Per-item stage, status, timings and outcome of a bulk ingest job"""
+    return bulk_ingest.get_job(job_id)
+
+@app.get("/api/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Status, attempts and (once finished) result of a queued analysis"""
+    return job_queue.get_job(job_id)
+
+@app.get("/api/queue-status")
+def get_queue_status():
+    """Admission control counters, durable queue depth and results waiting for BigQuery"""
+    return {
+        "admission": admission_controller.snapshot(),
+        "jobs": job_queue.queue_depth(),
+        "bigquery_spool": len(bigquery_spool.pending()),
+    }
+
+# Prometheus metrics (admission gauges, queue depth, spool depth and age, ...)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    job_queue.queue_depth()
+    # Workers spool into the same file
+    bigquery_spool.pending()
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Event-loop stalls seen by this process, grouped by the call site that blocked the loop
+@app.get("/api/loop-stalls", include_in_schema=False)
+def loop_stalls():
+    return {"threshold_ms": loop_monitor.loop_stall_threshold * 1000, "call_sites": loop_monitor.stall_report()}
+
 # Test endpoint to verify proxy connectivity
 @app.get("/api/test-proxy")
-async def test_proxy():
+def test_proxy():
     """Test Ford proxy connectivity"""
     try:
         session = get_proxy_session()
@@ -214,23 +325,61 @@ async def test_proxy():
         }
 
 @app.get("/api/get-file-urls")
-async def get_urls():
+def get_urls(request: Request):
     try:
-        result = get_all_files()
-        return result
+        result, generation = get_all_files_with_generation()
+        # Signed URLs are re-minted each epoch, so the epoch is part of the listing's version
+        return json_response(request, result, etag=make_etag("files", generation, current_epoch()))
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/get-video-data")
-async def get_video_data():
+def get_video_data(request: Request, since: Optional[str] = None):
     try:
+        if since is not None:
+            # Change feed: rows inserted and filenames deleted since the cursor of an earlier response
+            return json_response(request, change_feed.get_changes(since))
+        # Validate against table metadata first so an unchanged table costs no query
+        etag = make_etag("video-data", get_table_version())
+        if etag_matches(request, etag):
+            return json_response(request, None, etag=etag)
+        # Taken before the read, so nothing written after the listing falls behind the cursor
+        cursor = change_feed.snapshot_cursor()
         data = get_data_from_bigquery()
-        return {"data": data}
+        return json_response(request, {"data": data, "cursor": cursor}, etag=etag)
     except HTTPException as e:
         raise e
 
+@app.get("/api/usage")
+def get_usage(days: int = 30):
+    """Model tokens, latency and estimated cost per day and per dealership over the last `days` days"""
+    return model_usage.usage_report(days)
+
+@app.get("/api/export")
+def export_data(format: str = "csv", search: Optional[str] = None):
+    """Stream the results table as CSV, XLSX or Parquet, filtered like the dashboard"""
+    media_type, chunks = export_video_data(format, search)
+    export_name = f"Ford_Video_Analysis_{time.strftime('%Y-%m-%d_%H-%M-%S')}.{format.lower()}"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_name}"'}
+    )
+
+@app.get("/api/search")
+def search_videos(q: str, page: int = 1, page_size: int = 20, match: str = "all"):
+    """Ranked full-text search over summaries, transcripts and comments"""
+    return search_index.search(q, page=page, page_size=page_size, match_all=(match != "any"))
+
+@app.api_route("/api/stream/{blob_name:path}", methods=["GET", "HEAD"])
+def stream_video(blob_name: str, request: Request):
+    """Range-capable playback through the backend, for environments where URLs cannot be signed"""
+    return stream_object(request, blob_name)
+
 @app.post("/api/single-record")
-async def get_records(request: FilenameRequest):
+def get_records(request: FilenameRequest):
     try:
         result = get_video_file_data(request.filename)
         return result
@@ -238,6 +387,11 @@ async def get_records(request: FilenameRequest):
         logging.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/records")
+def get_records_batch(request: FilenamesRequest):
+    """Fetch records for many filenames with a single BigQuery query"""
+    return get_video_files_data(request.filenames)
+
 @app.post("/api/delete-data")
 async def delete_data(request: FilenameRequest):
     filename = request.filename
@@ -250,15 +404,18 @@ async def delete_data(request: FilenameRequest):
     return {"message": f"Data for file '{filename}' successfully deleted from both GCS and BigQuery."}
 
 # Serve React app for all other routes (SPA routing)
-@app.get("/{path:path}")
+@app.api_route("/{path:path}", methods=["GET", "HEAD"])
 async def get_index(request: Request, path: str):
     """Serve React app for all routes (SPA routing support)"""
     # Handle API routes first (they should not reach here due to /api prefix)
     if path.startswith("api/"):
         raise HTTPException(status_code=404, detail="API endpoint not found")
-    
+
+    # Files shipped in dist (carBg.png, vite.svg, ...) are served as themselves
+    file_path = resolve_static_path(path) if path else None
+
     # For all other routes, serve the React app
-    return FileResponse("dist/index.html")
+    return serve_static_file(request, file_path or resolve_static_path("index.html"))
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+import argparse
+from dotenv import load_dotenv
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+from google.cloud import bigquery
+from controllers.results_table import dealership_from_filename
+from controllers.results_schema import ensure_results_table, apply_layout, has_layout
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+bucket_id = os.environ.get("BUCKET_ID")
+bucket_folder = os.environ.get("BUCKET_FOLDER")
+
+KEY_TYPE = bigquery.StructQueryParameterType(
+    bigquery.ScalarQueryParameterType("STRING", name="filename"),
+    bigquery.ScalarQueryParameterType("TIMESTAMP", name="uploaded_at"),
+    bigquery.ScalarQueryParameterType("STRING", name="dealership"),
+)
+
+
+def backfill_keys(bigquery_client, full_table_id):
+    """Per filename: upload time of the video (the best estimate of a legacy row's analysis time) and dealership"""
+    from controllers.Analyzing_video import get_storage_client
+
+    uploaded = {}
+    for blob in get_storage_client().bucket(bucket_id).list_blobs(prefix=f"{bucket_folder}/"):
+        uploaded[blob.name.split("/")[-1]] = blob.time_created
+    filenames = [row["filename"] for row in bigquery_client.query(
+        f"SELECT DISTINCT filename FROM `{full_table_id}` WHERE filename IS NOT NULL"
+    ).result()]
+    return [
+        bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("filename", "STRING", filename),
+            bigquery.ScalarQueryParameter("uploaded_at", "TIMESTAMP", uploaded.get(filename)),
+            bigquery.ScalarQueryParameter("dealership", "STRING", dealership_from_filename(filename)),
+        )
+        for filename in filenames
+    ]
+
+
+def copy_rows(bigquery_client, source_table_id, target_table_id, columns, keys, fallback_time, only_missing=False):
+    """Copy rows into the partitioned table, filling analyzed_at and dealership where they are empty"""
+    select_columns = ", ".join(
+        "COALESCE(t.analyzed_at, k.uploaded_at, @fallback_time) AS analyzed_at" if column == "analyzed_at"
+        else "COALESCE(t.dealership, k.dealership) AS dealership" if column == "dealership"
+        # Rows given keys here have changed, so change-feed clients receive them again
+        else "IF(t.analyzed_at IS NULL OR t.dealership IS NULL, CURRENT_TIMESTAMP(), t.updated_at) AS updated_at"
+        if column == "updated_at"
+        # Change-feed clients upsert by result_id; rows from before result ids get one
+        else "IFNULL(t.result_id, GENERATE_UUID()) AS result_id" if column == "result_id"
+        else f"t.{column}"
+        for column in columns
+    )
+    # Catch-up pass: rows inserted into the old table while the first copy ran
+    missing_filter = f"""
+        WHERE t.result_id IS NOT NULL
+          AND t.result_id NOT IN (SELECT result_id FROM `{target_table_id}` WHERE result_id IS NOT NULL)
+    """ if only_missing else ""
+    query = f"""
+        INSERT INTO `{target_table_id}` ({", ".join(columns)})
+        SELECT {select_columns}
+        FROM `{source_table_id}` t
+        LEFT JOIN UNNEST(@keys) k ON k.filename = t.filename
+        {missing_filter}
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ArrayQueryParameter("keys", KEY_TYPE, keys),
+        bigquery.ScalarQueryParameter("fallback_time", "TIMESTAMP", fallback_time),
+    ])
+    job = bigquery_client.query(query, job_config=job_config)
+    job.result()
+    return job.num_dml_affected_rows or 0
+
+
+def migrate(dry_run):
+    from controllers.data_from_bigquery import bigquery_client
+
+    full_table_id = f"{project_id}.{table_id}"
+    dataset_id, table_name = table_id.split(".")
+    ensure_results_table(bigquery_client)
+    table = bigquery_client.get_table(full_table_id)
+    if has_layout(table):
+        logger.info(f"{full_table_id} is already partitioned and clustered; nothing to do")
+        return
+
+    keys = backfill_keys(bigquery_client, full_table_id)
+    logger.info(
+        f"{full_table_id}: {table.num_rows} rows, {len(keys)} filenames, "
+        f"{sum(1 for key in keys if key.struct_values['uploaded_at'])} with a known upload time"
+    )
+    if dry_run:
+        return
+
+    suffix = time.strftime("%Y%m%d%H%M%S")
+    staging_id = f"{project_id}.{dataset_id}.{table_name}_partitioned_{suffix}"
+    backup_name = f"{table_name}_backup_{suffix}"
+    columns = [field.name for field in table.schema]
+    # Rows with no analysis time and no video left in the bucket go to the table's creation day
+    fallback_time = table.created
+
+    bigquery_client.create_table(apply_layout(bigquery.Table(staging_id, schema=table.schema)))
+    copied = copy_rows(bigquery_client, full_table_id, staging_id, columns, keys, fallback_time)
+    logger.info(f"Copied {copied} rows into {staging_id}")
+
+    # Inserts failing between the two renames are spooled and replayed by the application
+    bigquery_client.query(f"ALTER TABLE `{full_table_id}` RENAME TO {backup_name}").result()
+    bigquery_client.query(f"ALTER TABLE `{staging_id}` RENAME TO {table_name}").result()
+    backup_id = f"{project_id}.{dataset_id}.{backup_name}"
+    caught_up = copy_rows(bigquery_client, backup_id, full_table_id, columns, keys, fallback_time, only_missing=True)
+    logger.info(f"{full_table_id} is now partitioned by analyzed_at; {caught_up} late rows copied; old table kept as {backup_id}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Copy the results table into a table partitioned by analyzed_at and clustered by filename and dealership"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be migrated without changing anything")
+    args = parser.parse_args()
+    migrate(args.dry_run)
@@ -0,0 +1,133 @@
+import os
+import time
+import logging
+import argparse
+from dotenv import load_dotenv
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+from google.cloud import bigquery
+from controllers.results_table import TYPED_COLUMNS, VERDICT_COLUMNS
+from controllers.results_schema import ensure_results_table, apply_layout, has_layout, has_typed_columns
+from controllers.scoring import VERDICT_FIELDS
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+
+def verdict_sql(expression):
+    """SQL normalizing a stored verdict string like scoring.normalize_verdict"""
+    return f"""CASE UPPER(TRIM(IFNULL({expression}, '')))
+        WHEN 'Y' THEN 'Y' WHEN 'YES' THEN 'Y' WHEN 'N' THEN 'N' WHEN 'NO' THEN 'N'
+        WHEN 'N/A' THEN 'N/A' WHEN 'NA' THEN 'N/A' ELSE '' END"""
+
+
+def verdicts_sql():
+    """SQL building the verdicts JSON of rows stored before verdicts were persisted (as scoring.verdicts_from_row)"""
+    fields = []
+    for field in sorted(VERDICT_FIELDS):
+        if field in VERDICT_COLUMNS:
+            fields.append(f"{verdict_sql(f't.{field}')} AS {field}")
+        else:
+            # approve_offer_mentioned never had a column; its points tell the verdict
+            fields.append(f"""CASE TRIM(IFNULL(t.{field}_eval, '')) WHEN '' THEN '' WHEN '0' THEN 'N' ELSE 'Y' END AS {field}""")
+    # Keeps N/A verdicts, which the boolean columns store as NULL
+    return f"COALESCE(NULLIF(t.verdicts, ''), TO_JSON_STRING(STRUCT({', '.join(fields)})))"
+
+
+def typed_sql(column):
+    """SQL converting a string column to its typed form (same rules as results_table.storage_value)"""
+    column_type = TYPED_COLUMNS[column]
+    if column_type == "BOOL":
+        return f"CASE {verdict_sql(f't.{column}')} WHEN 'Y' THEN TRUE WHEN 'N' THEN FALSE END"
+    number = f"NULLIF(TRIM(RTRIM(TRIM(IFNULL(t.{column}, '')), '%')), '')"
+    if column_type == "INT64":
+        return f"CAST(TRUNC(SAFE_CAST({number} AS FLOAT64)) AS INT64)"
+    return f"SAFE_CAST({number} AS FLOAT64)"
+
+
+def copy_sql(source_table_id, target_table_id, columns, only_missing=False):
+    select_columns = ", ".join(
+        f"{typed_sql(column)} AS {column}" if column in TYPED_COLUMNS
+        else f"{verdicts_sql()} AS verdicts" if column == "verdicts"
+        # Every row changes shape, so change-feed clients receive all of them again
+        else "CURRENT_TIMESTAMP() AS updated_at" if column == "updated_at"
+        # Change-feed clients upsert by result_id; rows from before result ids get one
+        else "IFNULL(t.result_id, GENERATE_UUID()) AS result_id" if column == "result_id"
+        else f"t.{column}"
+        for column in columns
+    )
+    # Catch-up pass: rows inserted into the old table while the first copy ran
+    missing_filter = f"""
+        WHERE t.result_id IS NOT NULL
+          AND t.result_id NOT IN (SELECT result_id FROM `{target_table_id}` WHERE result_id IS NOT NULL)
+    """ if only_missing else ""
+    return f"""
+        INSERT INTO `{target_table_id}` ({", ".join(columns)})
+        SELECT {select_columns}
+        FROM `{source_table_id}` t
+        {missing_filter}
+    """
+
+
+def copy_rows(bigquery_client, source_table_id, target_table_id, columns, only_missing=False):
+    job = bigquery_client.query(copy_sql(source_table_id, target_table_id, columns, only_missing))
+    job.result()
+    return job.num_dml_affected_rows or 0
+
+
+def migrate(dry_run):
+    from controllers.data_from_bigquery import bigquery_client
+
+    full_table_id = f"{project_id}.{table_id}"
+    dataset_id, table_name = table_id.split(".")
+    ensure_results_table(bigquery_client)
+    table = bigquery_client.get_table(full_table_id)
+    if has_typed_columns(table):
+        logger.info(f"{full_table_id} already stores typed columns; nothing to do")
+        return
+    if not has_layout(table):
+        logger.error(f"{full_table_id} is not partitioned yet; run migrate_results_table.py first")
+        return
+
+    columns = [field.name for field in table.schema]
+    logger.info(f"{full_table_id}: {table.num_rows} rows, {table.num_bytes} bytes; converting {len(TYPED_COLUMNS)} columns")
+    if dry_run:
+        print(copy_sql(full_table_id, f"{full_table_id}_typed", columns))
+        return
+
+    suffix = time.strftime("%Y%m%d%H%M%S")
+    staging_id = f"{project_id}.{dataset_id}.{table_name}_typed_{suffix}"
+    backup_name = f"{table_name}_backup_{suffix}"
+    schema = [
+        bigquery.SchemaField(field.name, TYPED_COLUMNS.get(field.name, field.field_type), mode=field.mode)
+        for field in table.schema
+    ]
+
+    bigquery_client.create_table(apply_layout(bigquery.Table(staging_id, schema=schema)))
+    copied = copy_rows(bigquery_client, full_table_id, staging_id, columns)
+    logger.info(f"Copied {copied} rows into {staging_id}")
+
+    # Inserts failing between the two renames are spooled and replayed with typed values
+    bigquery_client.query(f"ALTER TABLE `{full_table_id}` RENAME TO {backup_name}").result()
+    bigquery_client.query(f"ALTER TABLE `{staging_id}` RENAME TO {table_name}").result()
+    backup_id = f"{project_id}.{dataset_id}.{backup_name}"
+    caught_up = copy_rows(bigquery_client, backup_id, full_table_id, columns, only_missing=True)
+    migrated = bigquery_client.get_table(full_table_id)
+    logger.info(
+        f"{full_table_id} now stores typed columns ({table.num_bytes} -> {migrated.num_bytes} bytes); "
+        f"{caught_up} late rows copied; old table kept as {backup_id}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Copy the results table into one storing verdicts as BOOL, points as INT64 and percentages as FLOAT64"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Print the conversion SQL without changing anything")
+    args = parser.parse_args()
+    migrate(args.dry_run)
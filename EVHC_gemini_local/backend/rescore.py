@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import logging
+import argparse
+from dotenv import load_dotenv
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+from google.cloud import bigquery
+from controllers import local_mirror
+from controllers.results_table import RESULT_COLUMNS, COLUMN_TYPES, LEGACY_COLUMN_TYPES, storage_value, typed_row
+from controllers.scoring import VERDICT_FIELDS, SCORING_RULES, scoring_version, verdicts_from_row, score_verdicts
+
+project_id = os.environ.get("PROJECT_ID")
+table_id = os.environ.get("BIGQUERY_TABLE_ID")
+
+update_batch_size = int(os.environ.get("RESCORE_BATCH_SIZE", "500"))
+
+# Stored columns that determine a row's verdicts; rows are matched on these, not just on filename
+KEY_COLUMNS = [field for field in VERDICT_FIELDS if field in RESULT_COLUMNS] + ["approve_offer_mentioned_eval", "verdicts"]
+# Typed tables keep every row's verdicts in the verdicts column (the migration fills it for older rows)
+TYPED_KEY_COLUMNS = ["verdicts"]
+
+
+def new_scores(row, version):
+    """Score fields (and persisted verdicts) of a stored row under the given rule table"""
+    verdicts = verdicts_from_row(row)
+    return {**score_verdicts(verdicts, version), "verdicts": json.dumps(verdicts, sort_keys=True)}
+
+
+def rescore_row(row, version):
+    """Fields of a stored row that change under the given rule table, as typed values"""
+    stored = typed_row(row)
+    changes = {field: storage_value(field, value) for field, value in new_scores(row, version).items()}
+    return {field: value for field, value in changes.items() if stored.get(field) != value}
+
+
+def rescore_mirror(version, dry_run):
+    """Offline mode: re-score the rows of the local mirror"""
+    updates = []
+    for row_id, row in local_mirror.get_all_records_with_ids():
+        changes = rescore_row(row, version)
+        if changes:
+            updates.append((row_id, {**row, **changes}))
+    if updates and not dry_run:
+        local_mirror.update_records(updates)
+    return len(updates)
+
+
+def _update_bigquery(client, score_fields, groups, key_columns, typed):
+    # Stamped so change-feed clients receive the re-scored rows; rows from before result ids get one to be upserted by
+    set_clause = ", ".join(
+        [f"{field} = s.{field}" for field in score_fields]
+        + ["updated_at = CURRENT_TIMESTAMP()", "result_id = IFNULL(t.result_id, GENERATE_UUID())"]
+    )
+    match_clause = " AND ".join(f"IFNULL(t.{column}, '') = s.key_{column}" for column in ["filename"] + key_columns)
+    column_types = COLUMN_TYPES if typed else LEGACY_COLUMN_TYPES
+    query = f"""
+        UPDATE `{project_id}.{table_id}` t
+        SET {set_clause}
+        FROM UNNEST(@scores) s
+        WHERE {match_clause}
+    """
+    for start in range(0, len(groups), update_batch_size):
+        batch = groups[start:start + update_batch_size]
+        scores = [
+            bigquery.StructQueryParameter(
+                None,
+                *[bigquery.ScalarQueryParameter(f"key_{column}", "STRING", value) for column, value in key],
+                *[
+                    bigquery.ScalarQueryParameter(
+                        field, column_types[field], storage_value(field, scores[field]) if typed else scores[field]
+                    )
+                    for field in score_fields
+                ],
+            )
+            for key, scores in batch
+        ]
+        job_config = bigquery.QueryJobConfig(query_parameters=[bigquery.ArrayQueryParameter("scores", "STRUCT", scores)])
+        client.query(query, job_config=job_config).result()
+        logger.info(f"Updated {min(start + update_batch_size, len(groups))}/{len(groups)} score groups")
+
+
+def rescore_bigquery(version, dry_run):
+    """Re-score the BigQuery results table with batched UPDATE ... FROM UNNEST statements"""
+    from controllers.results_schema import ensure_results_table, typed_storage
+    from controllers.data_from_bigquery import bigquery_client
+
+    ensure_results_table(bigquery_client)
+    typed = typed_storage()
+    key_columns = TYPED_KEY_COLUMNS if typed else KEY_COLUMNS
+    rows = bigquery_client.query(f"SELECT * FROM `{project_id}.{table_id}`").result()
+
+    # Rows with the same filename and stored verdicts get the same scores; one UPDATE source row each
+    groups = {}
+    changed_rows = 0
+    for row in rows:
+        # Matched on the stored values: strings, or the verdicts column of a typed table
+        row = dict(row)
+        if not rescore_row(row, version):
+            continue
+        changed_rows += 1
+        key = tuple((column, str(row.get(column) or "")) for column in ["filename"] + key_columns)
+        groups[key] = new_scores(row, version)
+
+    if groups and not dry_run:
+        score_fields = sorted(next(iter(groups.values())).keys())
+        _update_bigquery(bigquery_client, score_fields, list(groups.items()), key_columns, typed)
+        # Refresh the mirror now rather than at the next periodic sync
+        if local_mirror.mirror_path:
+            local_mirror.sync_from_bigquery()
+    return changed_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute scores of stored results from their verdicts")
+    parser.add_argument("--version", default=scoring_version, choices=sorted(SCORING_RULES),
+                        help="Scoring rule table to apply (default: SCORING_VERSION)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would change")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    if local_mirror.offline_mode:
+        changed = rescore_mirror(args.version, args.dry_run)
+    else:
+        changed = rescore_bigquery(args.version, args.dry_run)
+    action = "would change" if args.dry_run else "re-scored"
+    logger.info(f"{changed} rows {action} under scoring {args.version} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
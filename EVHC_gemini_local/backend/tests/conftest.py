@@ -0,0 +1,17 @@
+import tempfile
+
+import pytest
+
+import loadtest
+
+# Every module reads its configuration when it is imported: point the backend at the loadtest's
+# in-memory fakes of GCS and BigQuery (and at scratch SQLite files) before any test imports it
+loadtest.install_fakes(tempfile.mkdtemp(prefix="evhc-tests-"))
+
+
+@pytest.fixture
+def fast_fakes(monkeypatch):
+    """Cloud fakes with short service times, so concurrency tests run in well under a second each"""
+    monkeypatch.setattr(loadtest.FakeLatency, "storage", 0.01)
+    monkeypatch.setattr(loadtest.FakeLatency, "bigquery", 0.01)
+    monkeypatch.setattr(loadtest.FakeLatency, "model", 0.3)
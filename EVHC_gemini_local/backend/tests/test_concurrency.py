@@ -0,0 +1,187 @@
+import time
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import loadtest
+from controllers import admission, job_queue, video_model
+
+
+class ModelProbe:
+    """Fake model call that records how many analyses run at once"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, system_instructions, file_name=None, **sampling):
+        with self._lock:
+            self.running += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            return loadtest.fake_generate_content(url, system_instructions, file_name, **sampling)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def model(monkeypatch, fast_fakes):
+    probe = ModelProbe()
+    monkeypatch.setattr(video_model, "generate_content_from_url", probe)
+    return probe
+
+
+@pytest.fixture
+def queue_path(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, "job_queue_path", str(tmp_path / "job_queue.sqlite3"))
+    monkeypatch.setattr(job_queue, "_schema_ready", False)
+
+
+def _upload(name, **data):
+    return {"files": {"file": (name, loadtest.fake_video_bytes(), "video/mp4")}, "data": data}
+
+
+async def _send(requests, probe_path="/health"):
+    """Send analysis submissions at once, plus a cheap request while they run; returns the analysis
+    responses and the cheap request's latency"""
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        submissions = [
+            asyncio.create_task(client.post("/api/analyze-video", headers={"Origin": "http://dashboard"}, **request))
+            for request in requests
+        ]
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        probe = await client.get(probe_path)
+        probe_seconds = time.perf_counter() - started
+        assert probe.status_code == 200
+        return await asyncio.gather(*submissions), probe_seconds
+
+
+def test_admission_caps_concurrent_analyses(monkeypatch, model):
+    controller = admission.admission_controller
+    monkeypatch.setattr(controller, "max_in_flight", 2)
+    monkeypatch.setattr(controller, "max_per_client", 10)
+
+    responses, probe_seconds = asyncio.run(
+        _send([_upload(f"Dealer01_admission_{index}.mp4") for index in range(6)])
+    )
+
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200, 200, 429, 429, 429, 429]
+    for response in responses:
+        if response.status_code == 429:
+            assert response.headers["retry-after"] == str(admission.admission_retry_after)
+            # Refusals pass through CORS, so the dashboard can read them
+            assert response.headers["access-control-allow-origin"]
+    assert model.peak <= 2
+    # Every admitted submission released its slot and bytes
+    assert controller.snapshot()["in_flight"] == 0
+    assert controller.snapshot()["queued_bytes"] == 0
+    # Analyses run in the threadpool: other requests are served while the model is busy
+    assert probe_seconds < 0.25
+
+
+def test_per_client_limit_is_independent_of_other_clients(monkeypatch, model):
+    controller = admission.admission_controller
+    monkeypatch.setattr(controller, "max_in_flight", 10)
+    monkeypatch.setattr(controller, "max_per_client", 1)
+    monkeypatch.setattr(admission, "admission_trusted_proxy_hops", 1)
+
+    def from_client(address, index):
+        request = _upload(f"Dealer02_client_{address}_{index}.mp4")
+        request["headers"] = {"X-Forwarded-For": address, "Origin": "http://dashboard"}
+        return request
+
+    async def scenario():
+        import main
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            return await asyncio.gather(*[
+                client.post("/api/analyze-video", **from_client(address, index))
+                for address in ("10.0.0.1", "10.0.0.2") for index in range(2)
+            ])
+
+    responses = asyncio.run(scenario())
+    by_client = {}
+    for response, address in zip(responses, ["10.0.0.1", "10.0.0.1", "10.0.0.2", "10.0.0.2"]):
+        by_client.setdefault(address, []).append(response.status_code)
+    assert {address: sorted(codes) for address, codes in by_client.items()} == {
+        "10.0.0.1": [200, 429],
+        "10.0.0.2": [200, 429],
+    }
+
+
+def test_queued_analyses_run_exactly_once_across_workers(monkeypatch, model, queue_path):
+    import worker
+
+    controller = admission.admission_controller
+    monkeypatch.setattr(controller, "max_in_flight", 8)
+    monkeypatch.setattr(controller, "max_per_client", 8)
+
+    responses, _ = asyncio.run(
+        _send([_upload(f"Dealer03_queued_{index}.mp4", async_job="true") for index in range(8)])
+    )
+    assert [response.status_code for response in responses] == [202] * 8
+    job_ids = [response.json()["job_id"] for response in responses]
+
+    claimed = []
+    claimed_lock = threading.Lock()
+
+    def run_worker():
+        while True:
+            job = job_queue.claim(worker.worker_id)
+            if job is None:
+                return
+            with claimed_lock:
+                claimed.append(job["id"])
+            worker.process_job(job)
+
+    workers = [threading.Thread(target=run_worker) for _ in range(4)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join(timeout=30)
+
+    # Each job was leased to exactly one worker and ran once; the workers overlapped
+    assert sorted(claimed) == sorted(job_ids)
+    assert model.calls == 8
+    assert model.peak > 1
+    assert job_queue.queue_depth() == {"succeeded": 8}
+    for job_id in job_ids:
+        assert job_queue.get_job(job_id)["attempts"] == 1
+
+
+def test_expired_lease_is_reclaimed_by_one_worker(queue_path):
+    job_id = job_queue.enqueue("analyze", {"gcs_url": "gs://bucket/video.mp4"})
+    assert job_queue.claim("crashed-worker", lease_seconds=0.01)["id"] == job_id
+    time.sleep(0.05)
+
+    results = []
+    barrier = threading.Barrier(6)
+
+    def contend(name):
+        barrier.wait()
+        results.append(job_queue.claim(name))
+
+    threads = [threading.Thread(target=contend, args=(f"worker-{index}",)) for index in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [job for job in results if job is not None]
+    assert len(winners) == 1
+    assert winners[0]["attempts"] == 2
+    # The worker that lost its lease can no longer complete the job
+    job_queue.complete(job_id, "crashed-worker", {"stale": True})
+    assert job_queue.get_job(job_id)["status"] == "running"
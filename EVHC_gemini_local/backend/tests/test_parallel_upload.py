@@ -0,0 +1,107 @@
+import io
+import os
+
+import pytest
+
+import loadtest
+from controllers import parallel_upload
+
+PART_SIZE = 1024
+
+
+@pytest.fixture
+def bucket(monkeypatch, fast_fakes):
+    monkeypatch.setattr(loadtest.FakeLatency, "storage", 0)
+    monkeypatch.setattr(parallel_upload, "parallel_upload_enabled", True)
+    monkeypatch.setattr(parallel_upload, "parallel_upload_threshold", 4 * PART_SIZE)
+    monkeypatch.setattr(parallel_upload, "parallel_upload_part_size", PART_SIZE)
+    monkeypatch.setattr(parallel_upload, "parallel_upload_max_workers", 4)
+    monkeypatch.setattr(parallel_upload, "parallel_upload_parts_folder", "parts")
+    return loadtest.FakeBucket("test-bucket")
+
+
+def _source(size):
+    return io.BytesIO(os.urandom(size))
+
+
+def _leftover_parts(bucket):
+    return [name for name in bucket.blobs if name.startswith("parts/")]
+
+
+def test_small_file_is_uploaded_as_one_stream(bucket, monkeypatch):
+    monkeypatch.setattr(parallel_upload, "parallel_upload", lambda *args, **kwargs: pytest.fail("split a small file"))
+    source = _source(2 * PART_SIZE)
+
+    blob = parallel_upload.upload_file(bucket, "videos/small.mp4", source, "video/mp4")
+
+    assert bucket.blobs["videos/small.mp4"]._data == source.getvalue()
+    assert blob.content_type == "video/mp4"
+    assert source.tell() == 0
+
+
+def test_large_file_is_split_into_parts_and_composed(bucket, monkeypatch):
+    uploaded = []
+    upload_from_string = loadtest.FakeBlob.upload_from_string
+
+    def record(blob, data, **kwargs):
+        uploaded.append((blob.name, len(data), kwargs.get("if_generation_match")))
+        return upload_from_string(blob, data, **kwargs)
+
+    monkeypatch.setattr(loadtest.FakeBlob, "upload_from_string", record)
+    # Ten full parts and a short last one
+    source = _source(10 * PART_SIZE + 100)
+
+    blob = parallel_upload.upload_file(bucket, "videos/large.mp4", source, "video/mp4")
+
+    assert bucket.blobs["videos/large.mp4"]._data == source.getvalue()
+    assert blob.size == len(source.getvalue())
+    assert blob.content_type == "video/mp4"
+    assert sorted(size for _, size, _ in uploaded) == [100] + [PART_SIZE] * 10
+    # Parts are created with a precondition, so the client can retry them safely
+    assert {precondition for _, _, precondition in uploaded} == {0}
+    assert _leftover_parts(bucket) == []
+    assert source.tell() == 0
+
+
+def test_more_parts_than_one_compose_accepts(bucket):
+    source = _source((parallel_upload.MAX_COMPOSE_SOURCES * 2 + 5) * PART_SIZE)
+
+    parallel_upload.upload_file(bucket, "videos/huge.mp4", source, "video/mp4")
+
+    assert bucket.blobs["videos/huge.mp4"]._data == source.getvalue()
+    # Intermediate composites are removed with the parts
+    assert _leftover_parts(bucket) == []
+
+
+def test_failed_part_fails_the_upload_and_leaves_no_parts(bucket, monkeypatch):
+    upload_from_string = loadtest.FakeBlob.upload_from_string
+
+    def fail_after_writing(blob, data, **kwargs):
+        upload_from_string(blob, data, **kwargs)
+        if blob.name.endswith(("part-00003", "part-00007")):
+            # Written, but the response was lost
+            raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(loadtest.FakeBlob, "upload_from_string", fail_after_writing)
+    source = _source(10 * PART_SIZE)
+    source.seek(123)
+
+    with pytest.raises(ConnectionError):
+        parallel_upload.upload_file(bucket, "videos/broken.mp4", source, "video/mp4")
+
+    assert "videos/broken.mp4" not in bucket.blobs
+    assert _leftover_parts(bucket) == []
+    assert source.tell() == 0
+
+
+def test_size_mismatch_after_compose_is_an_error(bucket, monkeypatch):
+    compose = loadtest.FakeBlob.compose
+
+    def drop_last_source(blob, sources, **kwargs):
+        return compose(blob, sources[:-1], **kwargs)
+
+    monkeypatch.setattr(loadtest.FakeBlob, "compose", drop_last_source)
+
+    with pytest.raises(IOError, match="expected"):
+        parallel_upload.upload_file(bucket, "videos/short.mp4", _source(6 * PART_SIZE), "video/mp4")
+    assert _leftover_parts(bucket) == []
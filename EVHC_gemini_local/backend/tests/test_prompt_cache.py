@@ -0,0 +1,163 @@
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from controllers import prompt_cache
+from controllers.prompt_cache import LocalContextCache, prompt_version
+
+MODEL = "gemini-test"
+SYSTEM = "system instructions"
+PROMPT = "static analysis prompt"
+
+
+class RecordingModel:
+    """Stands in for GenerativeModel, which needs Google credentials to construct"""
+
+    def __init__(self, model_name, system_instruction=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+
+@pytest.fixture
+def cache():
+    return LocalContextCache()
+
+
+def _expire_in(cache, delta):
+    cache._entry.expire_time = datetime.now(timezone.utc) + delta
+
+
+def test_first_request_creates_the_cache(cache):
+    handle = cache.get(MODEL, SYSTEM, PROMPT)
+
+    assert handle == {"version": prompt_version(MODEL, SYSTEM, PROMPT), "contents": [PROMPT]}
+    assert cache.stats["created"] == 1
+
+
+def test_later_requests_hit_the_cache(cache):
+    first = cache.get(MODEL, SYSTEM, PROMPT)
+    for _ in range(5):
+        assert cache.get(MODEL, SYSTEM, PROMPT) is first
+    assert cache.stats == {"created": 1, "refreshed": 0, "reused": 0, "deleted": 0, "failed": 0}
+
+
+def test_request_for_puts_the_prefix_before_the_video(monkeypatch, cache):
+    monkeypatch.setattr(prompt_cache, "GenerativeModel", RecordingModel)
+    handle = cache.get(MODEL, SYSTEM, PROMPT)
+
+    model, contents = cache.request_for(handle, MODEL, SYSTEM, ["video part"])
+
+    assert contents == [PROMPT, "video part"]
+    assert (model.model_name, model.system_instruction) == (MODEL, SYSTEM)
+
+
+def test_cache_close_to_expiry_is_refreshed_not_recreated(cache):
+    handle = cache.get(MODEL, SYSTEM, PROMPT)
+    _expire_in(cache, prompt_cache.prompt_cache_refresh_margin / 2)
+
+    assert cache.get(MODEL, SYSTEM, PROMPT) is handle
+    assert cache.stats["refreshed"] == 1
+    assert cache.stats["created"] == 1
+    assert cache._entry.expire_time - datetime.now(timezone.utc) > prompt_cache.prompt_cache_refresh_margin
+
+
+def test_expired_cache_is_recreated(cache):
+    cache.get(MODEL, SYSTEM, PROMPT)
+    _expire_in(cache, -timedelta(seconds=1))
+
+    cache.get(MODEL, SYSTEM, PROMPT)
+
+    assert cache.stats["created"] == 2
+    assert cache.stats["refreshed"] == 0
+    assert cache._entry.expire_time > datetime.now(timezone.utc)
+
+
+def test_prompt_change_invalidates_the_cache(cache):
+    old = cache.get(MODEL, SYSTEM, PROMPT)
+
+    new = cache.get(MODEL, SYSTEM, PROMPT + " v2")
+
+    assert new["version"] != old["version"]
+    assert new["contents"] == [PROMPT + " v2"]
+    assert cache.stats["deleted"] == 1
+    assert cache.stats["created"] == 2
+
+
+def test_model_change_invalidates_the_cache(cache):
+    old = cache.get(MODEL, SYSTEM, PROMPT)
+
+    assert cache.get("gemini-other", SYSTEM, PROMPT)["version"] != old["version"]
+    assert cache.stats["deleted"] == 1
+
+
+class FailingCache(LocalContextCache):
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    def _create(self, version, model_name, system_instructions, static_prompt):
+        self.attempts += 1
+        raise RuntimeError("quota exceeded")
+
+
+def test_failed_create_falls_back_to_uncached_and_waits_before_retrying():
+    cache = FailingCache()
+
+    assert cache.get(MODEL, SYSTEM, PROMPT) is None
+    assert cache.get(MODEL, SYSTEM, PROMPT) is None
+    assert cache.attempts == 1
+    assert cache.stats["failed"] == 1
+
+    cache._retry_at = time.monotonic()
+    assert cache.get(MODEL, SYSTEM, PROMPT) is None
+    assert cache.attempts == 2
+
+
+class SlowCache(LocalContextCache):
+    def __init__(self):
+        super().__init__()
+        self.creating = threading.Event()
+
+    def _create(self, version, model_name, system_instructions, static_prompt):
+        self.creating.set()
+        time.sleep(0.3)
+        return super()._create(version, model_name, system_instructions, static_prompt)
+
+
+def test_concurrent_misses_create_once_without_waiting():
+    cache = SlowCache()
+    results = []
+    creator = threading.Thread(target=lambda: results.append(cache.get(MODEL, SYSTEM, PROMPT)))
+    creator.start()
+    assert cache.creating.wait(1)
+
+    # While the first request creates the cache, others are sent uncached instead of blocking on it
+    started = time.monotonic()
+    assert cache.get(MODEL, SYSTEM, PROMPT) is None
+    assert time.monotonic() - started < 0.1
+
+    creator.join()
+    assert results[0] is not None
+    assert cache.get(MODEL, SYSTEM, PROMPT) is results[0]
+    assert cache.stats["created"] == 1
+
+
+def test_prepare_request_uses_the_local_cache(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "GenerativeModel", RecordingModel)
+    monkeypatch.setattr(prompt_cache, "context_cache", LocalContextCache())
+
+    for _ in range(3):
+        _, contents = prompt_cache.prepare_request(MODEL, SYSTEM, PROMPT, ["video part"])
+        assert contents == [PROMPT, "video part"]
+    assert prompt_cache.context_cache.stats["created"] == 1
+
+
+def test_prepare_request_without_a_cache_sends_the_full_prompt(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "GenerativeModel", RecordingModel)
+    monkeypatch.setattr(prompt_cache, "context_cache", None)
+
+    _, contents = prompt_cache.prepare_request(MODEL, SYSTEM, PROMPT, ["video part"])
+
+    assert contents == [PROMPT, "video part"]
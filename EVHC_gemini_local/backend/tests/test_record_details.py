@@ -0,0 +1,67 @@
+import json
+import uuid
+from collections import OrderedDict
+
+import pytest
+
+import loadtest
+from controllers import local_mirror, get_video_file_data, data_from_bigquery
+from controllers.record_cache import record_cache
+from controllers.results_table import to_table_row, listing_row
+
+RAW_MODEL_OUTPUT = json.dumps({"transcript": "Front tyres are at 2mm"})
+
+
+@pytest.fixture
+def results(monkeypatch, tmp_path, fast_fakes):
+    """Rows in the fake results table, with a fresh mirror and an empty record cache"""
+    monkeypatch.setattr(local_mirror, "mirror_path", str(tmp_path / "mirror.sqlite3"))
+    monkeypatch.setattr(local_mirror, "_schema_ready", False)
+    monkeypatch.setattr(loadtest.FakeBigQueryClient, "rows", [])
+    monkeypatch.setattr(record_cache, "_entries", OrderedDict())
+    rows = [
+        to_table_row({
+            "result_id": str(uuid.uuid4()),
+            "filename": f"DLR1_{index}.mp4",
+            "summary": f"Summary {index}",
+            "raw_model_output": RAW_MODEL_OUTPUT,
+        })
+        for index in range(3)
+    ]
+    loadtest.FakeBigQueryClient.rows.extend(rows)
+    return rows
+
+
+def test_dashboard_listing_does_not_fill_the_record_cache(results, monkeypatch):
+    monkeypatch.setattr(data_from_bigquery.local_mirror, "is_ready", lambda: False)
+
+    listing = data_from_bigquery.get_data_from_bigquery()
+
+    assert {row["filename"] for row in listing} == {row["filename"] for row in results}
+    assert record_cache.stats()["entries"] == 0
+    response = get_video_file_data.get_video_file_data("DLR1_0.mp4")
+    assert response["records"][0]["raw_model_output"] == RAW_MODEL_OUTPUT
+
+
+def test_single_record_read_fetches_details_missing_from_the_mirror(results):
+    # The mirror sync reads the listing columns only
+    local_mirror.replace_all([listing_row(row) for row in results])
+
+    response = get_video_file_data.get_video_file_data("DLR1_1.mp4")
+
+    assert response["summary"] == ["Summary 1"]
+    assert response["records"][0]["raw_model_output"] == RAW_MODEL_OUTPUT
+    # ...and the full row is what gets cached
+    cached = record_cache.get("DLR1_1.mp4")
+    assert cached[0]["raw_model_output"] == RAW_MODEL_OUTPUT
+
+
+def test_multi_get_fetches_details_missing_from_the_mirror(results):
+    local_mirror.replace_all([listing_row(row) for row in results[:2]])
+    local_mirror.insert_record(results[2])
+
+    response = get_video_file_data.get_video_files_data(["DLR1_0.mp4", "DLR1_2.mp4", "DLR1_9.mp4"])
+
+    assert response["missing"] == ["DLR1_9.mp4"]
+    for filename in ("DLR1_0.mp4", "DLR1_2.mp4"):
+        assert response["records"][filename]["records"][0]["raw_model_output"] == RAW_MODEL_OUTPUT
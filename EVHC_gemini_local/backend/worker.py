@@ -0,0 +1,96 @@
+import os
+import signal
+import socket
+import logging
+import threading
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+from controllers import job_queue, local_mirror, bigquery_spool
+from controllers.Analyzing_video import analyzing_videos, replay_spooled_result
+
+poll_interval = float(os.environ.get("WORKER_POLL_SECONDS", "2"))
+worker_id = os.environ.get("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+
+stop_event = threading.Event()
+
+
+def run_analyze_job(payload):
+    return analyzing_videos(
+        payload["gcs_url"], payload["system_instructions"], payload.get("file_public_url"), payload.get("media_metadata")
+    )
+
+
+# Job kinds this worker knows how to run
+HANDLERS = {
+    "analyze": run_analyze_job,
+}
+
+
+def _keep_lease(job_id, done: threading.Event):
+    """Renew the lease while the job runs so no other worker picks it up"""
+    while not done.wait(job_queue.job_lease_seconds / 3):
+        if not job_queue.extend_lease(job_id, worker_id):
+            logger.warning(f"Lost the lease on job {job_id}")
+            return
+
+
+def process_job(job):
+    handler = HANDLERS.get(job["kind"])
+    if handler is None:
+        job_queue.fail(job["id"], worker_id, f"Unknown job kind '{job['kind']}'", retryable=False)
+        return
+
+    done = threading.Event()
+    threading.Thread(target=_keep_lease, args=(job["id"], done), daemon=True).start()
+    try:
+        logger.info(f"Running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        result = handler(job["payload"])
+        job_queue.complete(job["id"], worker_id, result)
+        logger.info(f"Job {job['id']} succeeded")
+    except HTTPException as e:
+        # Client errors (bad input, unsupported media) will not succeed on retry
+        job_queue.fail(job["id"], worker_id, e.detail, retryable=e.status_code >= 500)
+    except Exception as e:
+        job_queue.fail(job["id"], worker_id, str(e))
+    finally:
+        done.set()
+
+
+def run_worker():
+    logger.info(f"Analysis worker {worker_id} consuming {job_queue.job_queue_path}")
+    if not local_mirror.offline_mode:
+        # Results whose BigQuery insert failed are replayed from the spool in the background
+        threading.Thread(
+            target=bigquery_spool.run_replay, args=(replay_spooled_result, stop_event),
+            name="bigquery-spool", daemon=True
+        ).start()
+    while not stop_event.is_set():
+        try:
+            job = job_queue.claim(worker_id)
+        except Exception as e:
+            logger.error(f"Error claiming job: {e}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        process_job(job)
+    logger.info(f"Analysis worker {worker_id} stopped")
+
+
+def _handle_stop(signum, frame):
+    # Finish the current job, then exit; an interrupted job is reclaimed after its lease expires
+    logger.info("Stop requested, finishing current job")
+    stop_event.set()
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    run_worker()
@@ -1,4 +1,3 @@
-import * as XLSX from 'xlsx';
 import React, { useState, useEffect } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { 
@@ -12,7 +11,7 @@ import { apiService } from './services/api';
 
 // Video Player Modal Component with improved error handling
 // Video Player Modal Component with fixed "Open in New Tab"
-const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
+const VideoPlayerModal = ({ isOpen, onClose, videoUrl, previewUrl, filename }) => {
   const [isPlaying, setIsPlaying] = useState(false);
   const [isMuted, setIsMuted] = useState(false);
   const [isLoading, setIsLoading] = useState(true);
@@ -24,6 +23,9 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
   const [isFullscreen, setIsFullscreen] = useState(false);
   const [processedVideoUrl, setProcessedVideoUrl] = useState('');
   const [directUrl, setDirectUrl] = useState('');
+  // The low-bitrate preview rendition plays first; full quality on request or if the preview fails
+  const [useFullQuality, setUseFullQuality] = useState(false);
+  const playingPreview = Boolean(previewUrl) && !useFullQuality;
   const videoRef = React.useRef(null);
   const containerRef = React.useRef(null);
 
@@ -57,9 +59,13 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
     return { processed: url, direct: url };
   };
 
+  useEffect(() => {
+    setUseFullQuality(false);
+  }, [videoUrl, previewUrl]);
+
   useEffect(() => {
     if (isOpen && videoUrl) {
-      const { processed, direct } = processVideoUrl(videoUrl);
+      const { processed, direct } = processVideoUrl(playingPreview ? previewUrl : videoUrl);
       setProcessedVideoUrl(processed);
       setDirectUrl(direct);
       setIsLoading(true);
@@ -73,7 +79,7 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
       console.log('Processed URL:', processed);
       console.log('Direct URL:', direct);
     }
-  }, [isOpen, videoUrl]);
+  }, [isOpen, videoUrl, previewUrl, playingPreview]);
 
   const handlePlayPause = () => {
     if (videoRef.current) {
@@ -157,6 +163,11 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
   };
 
   const handleVideoError = (e) => {
+    if (playingPreview) {
+      console.log('Preview failed, switching to the full video');
+      setUseFullQuality(true);
+      return;
+    }
     setIsLoading(false);
     setHasError(true);
     const error = e.target.error;
@@ -386,9 +397,9 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
 
             {processedVideoUrl && (
               <video
+                key={processedVideoUrl}
                 ref={videoRef}
                 className="w-full h-full object-contain"
-                crossOrigin="anonymous"
                 onLoadStart={() => {
                   console.log('Video load started');
                   setIsLoading(true);
@@ -502,6 +513,16 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
                 </div>
 
                 <div className="flex items-center space-x-3">
+                  {previewUrl && (
+                    <button
+                      onClick={() => setUseFullQuality(!useFullQuality)}
+                      className="px-3 py-2 rounded-lg bg-white/10 hover:bg-white/20 text-white text-xs transition-all duration-200"
+                      title={playingPreview ? 'Play the original video' : 'Play the smaller preview'}
+                    >
+                      {playingPreview ? 'Preview' : 'Full quality'}
+                    </button>
+                  )}
+
                   <button
                     onClick={handleFullscreen}
                     className="p-2 rounded-lg bg-white/10 hover:bg-white/20 text-white transition-all duration-200"
@@ -526,16 +547,41 @@ const VideoPlayerModal = ({ isOpen, onClose, videoUrl, filename }) => {
   );
 };
 
+// Stored results carry verdicts as booleans (null for N/A or an unscored video) and scores as numbers;
+// a fresh analysis carries them as 'Y'/'N'/'N/A' and '85%' strings
+const isBlank = (value) => value === null || value === undefined || value === '';
+
+const valueOr = (value, fallback) => (isBlank(value) ? fallback : value);
+
+const formatVerdict = (value, record) => {
+  if (value === true) return 'Y';
+  if (value === false) return 'N';
+  if (isBlank(value)) return record && !isBlank(record.total_points_eval) ? 'N/A' : '';
+  return value;
+};
+
+const percentValue = (value) => {
+  if (isBlank(value)) return null;
+  const number = typeof value === 'number' ? value : parseFloat(value.toString().replace('%', ''));
+  return Number.isNaN(number) ? null : number;
+};
+
+const formatPercent = (value) => {
+  const number = percentValue(value);
+  return number === null ? '' : `${number}%`;
+};
+
 // Helper function to get status icon and color
 const getStatusDisplay = (value, type = 'yesno') => {
   if (type === 'yesno') {
-    if (value === 'Yes') {
+    const verdict = formatVerdict(value);
+    if (verdict === 'Y' || verdict === 'Yes') {
       return { icon: CheckCircle, color: 'text-green-400', bgColor: 'bg-green-500/20', borderColor: 'border-green-500/30' };
-    } else if (value === 'No') {
+    } else if (verdict === 'N' || verdict === 'No') {
       return { icon: XCircle, color: 'text-red-400', bgColor: 'bg-red-500/20', borderColor: 'border-red-500/30' };
     }
   } else if (type === 'score') {
-    const score = parseFloat(value?.toString().replace('%', '') || '0');
+    const score = percentValue(value) ?? 0;
     if (score >= 80) {
       return { icon: Award, color: 'text-green-400', bgColor: 'bg-green-500/20', borderColor: 'border-green-500/30' };
     } else if (score >= 60) {
@@ -818,6 +864,8 @@ const MainApplication = () => {
   const [files, setFiles] = useState([]);
   const [selectedFile, setSelectedFile] = useState(null);
   const [videoData, setVideoData] = useState([]);
+  // Change-feed cursor of the last video data response
+  const videoDataCursor = React.useRef(null);
   const [isLoading, setIsLoading] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
   const [summary, setSummary] = useState(null);
@@ -827,6 +875,7 @@ const MainApplication = () => {
   const [isUploading, setIsUploading] = useState(false);
   const [isVideoPlayerOpen, setIsVideoPlayerOpen] = useState(false);
   const [currentVideoUrl, setCurrentVideoUrl] = useState('');
+  const [currentPreviewUrl, setCurrentPreviewUrl] = useState('');
   const [citNowUrl, setCitNowUrl] = useState('');
 
   // Load initial data
@@ -867,6 +916,7 @@ const MainApplication = () => {
       
       setFiles(newFiles);
       setVideoData(newVideoData);
+      videoDataCursor.current = videoRes?.cursor || null;
       
       console.log('=== LOADING DATA COMPLETE ===');
       
@@ -878,6 +928,38 @@ const MainApplication = () => {
   };
   
 
+  // Bring videoData up to date by fetching only the rows inserted or deleted since the last response
+  const syncVideoData = async () => {
+    if (!videoDataCursor.current) {
+      const videoRes = await apiService.getVideoData();
+      setVideoData(videoRes?.data || []);
+      videoDataCursor.current = videoRes?.cursor || null;
+      return videoRes?.data || [];
+    }
+    const changes = await apiService.getVideoDataChanges(videoDataCursor.current);
+    videoDataCursor.current = changes.cursor;
+    if (changes.reset) {
+      setVideoData(changes.rows);
+      return changes.rows;
+    }
+    // Deletions first: they remove every row of the file, and rows re-inserted after them follow
+    const deleted = new Set(changes.deleted.map(d => d.filename));
+    // Rows stored before results had ids are keyed by filename
+    const rowKey = r => r.result_id ?? `file:${r.filename}`;
+    const incoming = new Set(changes.rows.map(rowKey));
+    const incomingFiles = new Set(changes.rows.map(r => r.filename));
+    setVideoData(prev => [
+      ...prev.filter(v =>
+        !deleted.has(v.filename) &&
+        !incoming.has(rowKey(v)) &&
+        // Optimistic records added after an upload have no result_id yet
+        !(v.result_id === undefined && incomingFiles.has(v.filename))
+      ),
+      ...changes.rows,
+    ]);
+    return changes.rows;
+  };
+
   const handleFileSelect = async (file) => {
     try {
       setSelectedFile(file);
@@ -985,12 +1067,12 @@ const MainApplication = () => {
         setTimeout(async () => {
           console.log('🔄 Refreshing file list in background...');
           try {
-            await loadData();
+            const [newFiles, changedRows] = await Promise.all([apiService.getFiles(), syncVideoData()]);
+            setFiles(newFiles || []);
             console.log('📁 Background file list refresh completed');
             
-            // After background refresh, try to get more complete data
-            const updatedVideoData = (await apiService.getVideoData())?.data || [];
-            const updatedRecord = updatedVideoData.find(v => v.filename === filename);
+            // The change feed carries the stored record of the new analysis
+            const updatedRecord = changedRows.find(v => v.filename === filename);
             
             if (updatedRecord && updatedRecord.summary && !analysisResults?.summary) {
               // Update summary with more complete data if available
@@ -1032,6 +1114,8 @@ const MainApplication = () => {
         setSelectedFile(null);
         setSummary(null);
       }
+      // Picks up what other users changed meanwhile
+      syncVideoData().catch(error => console.error('Video data sync failed:', error));
     } catch (error) {
       console.error('Error:', error);
       throw error;
@@ -1043,8 +1127,9 @@ const MainApplication = () => {
     window.location.reload();
   };
 
-  const handleWatchVideo = (videoUrl) => {
+  const handleWatchVideo = (videoUrl, previewUrl) => {
     setCurrentVideoUrl(videoUrl);
+    setCurrentPreviewUrl(previewUrl || '');
     setIsVideoPlayerOpen(true);
   };
 
@@ -1056,6 +1141,11 @@ const MainApplication = () => {
   const currentRecord = selectedFile ? 
     videoData.find(v => v.filename === selectedFile.file_name) : null;
 
+  // Signed (or streamed) URL the browser can play; video_url needs a Google sign-in cookie
+  const listedFile = selectedFile ? files.find(f => f.file_name === selectedFile.file_name) : null;
+  const watchUrl = listedFile?.playback_url || selectedFile?.playback_url ||
+    currentRecord?.playback_url || currentRecord?.video_url;
+
   return (
     <div className="min-h-screen bg-gradient-to-br from-slate-900 via-purple-900 to-slate-900">
       <div className="absolute inset-0 bg-[radial-gradient(circle_at_50%_50%,rgba(59,130,246,0.1),transparent)]"></div>
@@ -1184,9 +1274,18 @@ const MainApplication = () => {
                   >
                     <div className="flex items-center space-x-3">
                       <div className="flex-shrink-0">
-                        <div className="w-10 h-10 bg-gradient-to-r from-blue-500 to-purple-600 rounded-lg flex items-center justify-center">
-                          <FileVideo className="h-5 w-5 text-white" />
-                        </div>
+                        {file.thumbnail_url ? (
+                          <img
+                            src={file.thumbnail_url}
+                            alt=""
+                            loading="lazy"
+                            className="w-10 h-10 rounded-lg object-cover"
+                          />
+                        ) : (
+                          <div className="w-10 h-10 bg-gradient-to-r from-blue-500 to-purple-600 rounded-lg flex items-center justify-center">
+                            <FileVideo className="h-5 w-5 text-white" />
+                          </div>
+                        )}
                       </div>
                       <div className="flex-1 min-w-0">
                         <p className="text-sm font-medium text-white truncate">
@@ -1253,95 +1352,8 @@ const MainApplication = () => {
                 <button
                   onClick={() => {
                     if (videoData.length > 0) {
-                      // Prepare data for Excel export
-                      const exportData = videoData.map(record => ({
-                        'Filename': record.filename || '',
-                        'Car Type': record.car_type || '',
-                        'Service Related Video': record.service_related_video || '',
-                        'Sound & Image': record.sound_and_image || '',
-                        'License Plate Visible': record.show_license_plate || '',
-                        'Car on Ramp': record.car_on_ramp || '',
-                        'Technician/Advisor Name': record.service_advisor_or_technician_name || '',
-                        'Dealership Name': record.DealershipName || '',
-                        'Customer Name': record.customer_name || '',
-                        'Special Tools - Tyres': record.special_tools_tyres || '',
-                        'Special Tools - Brake Pad': record.special_tools_brake_pad || '',
-                        'Special Tools - Disc': record.Special_tools_disc || '',
-                        'Offer Mentioned': record.attached_offer_mentioned || '',
-                        'Correct Ending': record.correct_ending || '',
-                        'License Plate Score': record.show_license_plate_eval || '',
-                        'Car on Ramp Score': record.car_on_ramp_eval || '',
-                        'Technician Name Score': record.service_advisor_or_technician_name_eval || '',
-                        'Dealership Score': record.DealershipName_eval || '',
-                        'Customer Name Score': record.customer_name_eval || '',
-                        'Tyre Tools Score': record.special_tools_tyres_eval || '',
-                        'Brake Pad Tools Score': record.special_tools_brake_pad_eval || '',
-                        'Disc Tools Score': record.Special_tools_disc_eval || '',
-                        'Offer Mentioned Score': record.attached_offer_mentioned_eval || '',
-                        'Approve Offer Score': record.approve_offer_mentioned_eval || '',
-                        'Correct Ending Score': record.correct_ending_eval || '',
-                        'Total Points': record.total_points_eval || '',
-                        'Percentage': record.percentage || '',
-                        'Battery Check': record.battery_checked_eval || '',
-                        'Windscreen Check': record.wind_screen_checked_eval || '',
-                        'Summary': record.summary || '',
-                        'Video URL': record.video_url || ''
-                      }));
-
-                      // Create a new workbook
-                      const workbook = XLSX.utils.book_new();
-                      
-                      // Convert data to worksheet
-                      const worksheet = XLSX.utils.json_to_sheet(exportData);
-                      
-                      // Set column widths for better readability
-                      const columnWidths = [
-                        { wch: 30 }, // Filename
-                        { wch: 15 }, // Car Type
-                        { wch: 20 }, // Service Related Video
-                        { wch: 15 }, // Sound & Image
-                        { wch: 20 }, // License Plate Visible
-                        { wch: 15 }, // Car on Ramp
-                        { wch: 25 }, // Technician/Advisor Name
-                        { wch: 20 }, // Dealership Name
-                        { wch: 20 }, // Customer Name
-                        { wch: 20 }, // Special Tools - Tyres
-                        { wch: 25 }, // Special Tools - Brake Pad
-                        { wch: 20 }, // Special Tools - Disc
-                        { wch: 18 }, // Offer Mentioned
-                        { wch: 15 }, // Correct Ending
-                        { wch: 18 }, // License Plate Score
-                        { wch: 18 }, // Car on Ramp Score
-                        { wch: 20 }, // Technician Name Score
-                        { wch: 18 }, // Dealership Score
-                        { wch: 20 }, // Customer Name Score
-                        { wch: 18 }, // Tyre Tools Score
-                        { wch: 22 }, // Brake Pad Tools Score
-                        { wch: 18 }, // Disc Tools Score
-                        { wch: 22 }, // Offer Mentioned Score
-                        { wch: 20 }, // Approve Offer Score
-                        { wch: 20 }, // Correct Ending Score
-                        { wch: 15 }, // Total Points
-                        { wch: 12 }, // Percentage
-                        { wch: 15 }, // Battery Check
-                        { wch: 18 }, // Windscreen Check
-                        { wch: 50 }, // Summary
-                        { wch: 40 }  // Video URL
-                      ];
-                      
-                      worksheet['!cols'] = columnWidths;
-                      
-                      // Add worksheet to workbook
-                      XLSX.utils.book_append_sheet(workbook, worksheet, 'Video Analysis Data');
-                      
-                      // Generate filename with current date
-                      const now = new Date();
-                      const dateStr = now.toISOString().split('T')[0]; // YYYY-MM-DD format
-                      const timeStr = now.toTimeString().split(' ')[0].replace(/:/g, '-'); // HH-MM-SS format
-                      const filename = `Ford_Video_Analysis_${dateStr}_${timeStr}.xlsx`;
-                      
-                      // Download the file
-                      XLSX.writeFile(workbook, filename);
+                      // The workbook is built and streamed by the backend, filtered like the file list
+                      window.location.href = apiService.getExportUrl('xlsx', searchTerm);
                     } else {
                       alert('No data available to export');
                     }
@@ -1419,9 +1431,9 @@ const MainApplication = () => {
                             <p className="text-3xl font-bold text-white mt-2">
                               {videoData.length > 0 
                                 ? Math.round(videoData
-                                    .filter(v => v.percentage)
-                                    .reduce((acc, v) => acc + parseFloat(v.percentage.replace('%', '')), 0) 
-                                    / videoData.filter(v => v.percentage).length) + '%'
+                                    .filter(v => percentValue(v.percentage) !== null)
+                                    .reduce((acc, v) => acc + percentValue(v.percentage), 0) 
+                                    / videoData.filter(v => percentValue(v.percentage) !== null).length) + '%'
                                 : '0%'
                               }
                             </p>
@@ -1487,16 +1499,14 @@ const MainApplication = () => {
                             <FileVideo className="h-5 w-5 mr-2 text-blue-400" />
                             Video Information
                           </h3>
-                          {currentRecord.video_url && (
-                            <a
-                              href={currentRecord.video_url}
-                              target="_blank"
-                              rel="noopener noreferrer"
+                          {watchUrl && (
+                            <button
+                              onClick={() => handleWatchVideo(watchUrl, listedFile?.preview_url || selectedFile?.preview_url)}
                               className="flex items-center space-x-2 px-4 py-2 bg-blue-600/20 hover:bg-blue-600/30 border border-blue-600/30 rounded-lg text-blue-400 transition-all duration-200"
                             >
                               <Play className="h-4 w-4" />
                               <span>Watch Video</span>
-                            </a>
+                            </button>
                           )}
                         </div>
 
@@ -1515,31 +1525,31 @@ const MainApplication = () => {
                           <div className="bg-white/5 rounded-lg p-4">
                             <p className="text-gray-400 text-sm mb-2">Overall Score</p>
                             <span className={`px-3 py-1 rounded-full text-sm font-bold border ${
-                              parseFloat(currentRecord.percentage?.replace('%', '') || '0') >= 80 
+                              (percentValue(currentRecord.percentage) ?? 0) >= 80 
                                 ? 'bg-green-500/20 text-green-400 border-green-500/30'
-                                : parseFloat(currentRecord.percentage?.replace('%', '') || '0') >= 60
+                                : (percentValue(currentRecord.percentage) ?? 0) >= 60
                                 ? 'bg-yellow-500/20 text-yellow-400 border-yellow-500/30'
                                 : 'bg-red-500/20 text-red-400 border-red-500/30'
                             }`}>
-                              {currentRecord.percentage || 'N/A'}
+                              {formatPercent(currentRecord.percentage) || 'N/A'}
                             </span>
                           </div>
 
                           <div className="bg-white/5 rounded-lg p-4">
                             <p className="text-gray-400 text-sm mb-2">Total Points</p>
                             <p className="text-white font-bold text-lg">
-                              {currentRecord.total_points_eval || 'N/A'}
+                              {valueOr(currentRecord.total_points_eval, 'N/A')}
                             </p>
                           </div>
 
                           <div className="bg-white/5 rounded-lg p-4">
                             <p className="text-gray-400 text-sm mb-2">Service Video</p>
                             <span className={`px-3 py-1 rounded-full text-sm font-medium border ${
-                              currentRecord.service_related_video === 'Yes'
+                              formatVerdict(currentRecord.service_related_video) === 'Y'
                                 ? 'bg-green-500/20 text-green-400 border-green-500/30'
                                 : 'bg-gray-500/20 text-gray-400 border-gray-500/30'
                             }`}>
-                              {currentRecord.service_related_video || 'N/A'}
+                              {formatVerdict(currentRecord.service_related_video, currentRecord) || 'N/A'}
                             </span>
                           </div>
                         </div>
@@ -1565,7 +1575,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Sound & Image</p>
-                                    <p className="text-white font-medium">{currentRecord.sound_and_image || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.sound_and_image, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.sound_and_image);
@@ -1578,7 +1588,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">License Plate Visible</p>
-                                    <p className="text-white font-medium">{currentRecord.show_license_plate || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.show_license_plate, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.show_license_plate);
@@ -1591,7 +1601,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Car on Ramp</p>
-                                    <p className="text-white font-medium">{currentRecord.car_on_ramp || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.car_on_ramp, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.car_on_ramp);
@@ -1610,7 +1620,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Technician/Advisor Name</p>
-                                    <p className="text-white font-medium">{currentRecord.service_advisor_or_technician_name || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.service_advisor_or_technician_name, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.service_advisor_or_technician_name);
@@ -1623,7 +1633,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Customer Name</p>
-                                    <p className="text-white font-medium">{currentRecord.customer_name || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.customer_name, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.customer_name);
@@ -1636,7 +1646,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Dealership Name</p>
-                                    <p className="text-white font-medium">{currentRecord.DealershipName || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.DealershipName, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.DealershipName);
@@ -1655,7 +1665,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Tyre Tools</p>
-                                    <p className="text-white font-medium">{currentRecord.special_tools_tyres || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.special_tools_tyres, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.special_tools_tyres);
@@ -1668,7 +1678,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Brake Pad Tools</p>
-                                    <p className="text-white font-medium">{currentRecord.special_tools_brake_pad || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.special_tools_brake_pad, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.special_tools_brake_pad);
@@ -1681,7 +1691,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Disc Tools</p>
-                                    <p className="text-white font-medium">{currentRecord.Special_tools_disc || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.Special_tools_disc, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.Special_tools_disc);
@@ -1700,7 +1710,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Offer Mentioned</p>
-                                    <p className="text-white font-medium">{currentRecord.attached_offer_mentioned || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.attached_offer_mentioned, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.attached_offer_mentioned);
@@ -1713,7 +1723,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Correct Ending</p>
-                                    <p className="text-white font-medium">{currentRecord.correct_ending || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatVerdict(currentRecord.correct_ending, currentRecord) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.correct_ending);
@@ -1732,7 +1742,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Battery Check</p>
-                                    <p className="text-white font-medium">{currentRecord.battery_checked_eval || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatPercent(currentRecord.battery_checked_eval) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.battery_checked_eval, 'score');
@@ -1745,7 +1755,7 @@ const MainApplication = () => {
                                 <div className="flex items-center justify-between">
                                   <div>
                                     <p className="text-gray-400 text-sm">Windscreen Check</p>
-                                    <p className="text-white font-medium">{currentRecord.wind_screen_checked_eval || 'N/A'}</p>
+                                    <p className="text-white font-medium">{formatPercent(currentRecord.wind_screen_checked_eval) || 'N/A'}</p>
                                   </div>
                                   {(() => {
                                     const { icon: Icon, color } = getStatusDisplay(currentRecord.wind_screen_checked_eval, 'score');
@@ -1762,61 +1772,61 @@ const MainApplication = () => {
                             <div className="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-5 gap-4">
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">License Plate</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.show_license_plate_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.show_license_plate_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 5</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Car on Ramp</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.car_on_ramp_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.car_on_ramp_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 5</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Technician Name</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.service_advisor_or_technician_name_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.service_advisor_or_technician_name_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 10</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Dealership</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.DealershipName_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.DealershipName_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 1</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Customer Name</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.customer_name_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.customer_name_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 1</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Tyre Tools</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.special_tools_tyres_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.special_tools_tyres_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 20</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Brake Tools</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.special_tools_brake_pad_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.special_tools_brake_pad_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 20</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Disc Tools</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.Special_tools_disc_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.Special_tools_disc_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 20</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Offer Mentioned</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.attached_offer_mentioned_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.attached_offer_mentioned_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 10</p>
                               </div>
 
                               <div className="bg-white/5 rounded-lg p-3 border border-white/10 text-center">
                                 <p className="text-gray-400 text-xs">Approve Offer</p>
-                                <p className="text-white font-bold text-lg">{currentRecord.approve_offer_mentioned_eval || '0'}</p>
+                                <p className="text-white font-bold text-lg">{valueOr(currentRecord.approve_offer_mentioned_eval, '0')}</p>
                                 <p className="text-gray-500 text-xs">/ 10</p>
                               </div>
                             </div>
@@ -1837,6 +1847,7 @@ const MainApplication = () => {
         isOpen={isVideoPlayerOpen}
         onClose={() => setIsVideoPlayerOpen(false)}
         videoUrl={currentVideoUrl}
+        previewUrl={currentPreviewUrl}
         filename={selectedFile?.file_name || 'Video'}
       />
 
@@ -23,6 +23,12 @@ export const apiService = {
     console.log('Video data API response:', response.data);
     return response.data;
   },
+
+  // Rows inserted and filenames deleted since a cursor from an earlier video data response
+  async getVideoDataChanges(cursor) {
+    const response = await api.get('/get-video-data', { params: { since: cursor } });
+    return response.data;
+  },
   
   // ... rest of your methods
 
@@ -33,6 +39,12 @@ export const apiService = {
     return response.data;
   },
 
+  // Get records for many files in one request
+  async getRecords(filenames) {
+    const response = await api.post('/records', { filenames });
+    return response.data;
+  },
+
   // Analyze video
   // Analyze video
   async analyzeVideo(data) {
@@ -61,6 +73,15 @@ export const apiService = {
 
 
 
+  // Build the URL of a server-side export (csv, xlsx or parquet)
+  getExportUrl(format = 'xlsx', search = '') {
+    const params = new URLSearchParams({ format });
+    if (search) {
+      params.append('search', search);
+    }
+    return `${API_BASE_URL}/export?${params.toString()}`;
+  },
+
   // Delete file
   async deleteFile(filename) {
     const response = await api.post('/delete-data', { filename });